@@ -9,59 +9,180 @@ logging.basicConfig(
     force=True
 )
 
-from fastapi import APIRouter, HTTPException, Query
+import os
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query, Request
 from backend.db.session import SessionLocal
 from backend.db.models import ProcessedImage
-from fastapi.responses import JSONResponse
-from backend.tasks import analyze_plant_task
+from fastapi.responses import JSONResponse, RedirectResponse, Response
 from backend.celery_worker import celery_app
+from backend.services.result_manifest import MANIFEST_NAME, load_manifest, manifest_artifact_keys, manifest_documents
+from src.lazy_artifacts import LISTING_NAME, listing_candidates, load_bundle, render_artifact
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
 import json
 
 router = APIRouter()
 
 S3_BUCKET = "plant-analysis-data"  
 S3_IMAGE_PATH_TEMPLATE = "Sorghum_dataset/{date}/{plant_id}/{plant_id}_frame8.tif" 
+# Tasks are enqueued by name so the API never imports backend.tasks
+# (and with it torch / transformers / the pipeline).
+ANALYZE_PLANT_TASK = "backend.tasks.analyze_plant_task"
+ANALYZE_BATCH_TASK = "backend.tasks.analyze_batch_task"
+# /plant-results fetches the JSON documents of a plant concurrently
+RESULTS_FETCH_WORKERS = int(os.getenv("RESULTS_FETCH_WORKERS", "16"))
+RESULT_SECTIONS = ("images", "result", "morphology", "texture", "vegetation_indices")
+
+@lru_cache(maxsize=None)
+def _s3_client():
+    """One client per process; its connection pool is sized for the fetch pool."""
+    return boto3.client('s3', region_name='us-east-2',
+                        config=Config(max_pool_connections=max(10, RESULTS_FETCH_WORKERS)))
+
+@lru_cache(maxsize=None)
+def _fetch_pool():
+    return ThreadPoolExecutor(max_workers=RESULTS_FETCH_WORKERS, thread_name_prefix="plant-results")
 
 @router.post("/analyze-plant/{plant_id}")
-async def analyze_plant(plant_id: str, date: str):
+async def analyze_plant(plant_id: str, date: str, force: bool = False):
     # Construct the S3 key for the plant image
     key = S3_IMAGE_PATH_TEMPLATE.format(date=date, plant_id=plant_id)
-    task = analyze_plant_task.delay(S3_BUCKET, key)
+    # force=true reruns even if an identical cached result exists
+    task = celery_app.send_task(ANALYZE_PLANT_TASK, args=[S3_BUCKET, key], kwargs={"force": force})
     return {"task_id": task.id, "status": "processing started"}
 
+@router.post("/analyze-batch")
+async def analyze_batch(
+    date: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    plant_ids: Optional[List[str]] = Query(None),
+    frame: Optional[int] = 8,
+    force: bool = False,
+):
+    # Either a single date or an inclusive start/end range (YYYY-MM-DD)
+    if not date and not (start_date and end_date):
+        raise HTTPException(status_code=400, detail="Provide either date or both start_date and end_date")
+    task = celery_app.send_task(ANALYZE_BATCH_TASK, args=[S3_BUCKET], kwargs={
+        "date": date, "start_date": start_date, "end_date": end_date,
+        "plant_ids": plant_ids, "frame": frame, "force": force,
+    })
+    return {"task_id": task.id, "status": "batch processing started"}
+
 @router.get("/task-status/{task_id}")
 def get_task_status(task_id: str):
     task = celery_app.AsyncResult(task_id)
     return {
         "task_id": task_id,
         "state": task.state,
+        "progress": task.info if task.state == 'PROGRESS' else None,
         "result": task.result if task.state == 'SUCCESS' else None
     }
 
+@router.get("/artifacts/{date}/{plant_id}/{name:path}", name="get_artifact")
+def get_artifact(date: str, plant_id: str, name: str):
+    """
+    Serve a diagnostic PNG. Lazily generated artifacts (ARTIFACT_MODE=lazy)
+    are rendered from their stored maps on first request and written to the
+    key the eager pipeline uses, so later requests are redirected to S3.
+    """
+    s3 = _s3_client()
+    bucket = "plant-analysis-data"
+    region = 'us-east-2'
+    prefix = f"results/{date}/{plant_id}"
+    key = f"{prefix}/{name}"
+    try:
+        s3.head_object(Bucket=bucket, Key=key)
+        return RedirectResponse(f"https://{bucket}.s3.{region}.amazonaws.com/{key}")
+    except ClientError:
+        pass
+
+    for listing_key in listing_candidates(prefix, name):
+        try:
+            listing = json.loads(s3.get_object(Bucket=bucket, Key=listing_key)['Body'].read())
+        except ClientError:
+            continue
+        spec = listing.get("artifacts", {}).get(name)
+        if spec is None:
+            continue
+        try:
+            arrays = load_bundle(s3.get_object(Bucket=bucket, Key=listing["bundle"])['Body'].read())
+            png = render_artifact(spec, arrays)
+        except Exception as e:
+            logging.error(f"Error rendering {key}: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Error rendering artifact: {str(e)}")
+        s3.put_object(Bucket=bucket, Key=key, Body=png, ContentType='image/png')
+        return Response(content=png, media_type="image/png")
+    raise HTTPException(status_code=404, detail=f"Artifact not found: {name}")
+
+def result_section(rel_path):
+    """`fields` section of a key under results/{date}/{plant_id}/."""
+    if '/' in rel_path:
+        return rel_path.split('/', 1)[0]
+    return "result" if rel_path.endswith('_result.json') else "images"
+
+def _fetch_json(s3, bucket, key):
+    return json.loads(s3.get_object(Bucket=bucket, Key=key)['Body'].read().decode('utf-8'))
+
 @router.get("/plant-results/{plant_id}")
-def get_plant_results(plant_id: str, date: str):
-    s3 = boto3.client('s3', region_name='us-east-2')
+def get_plant_results(plant_id: str, date: str, request: Request, fields: Optional[List[str]] = Query(None)):
+    """
+    Everything stored for one plant/date. Keys and features come from the
+    run's manifest.json when there is one; otherwise from a listing, with
+    the JSON documents fetched concurrently. PNGs come back as URLs (no
+    per-object requests). `fields` limits the response to some of
+    RESULT_SECTIONS (e.g. ?fields=texture for the texture tab); default is
+    all of them.
+    """
+    unknown = set(fields or ()) - set(RESULT_SECTIONS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {sorted(unknown)}; expected {list(RESULT_SECTIONS)}")
+    sections = set(fields or RESULT_SECTIONS)
+    s3 = _s3_client()
     bucket = "plant-analysis-data"
     prefix = f"results/{date}/{plant_id}/"
     try:
-        paginator = s3.get_paginator('list_objects_v2')
-        page_iterator = paginator.paginate(Bucket=bucket, Prefix=prefix)
-        files = []
-        for page in page_iterator:
-            if 'Contents' in page:
-                files.extend([obj['Key'] for obj in page['Contents']])
+        # the run's manifest (one GET) lists every key and inlines the features;
+        # results written before manifests existed are listed instead
+        manifest = load_manifest(s3, bucket, prefix)
+        if manifest is not None:
+            files = manifest_artifact_keys(manifest, prefix)
+            docs = manifest_documents(manifest, prefix)
+        else:
+            paginator = s3.get_paginator('list_objects_v2')
+            page_iterator = paginator.paginate(Bucket=bucket, Prefix=prefix)
+            files = []
+            for page in page_iterator:
+                if 'Contents' in page:
+                    files.extend([obj['Key'] for obj in page['Contents']])
+            docs = {}
+        files = [f for f in files if result_section(f[len(prefix):] if f.startswith(prefix) else f) in sections]
+
+        # remaining JSON bodies (documents and lazy listings) in parallel
+        json_files = [f for f in files if f.endswith('.json') and f not in docs]
+        docs.update(zip(json_files, _fetch_pool().map(lambda f: _fetch_json(s3, bucket, f), json_files)))
+
         result = {}
+        lazy_names = []
         for file in files:
             rel_path = file[len(prefix):] if file.startswith(prefix) else file
+            if rel_path == MANIFEST_NAME:
+                continue
+            if file.endswith(LISTING_NAME):
+                # PNGs that can be rendered on demand through /artifacts
+                lazy_names.extend(docs[file].get("artifacts", {}).keys())
+                continue
             clean_key = rel_path.replace('/', '_').replace('.png', '').replace('.json', '')
             region = 'us-east-2'
             url = f"https://{bucket}.s3.{region}.amazonaws.com/{file}"
             if file.endswith('.png'):
                 result[clean_key] = url
             elif file.endswith('.json'):
-                obj = s3.get_object(Bucket=bucket, Key=file)
-                data = json.loads(obj['Body'].read().decode('utf-8'))
+                data = docs[file]
                 result[clean_key] = data
                 # If this is a *_result key, align vegetation_features and texture_features
                 if clean_key.endswith('_result') and isinstance(data, dict):
@@ -83,7 +204,11 @@ def get_plant_results(plant_id: str, date: str):
                     merged.update(size_traits)
                     merged.update(morph_traits)
                     result['morphology_features'] = merged
+        for name in lazy_names:
+            clean_key = name.replace('/', '_').replace('.png', '')
+            if clean_key not in result:
+                result[clean_key] = str(request.url_for("get_artifact", date=date, plant_id=plant_id, name=name))
         return result
     except Exception as e:
         logging.error(f"Error fetching results: {str(e)}")
-        raise HTTPException(status_code=404, detail=f"Error fetching results: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=404, detail=f"Error fetching results: {str(e)}")
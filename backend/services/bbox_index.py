@@ -0,0 +1,200 @@
+# backend/services/bbox_index.py
+"""
+In-memory index of the plant bounding boxes in `bouningbox/{plant_id}.json`.
+
+The whole prefix is listed once per worker process; every LabelMe file is
+parsed once into a plant_id -> (x1, y1, x2, y2) table, so lookups are dict
+reads. After BBOX_REFRESH_SECONDS the next lookup re-lists the prefix and
+downloads only objects whose ETag changed. Files are mirrored to
+BBOX_DIRECTORY, which is also the fallback when S3 cannot be listed.
+
+Missing and malformed boxes are counted in `stats()` (and malformed files
+are logged once per ETag) instead of being silently treated as "no box".
+"downloads" counts fetched files, "download_errors" failed fetches and
+"s3_errors" failed listings.
+
+    index = get_bbox_index(bucket)
+    bbox = index.get("plant7")      # None if missing / malformed
+"""
+import os
+import json
+import time
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from src.artifact_writer import get_artifact_writer
+
+BBOX_PREFIX = "bouningbox/"
+BBOX_DIRECTORY = os.getenv("BBOX_DIRECTORY", "/app/backend/bboxes")
+BBOX_REFRESH_SECONDS = float(os.getenv("BBOX_REFRESH_SECONDS", "300"))
+BBOX_FETCH_WORKERS = int(os.getenv("BBOX_FETCH_WORKERS", "16"))
+
+
+def parse_labelme_bbox(data):
+    """(x1, y1, x2, y2) of the first rectangle shape; ValueError if there is none."""
+    jd = json.loads(data)
+    rect = next((s for s in jd.get('shapes', []) if s.get('shape_type') == 'rectangle'), None)
+    if rect is None:
+        raise ValueError("no rectangle shape")
+    (ax, ay), (bx, by) = rect['points'][:2]
+    return int(ax), int(ay), int(bx), int(by)
+
+
+class BBoxIndex:
+    def __init__(self, bucket, s3=None, local_dir=BBOX_DIRECTORY, refresh_seconds=BBOX_REFRESH_SECONDS):
+        self.bucket = bucket
+        self._s3 = s3
+        self.local_dir = Path(local_dir) if local_dir else None
+        self.refresh_seconds = refresh_seconds
+        self._boxes = {}    # plant_id -> bbox, or None when malformed
+        self._etags = {}    # plant_id -> ETag of the parsed object
+        self._loaded_at = None
+        self._lock = threading.Lock()           # one refresh at a time
+        self._counts_lock = threading.Lock()    # counters, bumped from many lookup threads
+        self._counts = {"lookups": 0, "missing": 0, "malformed": 0,
+                        "refreshes": 0, "downloads": 0, "download_errors": 0, "s3_errors": 0,
+                        "local_fallbacks": 0}
+
+    def _count(self, name, n=1):
+        with self._counts_lock:
+            self._counts[name] += n
+
+    @property
+    def s3(self):
+        return self._s3 or get_artifact_writer().client
+
+    # -----------------------------
+    # Loading
+    # -----------------------------
+    def _list(self):
+        paginator = self.s3.get_paginator('list_objects_v2')
+        listed = {}
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=BBOX_PREFIX):
+            for obj in page.get('Contents', []):
+                name = obj['Key'][len(BBOX_PREFIX):]
+                if name.endswith('.json') and '/' not in name:
+                    listed[name[:-len('.json')]] = obj['ETag'].strip('"')
+        return listed
+
+    def _fetch(self, plant_id):
+        return self.s3.get_object(Bucket=self.bucket, Key=f"{BBOX_PREFIX}{plant_id}.json")['Body'].read()
+
+    def _mirror(self, plant_id, data):
+        if self.local_dir is None:
+            return
+        try:
+            self.local_dir.mkdir(parents=True, exist_ok=True)
+            (self.local_dir / f"{plant_id}.json").write_bytes(data)
+        except OSError:
+            pass
+
+    def _parse(self, plant_id, data):
+        try:
+            return parse_labelme_bbox(data)
+        except (ValueError, KeyError, TypeError, IndexError) as e:
+            print(f"[WARN] Malformed bbox for {plant_id}: {e}")
+            return None
+
+    def _load_local(self):
+        boxes, etags = {}, {}
+        if self.local_dir is None or not self.local_dir.is_dir():
+            return boxes, etags
+        for path in self.local_dir.glob("*.json"):
+            boxes[path.stem] = self._parse(path.stem, path.read_bytes())
+            etags[path.stem] = None
+        return boxes, etags
+
+    def refresh(self, force=False):
+        """Re-list the prefix and download new / changed files (all of them if `force`)."""
+        with self._lock:
+            try:
+                listed = self._list()
+            except Exception as e:
+                self._count("s3_errors")
+                if self._loaded_at is None:
+                    print(f"[WARN] Could not list s3://{self.bucket}/{BBOX_PREFIX} ({e}); using {self.local_dir}")
+                    self._boxes, self._etags = self._load_local()
+                    self._count("local_fallbacks")
+                self._loaded_at = time.monotonic()
+                return
+
+            changed = [pid for pid, etag in listed.items() if force or self._etags.get(pid) != etag]
+            boxes = {pid: self._boxes[pid] for pid in listed if pid in self._boxes and pid not in changed}
+            etags = {pid: listed[pid] for pid in boxes}
+
+            def fetch(pid):
+                try:
+                    return pid, self._fetch(pid)
+                except Exception as e:
+                    print(f"[WARN] Could not download bbox for {pid}: {e}")
+                    return pid, None
+
+            downloaded = failed = 0
+            with ThreadPoolExecutor(max_workers=max(1, min(BBOX_FETCH_WORKERS, len(changed) or 1))) as ex:
+                for pid, data in ex.map(fetch, changed):
+                    if data is None:
+                        # retried on the next refresh: no ETag is recorded for it
+                        failed += 1
+                        continue
+                    boxes[pid] = self._parse(pid, data)
+                    etags[pid] = listed[pid]
+                    self._mirror(pid, data)
+                    downloaded += 1
+
+            self._boxes, self._etags = boxes, etags
+            self._count("refreshes")
+            self._count("downloads", downloaded)
+            self._count("download_errors", failed)
+            self._loaded_at = time.monotonic()
+
+    def _maybe_refresh(self):
+        if self._loaded_at is None:
+            self.refresh()
+        elif time.monotonic() - self._loaded_at > self.refresh_seconds and not self._lock.locked():
+            self.refresh()
+
+    # -----------------------------
+    # Lookups
+    # -----------------------------
+    def get(self, plant_id):
+        """(x1, y1, x2, y2) or None; missing / malformed lookups are counted."""
+        self._maybe_refresh()
+        boxes = self._boxes  # refresh swaps in a new dict; never mutated once published
+        missing = plant_id not in boxes
+        bbox = None if missing else boxes[plant_id]
+        with self._counts_lock:
+            self._counts["lookups"] += 1
+            if missing:
+                self._counts["missing"] += 1
+            elif bbox is None:
+                self._counts["malformed"] += 1
+        return bbox
+
+    def etag(self, plant_id):
+        """ETag of the plant's bbox object (None if missing or loaded from disk)."""
+        self._maybe_refresh()
+        return self._etags.get(plant_id)
+
+    def stats(self):
+        boxes = self._boxes
+        with self._counts_lock:
+            counts = dict(self._counts)
+        return dict(counts, plants=len(boxes), malformed_files=sum(1 for b in boxes.values() if b is None))
+
+
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+_INDEXES_PID = None
+
+
+def get_bbox_index(bucket, s3=None):
+    """Process-wide index per bucket (rebuilt after fork)."""
+    global _INDEXES_PID
+    with _INDEXES_LOCK:
+        if _INDEXES_PID != os.getpid():
+            _INDEXES.clear()
+            _INDEXES_PID = os.getpid()
+        if bucket not in _INDEXES:
+            _INDEXES[bucket] = BBoxIndex(bucket, s3=s3)
+        return _INDEXES[bucket]
@@ -0,0 +1,91 @@
+# backend/services/db_sink.py
+"""
+Buffered writer of processed_images rows from the Celery tasks.
+
+Tasks add one row per finished plant; `flush()` replaces the rows of the
+buffered (plant_id, date) pairs in one transaction (one multi-row DELETE,
+one multi-row INSERT) on the process-wide pooled engine from
+backend.db.session. A single-plant task flushes right away; a batch task
+flushes whenever DB_SINK_BATCH_SIZE rows are buffered and at the end.
+
+RESULTS_DB_SINK=0 turns direct writes off (the S3 sync still fills the
+table, with its lag).
+
+    sink = ResultSink()
+    sink.add(processed_image_row(prefix, result))
+    sink.flush()
+"""
+import os
+import threading
+from datetime import datetime
+
+from sqlalchemy import delete, insert, tuple_
+
+from backend.db.models import Base, ProcessedImage
+from backend.services.result_manifest import merged_morphology_traits
+
+RESULTS_DB_SINK = os.getenv("RESULTS_DB_SINK", "1").lower() not in ("0", "false", "no")
+DB_SINK_BATCH_SIZE = int(os.getenv("DB_SINK_BATCH_SIZE", "200"))
+
+_TABLES_READY = set()
+_TABLES_LOCK = threading.Lock()
+
+
+def _engine():
+    from backend.db.session import engine
+    with _TABLES_LOCK:
+        if id(engine) not in _TABLES_READY:
+            Base.metadata.create_all(bind=engine, checkfirst=True)
+            _TABLES_READY.add(id(engine))
+    return engine
+
+
+def processed_image_row(prefix, result):
+    """processed_images values for results/{date}/{plant_id} and a process_plant_image result."""
+    _, date_str, plant_id = prefix.rstrip('/').split('/')[-3:]
+    return {
+        "plant_id": plant_id,
+        "image_key": f"{prefix.rstrip('/')}/original.png",
+        "date": datetime.strptime(date_str, '%Y-%m-%d').date(),
+        "vegetation_features": result.get("vegetation_indices") or None,
+        "morphology_features": merged_morphology_traits(result.get("morphology")) or None,
+        "texture_features": result.get("texture_features") or None,
+    }
+
+
+class ResultSink:
+    def __init__(self, engine=None, batch_size=DB_SINK_BATCH_SIZE):
+        self._engine = engine
+        self.batch_size = max(1, int(batch_size))
+        self._rows = {}
+        self._lock = threading.Lock()
+        self.written = 0
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._engine = _engine()
+        return self._engine
+
+    def add(self, row):
+        """Buffer one row (thread-safe); a later row for the same plant/date replaces it."""
+        with self._lock:
+            self._rows[(row["plant_id"], row["date"])] = row
+
+    @property
+    def full(self):
+        return len(self._rows) >= self.batch_size
+
+    def flush(self):
+        """Write the buffered rows in one transaction; returns how many were written."""
+        with self._lock:
+            rows, self._rows = list(self._rows.values()), {}
+        if not rows:
+            return 0
+        table = ProcessedImage.__table__
+        with self.engine.begin() as conn:
+            conn.execute(delete(table).where(
+                tuple_(table.c.plant_id, table.c.date).in_([(r["plant_id"], r["date"]) for r in rows])))
+            conn.execute(insert(table), rows)
+        self.written += len(rows)
+        return len(rows)
@@ -0,0 +1,127 @@
+# backend/services/model_registry.py
+"""
+Lazy, process-wide model registry.
+
+Nothing heavy happens at import time: torch / transformers are imported and
+weights are loaded the first time a model is requested (or when a worker
+warms up, see backend.tasks). Weights are read offline from
+MODELS_DIRECTORY; the Hugging Face Hub (and `login`) is only touched when
+the weights are not there yet and MODELS_OFFLINE is not set.
+
+    rmbg = get_model("rmbg")       # loads once per process, None if unavailable
+    warmup()                       # load every registered model now
+
+Each name loads under its own lock, so a loader may itself call get_model
+for another name (the "segmenter" loader fetches "rmbg").
+"""
+import os
+import threading
+from pathlib import Path
+
+MODELS_DIRECTORY = os.getenv("MODELS_DIRECTORY", "/app/backend/models")
+MODELS_OFFLINE = os.getenv("MODELS_OFFLINE", "0").lower() in ("1", "true", "yes")
+RMBG_MODEL_ID = os.getenv("RMBG_MODEL_ID", "briaai/RMBG-2.0")
+
+_LOADERS = {}
+_MODELS = {}
+_LOCK = threading.Lock()  # guards _NAME_LOCKS only; loaders run under their name's lock
+_NAME_LOCKS = {}
+_DEVICE = None
+
+
+def get_device():
+    global _DEVICE
+    if _DEVICE is None:
+        import torch
+        _DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+    return _DEVICE
+
+
+def register_model(name, loader):
+    """Register a zero-arg loader; it runs at most once per process (on success)."""
+    _LOADERS[name] = loader
+
+
+def _name_lock(name):
+    with _LOCK:
+        return _NAME_LOCKS.setdefault(name, threading.Lock())
+
+
+def get_model(name):
+    """Loaded model for `name`, or None if it could not be loaded."""
+    model = _MODELS.get(name)
+    if model is not None:
+        return model
+    with _name_lock(name):
+        if name not in _MODELS:
+            try:
+                _MODELS[name] = _LOADERS[name]()
+            except Exception as e:
+                # not cached: the next request tries again
+                print(f"[WARN] Could not load model {name}: {e}")
+                return None
+        return _MODELS[name]
+
+
+def is_loaded(name):
+    return _MODELS.get(name) is not None
+
+
+def warmup(names=None):
+    """Load the given (default: all registered) models now."""
+    for name in names or list(_LOADERS):
+        if get_model(name) is not None:
+            print(f"Model {name} ready on {get_device()}")
+
+
+# -----------------------------
+# Hugging Face weights
+# -----------------------------
+def _hf_login():
+    hf_token = os.getenv("HF_TOKEN")
+    if hf_token:
+        try:
+            from huggingface_hub import login
+            login(token=hf_token)
+        except Exception:
+            # non-fatal
+            pass
+
+
+def local_model_path(model_id):
+    """Saved copy of `model_id` under MODELS_DIRECTORY (e.g. models/RMBG-2.0), if any."""
+    for candidate in (Path(MODELS_DIRECTORY) / model_id, Path(MODELS_DIRECTORY) / model_id.split("/")[-1]):
+        if (candidate / "config.json").exists():
+            return candidate
+    return None
+
+
+def load_hf_model(model_cls_name, model_id):
+    """
+    Load a transformers model offline: a saved copy in MODELS_DIRECTORY, then
+    the Hub cache kept in MODELS_DIRECTORY; download (after login) only when
+    neither has it.
+    """
+    import transformers
+    model_cls = getattr(transformers, model_cls_name)
+
+    local = local_model_path(model_id)
+    if local is not None:
+        return model_cls.from_pretrained(str(local), trust_remote_code=True, local_files_only=True)
+    try:
+        return model_cls.from_pretrained(model_id, trust_remote_code=True, local_files_only=True,
+                                         cache_dir=MODELS_DIRECTORY)
+    except OSError:
+        if MODELS_OFFLINE:
+            raise
+    print(f"[WARN] {model_id} not found in {MODELS_DIRECTORY}; downloading from the Hub.")
+    _hf_login()
+    return model_cls.from_pretrained(model_id, trust_remote_code=True, cache_dir=MODELS_DIRECTORY)
+
+
+def _load_rmbg():
+    model = load_hf_model("AutoModelForImageSegmentation", RMBG_MODEL_ID)
+    return model.eval().to(get_device())
+
+
+register_model("rmbg", _load_rmbg)
@@ -3,60 +3,62 @@
 import os
 import io
 import json
+import time
+import uuid
 import cv2
-import boto3
 import torch
 import yaml  # if you need it elsewhere; safe to remove if unused
 import numpy as np
+from functools import lru_cache
 import matplotlib
 matplotlib.use("Agg")  # safe for headless servers
-import matplotlib.pyplot as plt
 
 from PIL import Image
 from torchvision import transforms
-from transformers import AutoModelForImageSegmentation
-from huggingface_hub import login
 
-from src.data_loader import load_single_frame_from_s3
-from src.composite import create_composites, convert_to_uint8
-from src.features import compute_veg_indices, compute_veg_index_features, VEG_INDEX_CHANNELS
-from src.feature_texture import analyze_texture_features, compute_texture_features
-from src.morphology import create_morphology_outputs  # NEW
-
-# -----------------------------
-# Auth: Hugging Face (if token present)
-# -----------------------------
-hf_token = os.getenv("HF_TOKEN")
-if hf_token:
-    try:
-        login(token=hf_token)
-    except Exception:
-        # non-fatal
-        pass
+from src.data_loader import load_frame_from_s3
+from src.composite import create_composites
+from src.artifact_writer import get_artifact_writer, merge_upload_stats
+from src.lazy_artifacts import LazyArtifactSet, lazy_artifacts_enabled
+from backend.services.segmentation_batcher import SegmentationBatcher
+from backend.services.model_registry import get_model
+from backend.services import segmentation_backends  # noqa: F401  (registers "segmenter")
+from backend.services.stage_scheduler import STAGES, run_independent_stages
+from backend.services.bbox_index import get_bbox_index
+from backend.services.result_cache import lookup_stage, save_record, stage_cache_keys, stage_record
 
 # -----------------------------
 # Global: S3 helpers
 # -----------------------------
+# Uploads go through the process-wide background writer (pooled client,
+# bounded queue); process_plant_image flushes its own uploads at the end.
 def save_json_to_s3(obj, bucket, key, content_type="application/json"):
-    s3 = boto3.client('s3')
-    s3.upload_fileobj(io.BytesIO(json.dumps(obj, indent=2).encode("utf-8")), bucket, key,
-                      ExtraArgs={"ContentType": content_type})
+    get_artifact_writer().put(bucket, key, json.dumps(obj, indent=2).encode("utf-8"), content_type)
 
-def save_image_to_s3(bucket, key, image_np):
-    s3 = boto3.client('s3')
+def encode_png(image_np, key=None):
     success, encoded_img = cv2.imencode('.png', image_np)
     if not success:
-        print(f"[ERROR] cv2.imencode failed for {key} with image shape {getattr(image_np, 'shape', None)} and dtype {getattr(image_np, 'dtype', None)}")
-        return
-    s3.upload_fileobj(io.BytesIO(encoded_img.tobytes()), bucket, key, ExtraArgs={'ContentType': 'image/png'})
+        raise ValueError(f"cv2.imencode failed for {key} with image shape {getattr(image_np, 'shape', None)} and dtype {getattr(image_np, 'dtype', None)}")
+    return encoded_img.tobytes()
+
+def save_image_to_s3(bucket, key, image_np):
+    # PNG encoding runs on the uploader thread as well
+    get_artifact_writer().put(bucket, key, lambda: encode_png(image_np, key), 'image/png')
 
 def save_morph_images_to_s3(images_dict, bucket, prefix):
     """images_dict: name -> np.uint8 image; returns name->s3_key"""
+    lazy = LazyArtifactSet(bucket, prefix, "morphology") if lazy_artifacts_enabled() else None
     out = {}
     for name, im in images_dict.items():
         key = f"{prefix}/morphology/images/{name}.png"
-        save_image_to_s3(bucket, key, im)
+        if lazy is not None:
+            # rendered on first request by the API
+            lazy.add(f"morphology/images/{name}.png", im)
+        else:
+            save_image_to_s3(bucket, key, im)
         out[name] = key
+    if lazy is not None:
+        lazy.save()
     return out
 
 def save_morph_csv(morph_results, bucket, key):
@@ -80,69 +82,98 @@ def save_morph_csv(morph_results, bucket, key):
         row = [pid] + [size.get(c, "") for c in size_cols] + [morph.get(c, "") for c in morph_cols]
         w.writerow(row)
     data = bio.getvalue().encode("utf-8")
-    s3 = boto3.client('s3')
-    s3.upload_fileobj(io.BytesIO(data), bucket, key, ExtraArgs={"ContentType":"text/csv"})
+    get_artifact_writer().put(bucket, key, data, "text/csv")
 
 # -----------------------------
-# Global: RMBG segmentation model (load ONCE)
+# RMBG segmentation: the backend (torch / torchscript / onnx, see
+# segmentation_backends) is loaded lazily, once per process, through the
+# model registry and warmed up in Celery's worker_process_init
 # -----------------------------
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-try:
-    RMBG = (AutoModelForImageSegmentation
-            .from_pretrained("briaai/RMBG-2.0", trust_remote_code=True)
-            .eval()
-            .to(DEVICE))
-except Exception as e:
-    RMBG = None
-    print(f"[WARN] Could not load RMBG-2.0 model: {e}")
-
-TRANSFORM_IMAGE = transforms.Compose([
-    transforms.Resize((1024, 1024)),
-    transforms.ToTensor(),
-    transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-])
+
+# SEGMENTATION_CROP=1 segments only the bbox (plus a margin, as a fraction
+# of the box size) at a resolution matched to the crop: its longer side
+# rounded up to a multiple of 32 and clamped to [MIN, MAX]. Off: the whole
+# frame is resized to 1024x1024 as before.
+SEGMENTATION_CROP = os.getenv("SEGMENTATION_CROP", "0").lower() in ("1", "true", "yes")
+SEGMENTATION_CROP_MARGIN = float(os.getenv("SEGMENTATION_CROP_MARGIN", "0.1"))
+SEGMENTATION_MIN_SIZE = int(os.getenv("SEGMENTATION_MIN_SIZE", "256"))
+SEGMENTATION_MAX_SIZE = int(os.getenv("SEGMENTATION_MAX_SIZE", "1024"))
+
+@lru_cache(maxsize=None)
+def segmentation_transform(size):
+    return transforms.Compose([
+        transforms.Resize((size, size)),
+        transforms.ToTensor(),
+        transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+    ])
+
+TRANSFORM_IMAGE = segmentation_transform(1024)
+
+def segmentation_region(bbox, W, H):
+    """
+    (x1, y1, x2, y2, size): the frame region fed to RMBG and its square
+    inference resolution.
+    """
+    if not (SEGMENTATION_CROP and bbox):
+        return 0, 0, W, H, 1024
+    x1, y1, x2, y2 = bbox
+    mx = int(round((x2 - x1) * SEGMENTATION_CROP_MARGIN))
+    my = int(round((y2 - y1) * SEGMENTATION_CROP_MARGIN))
+    x1, y1 = max(0, x1 - mx), max(0, y1 - my)
+    x2, y2 = min(W, x2 + mx), min(H, y2 + my)
+    if x2 <= x1 or y2 <= y1:
+        return 0, 0, W, H, 1024
+    size = -(-max(x2 - x1, y2 - y1) // 32) * 32
+    size = min(max(size, SEGMENTATION_MIN_SIZE), SEGMENTATION_MAX_SIZE)
+    return x1, y1, x2, y2, size
+
+def predict_rmbg_batch(inputs):
+    """
+    inputs: list of 3xSxS tensors of one size S (1024, or the crop size from
+    segmentation_region; the batcher groups by shape) -> list of SxS float
+    prob maps
+    """
+    preds = get_model("segmenter").predict(torch.stack(inputs))
+    return list(preds)
+
+# Requests from concurrently processed plants are grouped into one RMBG call;
+# each process_plant_image run is a session, so a lone plant does not wait.
+SEGMENTER = SegmentationBatcher(
+    predict_rmbg_batch,
+    max_batch_size=int(os.getenv("RMBG_MAX_BATCH_SIZE", "4")),
+    max_wait_ms=float(os.getenv("RMBG_MAX_WAIT_MS", "50")),
+)
 
 # -----------------------------
-# Vegetation index helper (unchanged)
+# Bounding boxes
 # -----------------------------
-def save_index(idx, func, spec, mask, s3_bucket, s3_prefix):
-    bands = VEG_INDEX_CHANNELS.get(idx)
-    if bands is None:
-        print(f"[WARN] No bands found for index {idx}, skipping.")
-        return
-    try:
-        vals = [spec[b].squeeze(-1) for b in bands]
-    except KeyError as e:
-        print(f"[WARN] Missing band {e} for index {idx}, skipping.")
-        return
-    arr = func(*vals)
-    masked = np.where(mask == 255, arr, np.nan)
-    img8 = convert_to_uint8(masked)
-    if img8 is None or not isinstance(img8, np.ndarray) or img8.size == 0 or np.all(img8 == 0):
-        print(f"[WARN] img8 for {idx} is invalid or all zeros, skipping.")
-        return
-    fig = plt.figure(figsize=(8, 8))
-    try:
-        im = plt.imshow(img8, cmap='YlGn')
-        plt.axis('off')
-        cbar = plt.colorbar(im, fraction=0.046, pad=0.04)
-        cbar.set_ticks([0, 255])
-        cbar.set_ticklabels([f"{np.nanmin(masked):.2f}", f"{np.nanmax(masked):.2f}"])
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', bbox_inches='tight', pad_inches=0)
-        buf.seek(0)
-        s3 = boto3.client('s3')
-        s3_key = f"{s3_prefix}/vegetation_indices/{idx}.png"
-        s3.upload_fileobj(buf, s3_bucket, s3_key, ExtraArgs={'ContentType': 'image/png'})
-    except Exception as e:
-        print(f"[ERROR] Failed to plot/save index {idx}: {e}")
-    finally:
-        plt.close(fig)
+def load_bbox(bucket, plant_id, s3=None):
+    """
+    (x1, y1, x2, y2) for a plant from the worker's bbox index (see
+    bbox_index), or None if the plant has no / a malformed box.
+    """
+    return get_bbox_index(bucket, s3=s3).get(plant_id)
 
 # -----------------------------
 # Main pipeline for one plant-frame
 # -----------------------------
-def process_plant_image(bucket, key):
+def _load_cached_mask(s3, bucket, record):
+    if not record:
+        return None
+    try:
+        body = s3.get_object(Bucket=bucket, Key=record["output"]["mask_key"])['Body'].read()
+        return cv2.imdecode(np.frombuffer(body, np.uint8), cv2.IMREAD_GRAYSCALE)
+    except Exception as e:
+        print(f"[WARN] Cached mask unavailable ({e}); segmenting again.")
+        return None
+
+def _cacheable_output(stage, output):
+    # morphology images are already in S3 under the results prefix
+    if stage == "morphology":
+        return {pid: {k: v for k, v in r.items() if k != "images"} for pid, r in output.items()}
+    return output
+
+def process_plant_image(bucket, key, s3=None, fingerprint=None):
     """
     Runs the full pipeline for a single plant image in S3:
     - load frame
@@ -150,12 +181,53 @@ def process_plant_image(bucket, key):
     - crop to bbox (if available)
     - segment RMBG -> mask (largest CC)
     - save original/mask/overlay/segmented
-    - compute vegetation indices + JSON
-    - compute texture features (maps + JSON)
-    - compute morphology (traits + diagnostic images + CSV)
-
-    Returns a dict with veg, texture, morphology, and mask path.
+    - in parallel (see stage_scheduler):
+        - compute vegetation indices + JSON
+        - compute texture features (maps + JSON)
+        - compute morphology (traits + diagnostic images + CSV)
+
+    Returns a dict with veg, texture, morphology, mask path and per-stage
+    wall times (seconds).
+
+    `s3` is an optional shared boto3 client. Bounding boxes come from the
+    process-wide bbox index.
+
+    Artifacts are uploaded in the background; this call returns after its
+    own uploads have been flushed and reports them under `upload_stats`;
+    `artifacts` lists them as (key, size, content_type) for the run's
+    manifest (see result_manifest).
+
+    `fingerprint` (see result_cache.input_fingerprint) enables the per-stage
+    cache: segmentation and any of the independent stages whose inputs and
+    code are unchanged are reused instead of recomputed. Stage records are
+    written only once all of the run's uploads succeeded.
     """
+    writer = get_artifact_writer()
+    s3 = s3 or writer.client
+    task_id = f"{key}:{uuid.uuid4().hex}"
+    cache_records, worker_uploads = [], []
+    with writer.task_scope(task_id), SEGMENTER.session():
+        try:
+            result = _run_pipeline(bucket, key, s3, fingerprint, cache_records, worker_uploads)
+        finally:
+            stats = writer.flush(task_id)
+    # stages run in worker processes flushed their own uploads
+    for worker_stats in worker_uploads:
+        merge_upload_stats(stats, worker_stats)
+    print(f"Uploaded {stats['uploaded']} artifacts, {stats['bytes'] / 1e6:.1f} MB "
+          f"at {stats['bytes_per_sec'] / 1e6:.2f} MB/s ({stats['failed']} failed)")
+    if result is not None:
+        result["upload_stats"] = {k: stats[k] for k in ("uploaded", "failed", "bytes", "bytes_per_sec")}
+        result["artifacts"] = stats["artifacts"]
+        if not stats["failed"]:
+            for rec in cache_records:
+                try:
+                    save_record(s3, bucket, rec["kind"], rec["key"], rec["record"])
+                except Exception as e:
+                    print(f"[WARN] Could not write cache record {rec['kind']}/{rec['key']}: {e}")
+    return result
+
+def _run_pipeline(bucket, key, s3, fingerprint=None, cache_records=None, worker_uploads=None):
     parts = key.split("/")
     date = parts[1]
     plant_id = parts[2]
@@ -164,35 +236,35 @@ def process_plant_image(bucket, key):
     flat_key = f"{date_key}_{plant_id}_{frame_str}"
 
     prefix = f"results/{date}/{plant_id}"
+    cache_records = cache_records if cache_records is not None else []
+    stage_keys = stage_cache_keys(fingerprint) if fingerprint and fingerprint.get("source") else None
 
-    # 1) Load
-    image = load_single_frame_from_s3(bucket, key)
+    # 1) Load (band stack from the local frame cache when FRAME_CACHE=1)
+    image = load_frame_from_s3(bucket, key, s3=s3, etag=(fingerprint or {}).get("source"))
     flats = {flat_key: {'raw_image': (image, os.path.basename(key))}}
 
     # 2) Composite
     flats = create_composites(flats)
 
     # 3) For this plant (single entry), build bbox crop + RMBG mask
+    seg_start = time.perf_counter()
+    seg_hit = lookup_stage(s3, bucket, "segmentation", stage_keys["segmentation"], prefix) if stage_keys else None
+    seg_cached = False
     for _, pdata in flats.items():
         comp = pdata['composite']
         H, W = comp.shape[:2]
 
+        cached_mask = _load_cached_mask(s3, bucket, seg_hit)
+        if cached_mask is not None and cached_mask.shape == (H, W):
+            # mask + original/overlay/segmented images already in S3
+            print("Segmentation: cache hit")
+            pdata['mask'] = cached_mask
+            seg_seconds = time.perf_counter() - seg_start
+            seg_cached = True
+            continue
+
         # bbox from S3 (keep their existing path name 'bouningbox/')
-        bbox_bucket = bucket
-        bbox_key = f"bouningbox/{plant_id}.json"
-        s3 = boto3.client('s3')
-        try:
-            bbox_data = s3.get_object(Bucket=bbox_bucket, Key=bbox_key)['Body'].read()
-            jd = json.loads(bbox_data)
-            rect = next((s for s in jd.get('shapes', []) if s.get('shape_type') == 'rectangle'), None)
-            bbox = (
-                int(rect['points'][0][0]),
-                int(rect['points'][0][1]),
-                int(rect['points'][1][0]),
-                int(rect['points'][1][1])
-            ) if rect else None
-        except Exception:
-            bbox = None
+        bbox = load_bbox(bucket, plant_id, s3=s3)
 
         x1, y1, x2, y2 = bbox if bbox else (0, 0, W, H)
         x1, x2 = max(0, x1), min(W, x2)
@@ -203,18 +275,21 @@ def process_plant_image(bucket, key):
 
         masked = cv2.bitwise_and(comp, comp, mask=mask_box)
 
-        # RMBG segmentation (using global model)
-        if RMBG is None:
-            print("[ERROR] RMBG model not available; cannot segment.")
+        # RMBG segmentation (model from the registry)
+        if get_model("segmenter") is None:
+            print("[ERROR] RMBG segmentation backend not available; cannot segment.")
             return None
 
-        pil = Image.fromarray(cv2.cvtColor(masked, cv2.COLOR_BGR2RGB))
-        inp = TRANSFORM_IMAGE(pil).unsqueeze(0).to(DEVICE)
-        with torch.no_grad():
-            preds = RMBG(inp)[-1].sigmoid().cpu()[0].squeeze(0).numpy()
+        # whole frame, or the bbox + margin at a crop-sized resolution
+        cx1, cy1, cx2, cy2, size = segmentation_region((x1, y1, x2, y2) if bbox else None, W, H)
+        crop = masked[cy1:cy2, cx1:cx2]
+        pil = Image.fromarray(cv2.cvtColor(crop, cv2.COLOR_BGR2RGB))
+        preds = SEGMENTER.segment(segmentation_transform(size)(pil))
 
         mask_pred = (preds > 0.5).astype(np.uint8) * 255
-        mask_full = cv2.resize(mask_pred, (W, H), interpolation=cv2.INTER_NEAREST)
+        mask_full = np.zeros((H, W), dtype=np.uint8)
+        mask_full[cy1:cy2, cx1:cx2] = cv2.resize(mask_pred, (cx2 - cx1, cy2 - cy1),
+                                                 interpolation=cv2.INTER_NEAREST)
 
         # Largest connected component
         n_lbl, labels, stats, _ = cv2.connectedComponentsWithStats(mask_full, 8)
@@ -223,6 +298,7 @@ def process_plant_image(bucket, key):
             mask_full = (labels == largest).astype(np.uint8) * 255
 
         pdata['mask'] = mask_full
+        seg_seconds = time.perf_counter() - seg_start
 
         # Save images
         try:
@@ -243,49 +319,44 @@ def process_plant_image(bucket, key):
         segmented = cv2.bitwise_and(comp, comp, mask=mask_full)
         save_image_to_s3(bucket, f"{prefix}/segmented.png", segmented)
 
-        # optional: texture visualization per-plant (uses pdata)
-        print("▶ Analyzing texture features")
-        try:
-            analyze_texture_features(
-                pdata,
-                key=plant_id,
-                s3_bucket=bucket,
-                s3_prefix=prefix
-            )
-            print("Texture features analyzed")
-        except Exception as e:
-            print(f"[WARN] analyze_texture_features failed: {e}")
-
-    # 4) Vegetation indices (over flats) + JSON
-    flats = compute_veg_indices(flats, bucket, prefix)
-    veg_features = compute_veg_index_features(flats)
+        if stage_keys:
+            cache_records.append(stage_record("segmentation", stage_keys["segmentation"], prefix,
+                                              {"mask_key": f"{prefix}/mask.png"}))
+
+    # 4) Texture, vegetation indices and morphology only depend on the
+    #    composite, spectral stack and mask: run them side by side.
+    print("▶ Running texture / vegetation index / morphology stages")
+    cached_stages = {}
+    if stage_keys:
+        for stage in STAGES:
+            hit = lookup_stage(s3, bucket, stage, stage_keys[stage], prefix)
+            if hit is not None:
+                cached_stages[stage] = hit["output"]
+        if cached_stages:
+            print(f"Stage cache hits: {', '.join(sorted(cached_stages))}")
+    stage_results, stage_timings = run_independent_stages(
+        pdata, flat_key, plant_id, bucket, prefix,
+        stages=[s for s in STAGES if s not in cached_stages], upload_stats=worker_uploads)
+    stage_timings["segmentation"] = seg_seconds
+    if stage_keys:
+        for stage, output in stage_results.items():
+            if output is not None:
+                cache_records.append(stage_record(stage, stage_keys[stage], prefix,
+                                                  _cacheable_output(stage, output)))
+    stage_results.update(cached_stages)
+    print("Stage timings (s): " + ", ".join(f"{k}={v:.2f}" for k, v in stage_timings.items()))
+
+    # 5) Vegetation indices JSON
+    veg_features = stage_results.get("vegetation_indices") or []
     save_json_to_s3(veg_features, bucket, f"{prefix}/vegetation_indices/vegetation_features.json")
 
-    # 5) Aggregate texture features (over flats) + JSON
-    texture_features = compute_texture_features(flats)
+    # 6) Texture features JSON
+    texture_features = stage_results.get("texture") or []
     save_json_to_s3(texture_features, bucket, f"{prefix}/texture/texture_features.json")
 
-    # 6) Morphology (new) — build refined_plants and run
-    print("▶ Extracting morphology features")
-    # We’ll use the single plant_id as the key in refined_plants
-    # Pull composite/mask from the (only) flats entry:
-    # NOTE: if you ever expand to multiple entries, extend this.
-    any_pdata = next(iter(flats.values()))
-    if "composite" in any_pdata and "mask" in any_pdata:
-        refined_plants = {
-            plant_id: {
-                "composite": any_pdata["composite"],
-                "mask": any_pdata["mask"],
-            }
-        }
-    else:
-        print("[WARN] Missing composite/mask; skipping morphology.")
-        refined_plants = {}
-
-    morph_results = {}
-    if refined_plants:
-        morph_results = create_morphology_outputs(refined_plants)
-
+    # 7) Morphology traits + images + CSV
+    morph_results = stage_results.get("morphology") or {}
+    if morph_results:
         # Save traits + images to S3
         for pid, mr in morph_results.items():
             # traits JSON
@@ -310,5 +381,7 @@ def process_plant_image(bucket, key):
         "vegetation_indices": veg_features,
         "texture_features": texture_features,
         "morphology": morph_results,
-        "mask_path": f"{prefix}/mask.png"
+        "mask_path": f"{prefix}/mask.png",
+        "stage_timings": stage_timings,
+        "cached_stages": (["segmentation"] if seg_cached else []) + sorted(cached_stages)
     }
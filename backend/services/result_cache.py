@@ -0,0 +1,191 @@
+# backend/services/result_cache.py
+"""
+Content-addressed cache for pipeline results.
+
+Keys are sha256 digests of what a result actually depends on:
+
+    result key        = H(source TIFF ETag, bbox JSON ETag, pipeline version)
+    segmentation key  = H(source ETag, bbox ETag, segmentation version)
+    <stage> key       = H(segmentation key, <stage> version)   (texture,
+                        vegetation_indices, morphology)
+
+A version is the hash of the stage's source files plus the env settings
+that change its output, so editing only the texture code invalidates only
+the texture stage. Records are small JSON objects in the results bucket:
+
+    cache/results/{key}.json          -> {"result_key": ...}
+    cache/stages/{stage}/{key}.json   -> {"prefix": ..., "output": ...}
+
+RESULT_CACHE=0 disables lookups and writes; CACHE_VERSION_SALT forces a
+new namespace without touching the code.
+"""
+import os
+import json
+import hashlib
+from functools import lru_cache
+from pathlib import Path
+
+from botocore.exceptions import ClientError
+
+from backend.services.bbox_index import get_bbox_index
+
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE", "1").lower() not in ("0", "false", "no")
+CACHE_PREFIX = "cache"
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+# Source files (relative to the repo root) and env settings per stage
+STAGE_SOURCES = {
+    "segmentation": [
+        "src/data_loader.py",
+        "src/frame_cache.py",
+        "src/composite.py",
+        "backend/services/pipeline_runner.py",
+        "backend/services/segmentation_batcher.py",
+        "backend/services/model_registry.py",
+        "backend/services/segmentation_backends.py",
+        "backend/services/bbox_index.py",
+    ],
+    "texture": [
+        "src/feature_texture.py",
+        "src/DBC_Lacunarity.py",
+        "src/lacunarity.py",
+        "src/spectral_projection.py",
+        "src/colormap_render.py",
+        "src/lazy_artifacts.py",
+    ],
+    "vegetation_indices": [
+        "src/features.py",
+        "src/veg_index_engine.py",
+        "src/fused_stats.py",
+        "src/colormap_render.py",
+        "src/lazy_artifacts.py",
+    ],
+    "morphology": [
+        "src/morphology.py",
+    ],
+}
+STAGE_SETTINGS = {
+    "segmentation": ["RMBG_MODEL_ID", "SEGMENTATION_BACKEND", "SEGMENTATION_QUANTIZE", "SEGMENTATION_CROP",
+                     "SEGMENTATION_CROP_MARGIN", "SEGMENTATION_MIN_SIZE", "SEGMENTATION_MAX_SIZE"],
+    "texture": ["ARTIFACT_MODE", "IMAGE_RENDERER", "LACUNARITY_WINDOW", "LACUNARITY_SCALES",
+                "EHD_COMPACT", "SPECTRAL_BASIS"],
+    "vegetation_indices": ["ARTIFACT_MODE", "IMAGE_RENDERER", "VEG_INDEX_DTYPE"],
+    "morphology": ["ARTIFACT_MODE"],
+}
+DOWNSTREAM_STAGES = ("texture", "vegetation_indices", "morphology")
+
+
+def _digest(*parts):
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(str(p).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+# -----------------------------
+# Versions
+# -----------------------------
+@lru_cache(maxsize=None)
+def stage_version(stage):
+    h = hashlib.sha256(os.getenv("CACHE_VERSION_SALT", "").encode("utf-8"))
+    for rel in STAGE_SOURCES[stage]:
+        path = REPO_ROOT / rel
+        h.update(rel.encode("utf-8"))
+        h.update(path.read_bytes() if path.exists() else b"<missing>")
+    for name in STAGE_SETTINGS[stage]:
+        h.update(f"{name}={os.getenv(name, '')}".encode("utf-8"))
+    return h.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def pipeline_version():
+    return _digest(*(f"{s}:{stage_version(s)}" for s in STAGE_SOURCES))
+
+
+# -----------------------------
+# Fingerprints / keys
+# -----------------------------
+def object_etag(s3, bucket, key):
+    """ETag of an S3 object, or None if it does not exist."""
+    try:
+        return s3.head_object(Bucket=bucket, Key=key)["ETag"].strip('"')
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+
+
+def input_fingerprint(s3, bucket, key, plant_id):
+    """ETags of everything a run reads: the source TIFF and its bbox JSON."""
+    return {
+        "source": object_etag(s3, bucket, key),
+        # from the bbox index's listing, no extra request per image
+        "bbox": get_bbox_index(bucket, s3=s3).etag(plant_id),
+    }
+
+
+def result_cache_key(fingerprint):
+    return _digest("result", fingerprint["source"], fingerprint["bbox"], pipeline_version())
+
+
+def stage_cache_keys(fingerprint):
+    seg = _digest("segmentation", fingerprint["source"], fingerprint["bbox"], stage_version("segmentation"))
+    keys = {"segmentation": seg}
+    for stage in DOWNSTREAM_STAGES:
+        keys[stage] = _digest(stage, seg, stage_version(stage))
+    return keys
+
+
+# -----------------------------
+# Records
+# -----------------------------
+def _record_key(kind, key):
+    return f"{CACHE_PREFIX}/{kind}/{key}.json"
+
+
+def load_record(s3, bucket, kind, key):
+    try:
+        body = s3.get_object(Bucket=bucket, Key=_record_key(kind, key))["Body"].read()
+        return json.loads(body)
+    except ClientError:
+        return None
+    except ValueError:
+        print(f"[WARN] Ignoring malformed cache record {kind}/{key}")
+        return None
+
+
+def save_record(s3, bucket, kind, key, record):
+    s3.put_object(Bucket=bucket, Key=_record_key(kind, key), Body=json.dumps(record),
+                  ContentType="application/json")
+
+
+def lookup_result(s3, bucket, fingerprint):
+    """Existing result JSON key for these inputs and this pipeline version, or None."""
+    if fingerprint.get("source") is None:
+        return None
+    record = load_record(s3, bucket, "results", result_cache_key(fingerprint))
+    if not record or object_etag(s3, bucket, record.get("result_key", "")) is None:
+        return None
+    return record["result_key"]
+
+
+def store_result(s3, bucket, fingerprint, result_key):
+    if fingerprint.get("source") is None:
+        return
+    save_record(s3, bucket, "results", result_cache_key(fingerprint),
+                {"result_key": result_key, "fingerprint": fingerprint, "pipeline_version": pipeline_version()})
+
+
+def lookup_stage(s3, bucket, stage, stage_key, prefix):
+    """Cached output of one stage, valid only for the same results prefix."""
+    record = load_record(s3, bucket, f"stages/{stage}", stage_key)
+    if not record or record.get("prefix") != prefix:
+        return None
+    return record
+
+
+def stage_record(stage, stage_key, prefix, output):
+    return {"kind": f"stages/{stage}", "key": stage_key,
+            "record": {"prefix": prefix, "output": output, "version": stage_version(stage)}}
@@ -0,0 +1,155 @@
+# backend/services/result_manifest.py
+"""
+Per-plant result manifest: `results/{date}/{plant_id}/manifest.json`.
+
+Written once per run after the run's uploads are flushed. It lists every
+artifact under the plant's results prefix (key relative to the prefix,
+size, content type) and inlines the run's result JSON, so readers need
+one GET instead of a prefix listing plus a fetch per JSON document:
+
+    {
+      "version": 1,
+      "created": "...", "source_key": "...", "result_key": "...",
+      "artifacts": {"texture/red/03_lbp.png": {"size": ..., "content_type": "image/png"}, ...},
+      "stage_timings": {...}, "cached_stages": [...],
+      "result": {...}
+    }
+
+"result" is the result JSON (`result_key`) exactly as stored; the numeric
+features (vegetation / texture feature JSONs, morphology traits) are read
+from it by manifest_features rather than stored a second time. Older
+manifests carry those in a "features" object instead and no "result";
+readers accept both.
+
+Stages served from the result cache do not re-upload their artifacts, so
+entries are carried over from the previous manifest (or, for results
+written before manifests existed, from one listing of the prefix).
+"""
+import json
+import mimetypes
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def manifest_key(prefix):
+    return f"{prefix.rstrip('/')}/{MANIFEST_NAME}"
+
+
+def load_manifest(s3, bucket, prefix):
+    """Manifest dict for a results prefix, or None if there is none (or it is unreadable)."""
+    try:
+        body = s3.get_object(Bucket=bucket, Key=manifest_key(prefix))["Body"].read()
+    except ClientError:
+        return None
+    try:
+        manifest = json.loads(body)
+    except ValueError:
+        print(f"[WARN] Ignoring malformed manifest under {prefix}")
+        return None
+    return manifest if manifest.get("version") == MANIFEST_VERSION else None
+
+
+def _listed_artifacts(s3, bucket, prefix):
+    base = prefix.rstrip('/') + '/'
+    out = {}
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=base):
+        for obj in page.get('Contents', []):
+            rel = obj['Key'][len(base):]
+            if rel and rel != MANIFEST_NAME:
+                out[rel] = {"size": obj.get('Size'), "content_type": mimetypes.guess_type(rel)[0]}
+    return out
+
+
+def build_manifest(s3, bucket, prefix, source_key, result_key, result, uploaded):
+    """
+    `uploaded` is the run's [(key, size, content_type)] (ArtifactWriter.flush
+    "artifacts" plus the result JSON); `result` is process_plant_image's
+    return value as written to `result_key`.
+    """
+    base = prefix.rstrip('/') + '/'
+    artifacts = {}
+    if result.get("cached_stages"):
+        previous = load_manifest(s3, bucket, prefix)
+        if previous is not None:
+            artifacts.update(previous.get("artifacts", {}))
+        else:
+            try:
+                artifacts.update(_listed_artifacts(s3, bucket, prefix))
+            except ClientError as e:
+                print(f"[WARN] Could not list {base} for the manifest: {e}")
+    for key, size, content_type in uploaded:
+        if key.startswith(base):
+            artifacts[key[len(base):]] = {"size": size, "content_type": content_type}
+
+    return {
+        "version": MANIFEST_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "source_key": source_key,
+        "result_key": result_key,
+        "artifacts": dict(sorted(artifacts.items())),
+        "stage_timings": result.get("stage_timings", {}),
+        "cached_stages": result.get("cached_stages", []),
+        "result": result,
+    }
+
+
+def manifest_features(manifest):
+    """
+    {"vegetation_features", "texture_features", "morphology": {plant_id:
+    {"size_traits", "morphology_traits"}}} from the inlined result, or the
+    "features" object of a manifest written before results were inlined.
+    """
+    if "result" not in manifest:
+        return manifest.get("features", {})
+    result = manifest["result"] or {}
+    return {
+        "vegetation_features": result.get("vegetation_indices") or [],
+        "texture_features": result.get("texture_features") or [],
+        "morphology": {pid: {"size_traits": r.get("size_traits", {}),
+                             "morphology_traits": r.get("morphology_traits", {})}
+                       for pid, r in (result.get("morphology") or {}).items()},
+    }
+
+
+def manifest_artifact_keys(manifest, prefix):
+    base = prefix.rstrip('/') + '/'
+    return [base + rel for rel in manifest.get("artifacts", {})]
+
+
+def manifest_documents(manifest, prefix):
+    """
+    {key: parsed JSON} for the documents whose content the manifest inlines
+    (feature JSONs, morphology traits and, when stored, the result JSON),
+    so readers can skip fetching them.
+    """
+    base = prefix.rstrip('/') + '/'
+    features = manifest_features(manifest)
+    docs = {
+        f"{base}vegetation_indices/vegetation_features.json": features.get("vegetation_features", []),
+        f"{base}texture/texture_features.json": features.get("texture_features", []),
+    }
+    for pid, traits in features.get("morphology", {}).items():
+        docs[f"{base}morphology/{pid}_traits.json"] = traits
+    if manifest.get("result_key") and "result" in manifest:
+        docs[manifest["result_key"]] = manifest["result"]
+    listed = set(manifest_artifact_keys(manifest, prefix))
+    return {k: v for k, v in docs.items() if k in listed}
+
+
+def merged_morphology_traits(morphology):
+    """Size + morphology traits as one flat dict (the processed_images / frontend shape)."""
+    merged = {}
+    for traits in (morphology or {}).values():
+        merged.update(traits.get("size_traits", {}))
+        merged.update(traits.get("morphology_traits", {}))
+    return merged
+
+
+def save_manifest(s3, bucket, prefix, manifest):
+    s3.put_object(Bucket=bucket, Key=manifest_key(prefix), Body=json.dumps(manifest),
+                  ContentType="application/json")
@@ -0,0 +1,340 @@
+# backend/services/results_sync.py
+"""
+Incremental results/ -> processed_images sync.
+
+Which plants to look at comes from one of two sources:
+
+    events  every run appends its results prefix to the Redis stream
+            RESULTS_EVENTS_STREAM (see publish_result_event); the sync
+            reads the stream from the last id it committed
+    scan    date / plant folders are listed with Delimiter='/' starting
+            at the newest date seen by the previous scan (the high-water
+            mark); `full=True` starts from the beginning
+
+Prefixes whose manifest could not be read are kept in sync_retry
+(committed together with the stream id / watermark that moved past them)
+and retried with the event batches, at most every SYNC_RETRY_DELAY_SECONDS
+and up to SYNC_MAX_RETRIES times.
+
+Either way each plant costs one conditional GET of its manifest.json
+(If-None-Match with the ETag stored at the last sync), so unchanged
+prefixes are skipped without a body download or a DB write. Manifests are
+fetched concurrently and changed rows are written in batches with
+psycopg2's execute_values (multi-row DELETE + INSERT per batch) together
+with the new ETags and the stream id / watermark, in one transaction.
+
+Results written before manifests existed fall back to the per-file feature
+JSONs once; S3_ENDPOINT_URL points the client at MinIO or another
+S3-compatible store.
+"""
+import os
+import json
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from backend.services.result_manifest import (MANIFEST_VERSION, manifest_features, manifest_key,
+                                              merged_morphology_traits)
+
+RESULTS_PREFIX = "results/"
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+RESULTS_EVENTS_URL = os.getenv("RESULTS_EVENTS_URL", os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0"))
+RESULTS_EVENTS_STREAM = os.getenv("RESULTS_EVENTS_STREAM", "results:manifests")
+RESULTS_EVENTS_MAXLEN = int(os.getenv("RESULTS_EVENTS_MAXLEN", "100000"))
+SYNC_FETCH_WORKERS = int(os.getenv("SYNC_FETCH_WORKERS", "16"))
+SYNC_BATCH_SIZE = int(os.getenv("SYNC_BATCH_SIZE", "500"))
+SYNC_MAX_RETRIES = int(os.getenv("SYNC_MAX_RETRIES", "10"))
+SYNC_RETRY_DELAY_SECONDS = float(os.getenv("SYNC_RETRY_DELAY_SECONDS", "60"))
+
+LEGACY_ETAG = "legacy"  # synced from the per-file JSONs (no manifest yet)
+
+STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_state (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS sync_manifests (
+    prefix TEXT PRIMARY KEY,
+    etag TEXT NOT NULL,
+    synced_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS sync_retry (
+    prefix TEXT PRIMARY KEY,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    failed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+"""
+
+
+def s3_client(workers=SYNC_FETCH_WORKERS):
+    return boto3.client('s3', endpoint_url=S3_ENDPOINT_URL,
+                        config=Config(max_pool_connections=max(10, workers)))
+
+
+def redis_client(url=RESULTS_EVENTS_URL):
+    import redis
+    return redis.Redis.from_url(url, decode_responses=True)
+
+
+# -----------------------------
+# Events
+# -----------------------------
+_REDIS = None
+
+
+def publish_result_event(prefix):
+    """Announce a finished run; failures only warn (the scan catches up)."""
+    global _REDIS
+    try:
+        if _REDIS is None:
+            _REDIS = redis_client()
+        _REDIS.xadd(RESULTS_EVENTS_STREAM, {"prefix": prefix.rstrip('/')},
+                    maxlen=RESULTS_EVENTS_MAXLEN, approximate=True)
+    except Exception as e:
+        print(f"[WARN] Could not publish result event for {prefix}: {e}")
+        _REDIS = None
+
+
+def read_events(r, last_id, count=SYNC_BATCH_SIZE, block_ms=None):
+    """[(stream id, prefix)] after `last_id`."""
+    out = []
+    for _, entries in r.xread({RESULTS_EVENTS_STREAM: last_id}, count=count, block=block_ms) or []:
+        for entry_id, fields in entries:
+            out.append((entry_id, fields.get("prefix")))
+    return out
+
+
+# -----------------------------
+# State
+# -----------------------------
+def ensure_state_tables(conn):
+    with conn.cursor() as cur:
+        cur.execute(STATE_SCHEMA)
+    conn.commit()
+
+
+def get_state(conn, name, default=None):
+    with conn.cursor() as cur:
+        cur.execute("SELECT value FROM sync_state WHERE name = %s", (name,))
+        row = cur.fetchone()
+    return row[0] if row else default
+
+
+def _set_state(cur, name, value):
+    cur.execute(
+        "INSERT INTO sync_state (name, value) VALUES (%s, %s) "
+        "ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value, updated_at = now()",
+        (name, value))
+
+
+def known_etags(conn, prefixes):
+    with conn.cursor() as cur:
+        cur.execute("SELECT prefix, etag FROM sync_manifests WHERE prefix = ANY(%s)", (list(prefixes),))
+        return dict(cur.fetchall())
+
+
+def retrying(conn, prefixes):
+    """The subset of `prefixes` currently in sync_retry."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT prefix FROM sync_retry WHERE prefix = ANY(%s)", (list(prefixes),))
+        return {p for p, in cur.fetchall()}
+
+
+def pending_retries(conn, limit=SYNC_BATCH_SIZE, max_attempts=SYNC_MAX_RETRIES, delay=SYNC_RETRY_DELAY_SECONDS):
+    """Oldest failed prefixes under `max_attempts` whose last failure is `delay` seconds old."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT prefix FROM sync_retry WHERE attempts < %s AND failed_at <= now() - %s * interval '1 second' "
+                    "ORDER BY failed_at LIMIT %s", (max_attempts, delay, limit))
+        return [p for p, in cur.fetchall()]
+
+
+# -----------------------------
+# Candidates
+# -----------------------------
+def _subfolders(s3, bucket, prefix):
+    paginator = s3.get_paginator('list_objects_v2')
+    out = []
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix, Delimiter='/'):
+        out.extend(cp['Prefix'] for cp in page.get('CommonPrefixes', []))
+    return out
+
+
+def _is_date(name):
+    try:
+        datetime.strptime(name, '%Y-%m-%d')
+        return True
+    except ValueError:
+        return False
+
+
+def scan_prefixes(s3, bucket, since_date=None, workers=SYNC_FETCH_WORKERS):
+    """results/{date}/{plant_id} prefixes for dates >= `since_date` (all dates if None)."""
+    dates = [p for p in _subfolders(s3, bucket, RESULTS_PREFIX) if _is_date(p[len(RESULTS_PREFIX):-1])]
+    if since_date:
+        dates = [p for p in dates if p[len(RESULTS_PREFIX):-1] >= since_date]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        plants = ex.map(lambda d: _subfolders(s3, bucket, d), dates)
+        return [p.rstrip('/') for folder in plants for p in folder]
+
+
+# -----------------------------
+# Rows
+# -----------------------------
+def _row(prefix, veg, morph, texture):
+    _, date_str, plant_id = prefix.rstrip('/').split('/')[-3:]
+    return (
+        plant_id,
+        f"{prefix}/original.png",
+        datetime.strptime(date_str, '%Y-%m-%d').date(),
+        json.dumps(veg) if veg else None,
+        json.dumps(morph) if morph else None,
+        json.dumps(texture) if texture else None,
+    )
+
+
+def _get_json(s3, bucket, key):
+    try:
+        return json.loads(s3.get_object(Bucket=bucket, Key=key)['Body'].read())
+    except (ClientError, ValueError):
+        return None
+
+
+def fetch_row(s3, bucket, prefix, etag=None):
+    """
+    (row, etag) for a changed prefix, None when its manifest still has
+    `etag` (or a legacy prefix was already synced).
+    """
+    kwargs = {"IfNoneMatch": f'"{etag}"'} if etag and etag != LEGACY_ETAG else {}
+    try:
+        resp = s3.get_object(Bucket=bucket, Key=manifest_key(prefix), **kwargs)
+    except ClientError as e:
+        code = str(e.response.get("Error", {}).get("Code"))
+        if code in ("304", "NotModified"):
+            return None
+        if code not in ("404", "NoSuchKey", "NotFound"):
+            raise
+        if etag:
+            return None
+        # written before manifests existed
+        return _row(prefix,
+                    _get_json(s3, bucket, f"{prefix}/vegetation_indices/vegetation_features.json"),
+                    _get_json(s3, bucket, f"{prefix}/morphology_features.json"),
+                    _get_json(s3, bucket, f"{prefix}/texture/texture_features.json")), LEGACY_ETAG
+    manifest = json.loads(resp['Body'].read())
+    if manifest.get("version") != MANIFEST_VERSION:
+        print(f"[WARN] Skipping {prefix}: manifest version {manifest.get('version')}")
+        return None
+    features = manifest_features(manifest)
+    row = _row(prefix, features.get("vegetation_features"), merged_morphology_traits(features.get("morphology")),
+               features.get("texture_features"))
+    return row, resp['ETag'].strip('"')
+
+
+def write_rows(conn, rows, etags, state=None, failed=(), resolved=()):
+    """
+    Replace the rows of these (plant_id, date) pairs, record ETags / state,
+    add `failed` prefixes to sync_retry and drop `resolved` ones; one
+    transaction.
+    """
+    from psycopg2.extras import execute_values
+    with conn.cursor() as cur:
+        if failed:
+            execute_values(cur, "INSERT INTO sync_retry (prefix) VALUES %s ON CONFLICT (prefix) "
+                                "DO UPDATE SET attempts = sync_retry.attempts + 1, failed_at = now()",
+                           [(p,) for p in failed])
+        if resolved:
+            cur.execute("DELETE FROM sync_retry WHERE prefix = ANY(%s)", (list(resolved),))
+        if rows:
+            execute_values(cur, "DELETE FROM processed_images p USING (VALUES %s) AS v(plant_id, date) "
+                                "WHERE p.plant_id = v.plant_id AND p.date = v.date",
+                           [(r[0], r[2]) for r in rows])
+            execute_values(cur, "INSERT INTO processed_images (plant_id, image_key, date, vegetation_features, "
+                                "morphology_features, texture_features) VALUES %s", rows)
+            execute_values(cur, "INSERT INTO sync_manifests (prefix, etag) VALUES %s ON CONFLICT (prefix) "
+                                "DO UPDATE SET etag = EXCLUDED.etag, synced_at = now()", etags)
+        for name, value in (state or {}).items():
+            _set_state(cur, name, value)
+    conn.commit()
+
+
+# -----------------------------
+# Sync
+# -----------------------------
+def sync_prefixes(s3, bucket, conn, prefixes, state=None, workers=SYNC_FETCH_WORKERS, batch_size=SYNC_BATCH_SIZE):
+    """
+    Sync the given prefixes. `state` ({name: value}) is committed with the
+    last batch, together with the prefixes that failed (into sync_retry)
+    and the retried ones that went through (out of it). Returns counts and
+    rows/sec.
+    """
+    prefixes = list(dict.fromkeys(p.rstrip('/') for p in prefixes if p))
+    t0 = time.perf_counter()
+    stats = {"prefixes": len(prefixes), "written": 0, "unchanged": 0, "failed": 0}
+    known = known_etags(conn, prefixes) if prefixes else {}
+    retried = retrying(conn, prefixes) if prefixes else set()
+    failed = []
+
+    def fetch(prefix):
+        try:
+            return prefix, fetch_row(s3, bucket, prefix, known.get(prefix))
+        except Exception as e:
+            print(f"[WARN] Could not read {prefix}: {e}")
+            return prefix, False
+
+    rows, etags = [], []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        for prefix, got in ex.map(fetch, prefixes):
+            if got is False:
+                stats["failed"] += 1
+                failed.append(prefix)
+                continue
+            if got is None:
+                stats["unchanged"] += 1
+                continue
+            row, etag = got
+            rows.append(row)
+            etags.append((prefix, etag))
+            if len(rows) >= batch_size:
+                write_rows(conn, rows, etags)
+                stats["written"] += len(rows)
+                rows, etags = [], []
+    write_rows(conn, rows, etags, state, failed=failed, resolved=retried.difference(failed))
+    stats["written"] += len(rows)
+    stats["seconds"] = time.perf_counter() - t0
+    stats["rows_per_sec"] = stats["written"] / max(stats["seconds"], 1e-9)
+    return stats
+
+
+def run_scan(s3, bucket, conn, full=False, **kwargs):
+    """Scan from the stored high-water mark date (or everything with `full`)."""
+    since = None if full else get_state(conn, "scan_watermark_date")
+    prefixes = scan_prefixes(s3, bucket, since_date=since)
+    dates = [p.split('/')[-2] for p in prefixes]
+    state = {"scan_watermark_date": max(dates)} if dates else None
+    stats = sync_prefixes(s3, bucket, conn, prefixes, state=state, **kwargs)
+    stats["since"] = since
+    return stats
+
+
+def run_events(s3, bucket, conn, r, block_ms=None, **kwargs):
+    """
+    Sync one batch of stream events after the committed stream id, plus
+    the pending sync_retry prefixes; None if there was neither. Failed
+    prefixes go to sync_retry, so the stream id can move past them.
+    """
+    batch_size = kwargs.get("batch_size", SYNC_BATCH_SIZE)
+    last_id = get_state(conn, "events_last_id", "0-0")
+    retries = pending_retries(conn, limit=batch_size)
+    events = read_events(r, last_id, count=batch_size, block_ms=block_ms)
+    if not events and not retries:
+        return None
+    state = {"events_last_id": events[-1][0]} if events else None
+    stats = sync_prefixes(s3, bucket, conn, retries + [p for _, p in events], state=state, **kwargs)
+    stats["events"] = len(events)
+    stats["retried"] = len(retries)
+    return stats
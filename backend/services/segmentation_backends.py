@@ -0,0 +1,128 @@
+# backend/services/segmentation_backends.py
+"""
+Pluggable inference backends for RMBG segmentation.
+
+Every backend takes a float32 batch (N, 3, H, W) normalised like
+pipeline_runner.TRANSFORM_IMAGE and returns foreground probabilities
+(N, H, W) as a numpy array:
+
+    torch        eager PyTorch model from the model registry (default);
+                 SEGMENTATION_QUANTIZE=1 applies dynamic int8 quantization
+                 to its Linear layers
+    torchscript  traced graph  {MODELS_DIRECTORY}/rmbg.torchscript[.int8].pt
+    onnx         ONNX Runtime  {MODELS_DIRECTORY}/rmbg[.int8].onnx
+
+Graphs are produced by scripts/export_segmentation_model.py.
+SEGMENTATION_THREADS sets the intra-op thread count (0 keeps the library
+default). The selected backend is registered as model "segmenter".
+With SEGMENTATION_CROP=1 input sizes vary per plant: use the torch
+backend or an ONNX graph exported with --dynamic-size.
+"""
+import os
+import copy
+from pathlib import Path
+
+import numpy as np
+
+from backend.services.model_registry import MODELS_DIRECTORY, get_device, get_model, register_model
+
+SEGMENTATION_BACKEND = os.getenv("SEGMENTATION_BACKEND", "torch").lower()
+SEGMENTATION_THREADS = int(os.getenv("SEGMENTATION_THREADS", "0"))
+SEGMENTATION_QUANTIZE = os.getenv("SEGMENTATION_QUANTIZE", "0").lower() in ("1", "true", "yes")
+
+
+def exported_model_path(backend, quantized=False):
+    suffix = ".int8" if quantized else ""
+    name = {"torchscript": f"rmbg.torchscript{suffix}.pt", "onnx": f"rmbg{suffix}.onnx"}[backend]
+    return Path(MODELS_DIRECTORY) / name
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def _set_torch_threads(threads):
+    if threads > 0:
+        import torch
+        torch.set_num_threads(threads)
+
+
+class TorchBackend:
+    name = "torch"
+
+    def __init__(self, model, quantize=False, threads=0):
+        import torch
+        _set_torch_threads(threads)
+        if quantize:
+            # quantize a CPU copy: `model` is the registry's shared "rmbg" instance
+            model = torch.ao.quantization.quantize_dynamic(copy.deepcopy(model).cpu(), {torch.nn.Linear},
+                                                           dtype=torch.qint8)
+        self.model = model
+        self.device = "cpu" if quantize else get_device()
+
+    def predict(self, batch):
+        import torch
+        batch = torch.as_tensor(batch).to(self.device)
+        with torch.no_grad():
+            preds = self.model(batch)[-1].sigmoid()
+        return preds.cpu().numpy()[:, 0]
+
+
+class TorchScriptBackend:
+    name = "torchscript"
+
+    def __init__(self, path, threads=0):
+        import torch
+        _set_torch_threads(threads)
+        self.device = get_device()
+        self.model = torch.jit.load(str(path), map_location=self.device).eval()
+
+    def predict(self, batch):
+        import torch
+        batch = torch.as_tensor(batch).to(self.device)
+        with torch.no_grad():
+            out = self.model(batch)
+        logits = out[-1] if isinstance(out, (list, tuple)) else out
+        return logits.sigmoid().cpu().numpy()[:, 0]
+
+
+class OnnxBackend:
+    name = "onnx"
+
+    def __init__(self, path, threads=0):
+        import onnxruntime as ort
+        opts = ort.SessionOptions()
+        if threads > 0:
+            opts.intra_op_num_threads = threads
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        providers = [p for p in ("CUDAExecutionProvider", "CPUExecutionProvider")
+                     if p in ort.get_available_providers()]
+        self.session = ort.InferenceSession(str(path), sess_options=opts, providers=providers)
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        batch = np.ascontiguousarray(np.asarray(batch, dtype=np.float32))
+        logits = self.session.run(None, {self.input_name: batch})[-1]
+        return _sigmoid(logits)[:, 0]
+
+
+def create_backend(name=None, quantize=None, threads=None):
+    """Build a backend by name; exported graphs must exist under MODELS_DIRECTORY."""
+    name = (name or SEGMENTATION_BACKEND).lower()
+    quantize = SEGMENTATION_QUANTIZE if quantize is None else quantize
+    threads = SEGMENTATION_THREADS if threads is None else threads
+    if name == "torch":
+        model = get_model("rmbg")
+        if model is None:
+            raise RuntimeError("RMBG model not available")
+        return TorchBackend(model, quantize=quantize, threads=threads)
+    if name in ("torchscript", "onnx"):
+        path = exported_model_path(name, quantize)
+        if not path.exists():
+            raise FileNotFoundError(f"{path} not found; run scripts/export_segmentation_model.py")
+        cls = TorchScriptBackend if name == "torchscript" else OnnxBackend
+        return cls(path, threads=threads)
+    raise ValueError(f"Unknown SEGMENTATION_BACKEND: {name}")
+
+
+register_model("segmenter", create_backend)
@@ -0,0 +1,166 @@
+# backend/services/segmentation_batcher.py
+
+import os
+import queue
+import contextlib
+import contextvars
+import threading
+import time
+from concurrent.futures import Future
+
+
+class SegmentationBatcher:
+    """
+    Collects segmentation inputs from concurrent callers into one batch and
+    runs the model once per batch.
+
+    predict_fn: callable(list_of_inputs) -> sequence of outputs (same order)
+    max_batch_size: upper bound on inputs per model call
+    max_wait_ms: how long the first queued input waits for company
+    group_key: callable(input) -> hashable; inputs collected together but
+        with different keys go to separate predict_fn calls (default: the
+        input's shape, so differently sized inputs are never stacked)
+
+    Callers use `segment(x)` (blocking) or `submit(x)` (returns a Future).
+    Callers that wrap their work in `session()` tell the batcher who may
+    still send an input: a batch stops waiting as soon as every open
+    session has submitted (one input per session, e.g. one plant), so a
+    lone caller, or the last of several, never waits max_wait_ms. Without
+    sessions a batch waits for max_batch_size inputs or max_wait_ms.
+    The worker thread is started lazily so the batcher is safe to build
+    at import time in a module that Celery later forks.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=4, max_wait_ms=50.0, group_key=None):
+        self.predict_fn = predict_fn
+        self.group_key = group_key or _shape_key
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._lock = threading.Lock()
+        self._sessions = 0
+        # open sessions that have already submitted their input
+        self._submitted = 0
+        self._current = contextvars.ContextVar(f"segmentation_session_{id(self)}", default=None)
+        self._queue = None
+        self._thread = None
+        self._pid = None
+
+    # -----------------------------
+    # Public API
+    # -----------------------------
+    def submit(self, item):
+        fut = Future()
+        self._ensure_worker()
+        session = self._current.get()
+        if session is not None and not session["submitted"]:
+            # counted before the input is queued, so the batch it joins
+            # does not wait for this session any more
+            with self._lock:
+                session["submitted"] = True
+                self._submitted += 1
+        self._queue.put((item, fut))
+        return fut
+
+    def segment(self, item, timeout=None):
+        return self.submit(item).result(timeout=timeout)
+
+    @contextlib.contextmanager
+    def session(self):
+        """Scope of one caller that may submit an input (e.g. one plant's pipeline run)."""
+        session = {"submitted": False}
+        token = self._current.set(session)
+        with self._lock:
+            self._sessions += 1
+        try:
+            yield self
+        finally:
+            self._current.reset(token)
+            with self._lock:
+                self._sessions -= 1
+                if session["submitted"]:
+                    self._submitted -= 1
+                q = self._queue if self._pid == os.getpid() else None
+            if not session["submitted"] and q is not None:
+                # a batch may be waiting for this session's input
+                q.put(_WAKE)
+
+    def _expect_more(self):
+        """Whether an open batch should keep waiting: some open session has not submitted yet."""
+        with self._lock:
+            return self._sessions == 0 or self._sessions > self._submitted
+
+    def close(self):
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                self._queue.put(None)
+                self._thread.join()
+            self._thread = None
+            self._queue = None
+            self._pid = None
+
+    # -----------------------------
+    # Worker
+    # -----------------------------
+    def _ensure_worker(self):
+        # threads do not survive fork(): restart the worker in a new process
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, args=(self._queue,),
+                                            name="rmbg-batcher", daemon=True)
+            self._thread.start()
+
+    def _collect(self, q, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                # inputs already queued join without waiting
+                nxt = q.get(timeout=remaining) if remaining > 0 and self._expect_more() else q.get_nowait()
+            except queue.Empty:
+                break
+            if nxt is _WAKE:
+                continue
+            if nxt is None:
+                q.put(None)  # re-queue the stop signal for the main loop
+                break
+            batch.append(nxt)
+        return batch
+
+    def _run(self, q):
+        while True:
+            first = q.get()
+            if first is None:
+                return
+            if first is _WAKE:
+                continue
+            groups = {}
+            for item, fut in self._collect(q, first):
+                groups.setdefault(self.group_key(item), []).append((item, fut))
+            for group in groups.values():
+                self._predict(group)
+
+    def _predict(self, group):
+        items = [g[0] for g in group]
+        futures = [g[1] for g in group]
+        try:
+            outputs = self.predict_fn(items)
+            for fut, out in zip(futures, outputs):
+                fut.set_result(out)
+        except Exception as e:
+            for fut in futures:
+                if not fut.done():
+                    fut.set_exception(e)
+
+
+# queue marker: a session closed without submitting, re-check _expect_more
+_WAKE = object()
+
+
+def _shape_key(item):
+    return tuple(getattr(item, "shape", ()))
@@ -0,0 +1,289 @@
+# backend/services/stage_scheduler.py
+
+import os
+import time
+import threading
+import contextvars
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from src.features import compute_veg_indices, compute_veg_index_features
+from src.feature_texture import analyze_texture_features, compute_texture_features
+from src.morphology import create_morphology_outputs
+from src.artifact_writer import get_artifact_writer
+
+# 0 runs the stages inline (one after another) in the calling process
+STAGE_WORKERS = int(os.getenv("PIPELINE_STAGE_WORKERS", "3"))
+# "process", "thread", or "auto": processes unless this process is daemonic,
+# threads then. Celery prefork children are always daemonic and may not start
+# children of their own, so under prefork "auto" means threads; run the worker
+# with --pool threads or solo to get the process pool. The heavy stage work
+# (torch, OpenCV, numpy) releases the GIL; the matplotlib renderer is
+# serialized by colormap_render.PYPLOT_LOCK.
+STAGE_EXECUTOR = os.getenv("PIPELINE_STAGE_EXECUTOR", "auto").lower()
+
+# PlantCV keeps its observations in the global `pcv.outputs`; only matters
+# for inline and thread runs, process workers each have their own copy.
+_MORPHOLOGY_LOCK = threading.Lock()
+
+_POOL = None
+_POOL_KIND = None
+_POOL_PID = None
+_POOL_LOCK = threading.Lock()
+# pid whose process pool could not start; it uses threads from then on
+_PROCESS_POOL_FAILED_PID = None
+
+
+# -----------------------------
+# Shared memory transport
+# -----------------------------
+def _share_arrays(arrays):
+    """
+    Copy named arrays into ONE shared memory block.
+    Returns (SharedMemory, descriptor) where descriptor maps
+    name -> (offset, shape, dtype str) and is cheap to pickle.
+    """
+    layout, offset = {}, 0
+    for name, arr in arrays.items():
+        arr = np.asarray(arr)
+        layout[name] = (offset, arr.shape, arr.dtype.str)
+        offset += -(-arr.nbytes // 64) * 64  # 64-byte aligned slots
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for name, arr in arrays.items():
+        off, shape, dtype = layout[name]
+        dst = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=off)
+        dst[...] = arr
+    return shm, {"name": shm.name, "arrays": layout}
+
+
+def _attach_arrays(desc):
+    shm = shared_memory.SharedMemory(name=desc["name"])
+    arrays = {
+        name: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=off)
+        for name, (off, shape, dtype) in desc["arrays"].items()
+    }
+    return shm, arrays
+
+
+def _pdata_from_arrays(arrays):
+    return {
+        "composite": arrays["composite"],
+        "mask": arrays["mask"],
+        "spectral_stack": {k.split("/", 1)[1]: v for k, v in arrays.items() if k.startswith("spectral_stack/")},
+    }
+
+
+# -----------------------------
+# Stages (module-level so they pickle)
+# -----------------------------
+def texture_stage(pdata, flat_key, plant_id, bucket, prefix):
+    analyze_texture_features(pdata, key=plant_id, s3_bucket=bucket, s3_prefix=prefix)
+    return compute_texture_features({flat_key: pdata})
+
+
+def vegetation_stage(pdata, flat_key, plant_id, bucket, prefix):
+    flats = compute_veg_indices({flat_key: pdata}, bucket, prefix)
+    return compute_veg_index_features(flats)
+
+
+def morphology_stage(pdata, flat_key, plant_id, bucket, prefix):
+    refined_plants = {plant_id: {"composite": pdata["composite"], "mask": pdata["mask"]}}
+    with _MORPHOLOGY_LOCK:
+        return create_morphology_outputs(refined_plants)
+
+
+STAGES = {
+    "texture": texture_stage,
+    "vegetation_indices": vegetation_stage,
+    "morphology": morphology_stage,
+}
+
+
+def _run_stage_in_worker(stage, desc, flat_key, plant_id, bucket, prefix):
+    """
+    Pool entry point: attach to the shared block, run one stage, time it.
+    The stage's uploads are flushed before returning, so its artifacts are
+    in S3 when the parent sees the result; returns (out, seconds, upload
+    stats) so the parent can account for them (see merge_upload_stats).
+    """
+    shm, arrays = _attach_arrays(desc)
+    writer = get_artifact_writer()
+    try:
+        pdata = _pdata_from_arrays(arrays)
+        t0 = time.perf_counter()
+        with writer.task_scope(f"{stage}:{flat_key}:{os.getpid()}") as task_id:
+            try:
+                out = STAGES[stage](pdata, flat_key, plant_id, bucket, prefix)
+            finally:
+                stats = writer.flush(task_id)
+        if stats["failed"]:
+            print(f"[WARN] Stage {stage}: {stats['failed']} uploads failed")
+        return out, time.perf_counter() - t0, stats
+    finally:
+        pdata = arrays = None
+        try:
+            shm.close()
+        except BufferError:
+            # a stage kept a view into the block; the mapping goes away with the process
+            pass
+
+
+def _run_stage_in_thread(stage, pdata, flat_key, plant_id, bucket, prefix):
+    """Thread pool entry point: run one stage on the caller's arrays, time it."""
+    t0 = time.perf_counter()
+    out = STAGES[stage](pdata, flat_key, plant_id, bucket, prefix)
+    return out, time.perf_counter() - t0
+
+
+# -----------------------------
+# Pool management
+# -----------------------------
+def _is_daemonic():
+    if multiprocessing.current_process().daemon:
+        return True
+    try:
+        import billiard  # Celery's multiprocessing fork
+    except ImportError:
+        return False
+    return bool(billiard.current_process().daemon)
+
+
+def _pool_kind():
+    if STAGE_EXECUTOR == "thread" or _PROCESS_POOL_FAILED_PID == os.getpid():
+        return "thread"
+    if STAGE_EXECUTOR == "process":
+        return "process"
+    return "thread" if _is_daemonic() else "process"
+
+
+def _get_pool():
+    """(kind, executor) for this process, kind being 'process' or 'thread'."""
+    global _POOL, _POOL_KIND, _POOL_PID
+    kind = _pool_kind()
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_PID != os.getpid() or _POOL_KIND != kind:
+            if _POOL is not None and _POOL_PID == os.getpid():
+                _POOL.shutdown(wait=False, cancel_futures=True)
+            if kind == "process":
+                # spawn: never fork a process that already holds torch threads / the model
+                _POOL = ProcessPoolExecutor(max_workers=STAGE_WORKERS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+            else:
+                _POOL = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="pipeline-stage")
+            _POOL_KIND = kind
+            _POOL_PID = os.getpid()
+        return _POOL_KIND, _POOL
+
+
+def _reset_pool(failed=False):
+    """Drop the pool; `failed` (it could not start) switches this process to threads."""
+    global _POOL, _PROCESS_POOL_FAILED_PID
+    with _POOL_LOCK:
+        if _POOL is not None and _POOL_PID == os.getpid():
+            _POOL.shutdown(wait=False, cancel_futures=True)
+        _POOL = None
+        if failed:
+            _PROCESS_POOL_FAILED_PID = os.getpid()
+
+
+def _run_inline(pdata, flat_key, plant_id, bucket, prefix, timings, stages):
+    results = {}
+    for stage in stages:
+        t0 = time.perf_counter()
+        try:
+            results[stage] = STAGES[stage](pdata, flat_key, plant_id, bucket, prefix)
+        except Exception as e:
+            print(f"[WARN] Stage {stage} failed: {e}")
+            results[stage] = None
+        timings[stage] = time.perf_counter() - t0
+    return results
+
+
+def _run_threaded(pool, pdata, flat_key, plant_id, bucket, prefix, timings, stages):
+    # each stage runs in a copy of the caller's context, so its uploads
+    # belong to the caller's artifact task and its flush
+    futures = {stage: pool.submit(contextvars.copy_context().run, _run_stage_in_thread,
+                                  stage, pdata, flat_key, plant_id, bucket, prefix)
+               for stage in stages}
+    results = {}
+    for stage, fut in futures.items():
+        try:
+            results[stage], timings[stage] = fut.result()
+        except Exception as e:
+            print(f"[WARN] Stage {stage} failed: {e}")
+            results[stage] = None
+    return results
+
+
+def run_independent_stages(pdata, flat_key, plant_id, bucket, prefix, stages=None, upload_stats=None):
+    """
+    Run texture, vegetation-index and morphology stages for one plant once
+    its mask exists. With PIPELINE_STAGE_WORKERS > 0 the stages run at the
+    same time in a process pool and read composite / mask / spectral bands
+    from shared memory instead of pickled copies, or in a thread pool on
+    the caller's arrays (PIPELINE_STAGE_EXECUTOR, daemonic workers, or a
+    process pool that failed to start).
+
+    Returns (results, timings): results maps stage -> stage output (None if
+    the stage failed); timings maps stage -> seconds spent in the stage plus
+    'independent_stages_wall' for the whole fan-out. `stages` restricts the
+    run to a subset of STAGES (e.g. the ones missing from the result cache).
+
+    Inline and thread runs upload under the caller's artifact task. Process
+    workers flush their own; their upload stats are appended to the
+    `upload_stats` list, if given, for the caller to merge into its flush.
+    """
+    stages = list(STAGES) if stages is None else list(stages)
+    timings = {}
+    t0 = time.perf_counter()
+
+    if not stages or STAGE_WORKERS <= 0:
+        results = _run_inline(pdata, flat_key, plant_id, bucket, prefix, timings, stages)
+        timings["independent_stages_wall"] = time.perf_counter() - t0
+        return results, timings
+
+    kind, pool = _get_pool()
+    if kind == "thread":
+        results = _run_threaded(pool, pdata, flat_key, plant_id, bucket, prefix, timings, stages)
+        timings["independent_stages_wall"] = time.perf_counter() - t0
+        return results, timings
+
+    arrays = {"composite": pdata["composite"], "mask": pdata["mask"]}
+    arrays.update({f"spectral_stack/{b}": v for b, v in pdata["spectral_stack"].items()})
+    shm, desc = _share_arrays(arrays)
+    try:
+        try:
+            futures = {stage: pool.submit(_run_stage_in_worker, stage, desc, flat_key, plant_id, bucket, prefix)
+                       for stage in stages}
+        except (OSError, RuntimeError, AssertionError, BrokenProcessPool) as e:
+            # e.g. daemonic worker processes may not have children
+            print(f"[WARN] Stage process pool unavailable ({e}); using threads in this process from now on.")
+            _reset_pool(failed=True)
+            _, pool = _get_pool()
+            results = _run_threaded(pool, pdata, flat_key, plant_id, bucket, prefix, timings, stages)
+            timings["independent_stages_wall"] = time.perf_counter() - t0
+            return results, timings
+
+        results = {}
+        for stage, fut in futures.items():
+            try:
+                results[stage], timings[stage], stats = fut.result()
+                if upload_stats is not None:
+                    upload_stats.append(stats)
+            except BrokenProcessPool as e:
+                print(f"[WARN] Stage pool broke during {stage}: {e}")
+                _reset_pool()
+                results[stage] = None
+            except Exception as e:
+                print(f"[WARN] Stage {stage} failed: {e}")
+                results[stage] = None
+    finally:
+        shm.close()
+        shm.unlink()
+
+    timings["independent_stages_wall"] = time.perf_counter() - t0
+    return results, timings
@@ -1,12 +1,43 @@
-import boto3
 import json
 import os
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from celery.signals import worker_init, worker_process_init
 from backend.celery_worker import celery_app
+from backend.services import model_registry
+from backend.services.bbox_index import get_bbox_index
 from backend.services.pipeline_runner import process_plant_image
+from backend.services.result_cache import RESULT_CACHE_ENABLED, input_fingerprint, lookup_result, store_result
+from backend.services.result_manifest import build_manifest, save_manifest
+from backend.services.results_sync import publish_result_event
+from backend.services.db_sink import RESULTS_DB_SINK, ResultSink, processed_image_row
+from src.artifact_writer import get_artifact_writer
 
-@celery_app.task
-def analyze_plant_task(bucket, key):
-    s3 = boto3.client('s3')
+SOURCE_PREFIX = "Sorghum_dataset"
+# Plants processed concurrently inside one batch task; >1 lets the RMBG
+# batcher group their segmentation calls.
+BATCH_PLANT_WORKERS = int(os.getenv("BATCH_PLANT_WORKERS", "2"))
+# Load the models in every worker process before it takes its first task
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "1").lower() not in ("0", "false", "no")
+
+
+@worker_process_init.connect
+def warm_up_models(**kwargs):
+    if MODEL_WARMUP:
+        model_registry.warmup(["segmenter"])
+
+
+@worker_init.connect
+def warm_up_models_in_worker(sender=None, **kwargs):
+    # threads / solo pools run the tasks in the worker process itself and
+    # never send worker_process_init; prefork children warm up above
+    pool = getattr(sender, "pool_cls", None)
+    pool = getattr(pool, "__module__", None) or str(pool or "")
+    if "prefork" not in pool:
+        warm_up_models()
+
+
+def result_key_for(key):
     # key example: Sorghum_dataset/2024-12-04/plant7/plant7_frame8.tif
     parts = key.split('/')
     date = parts[1]
@@ -14,8 +45,168 @@ def analyze_plant_task(bucket, key):
     input_filename = os.path.basename(key)  # e.g., 'plant7_frame8.tif'
     base, _ = os.path.splitext(input_filename)  # e.g., 'plant7_frame8'
     result_filename = f"{base}_result.json"  # e.g., 'plant7_frame8_result.json'
-    result = process_plant_image(bucket, key)
+    return f"results/{date}/{plant_id}/{result_filename}"
+
+
+def result_sink():
+    """Buffered processed_images writer for one task, or None with RESULTS_DB_SINK=0."""
+    return ResultSink() if RESULTS_DB_SINK else None
+
+
+def flush_sink(sink):
+    if sink is None:
+        return 0
+    try:
+        return sink.flush()
+    except Exception as e:
+        # the S3 sync still picks the plants up from the event stream
+        print(f"[WARN] Could not write processed_images rows: {e}")
+        return 0
+
+
+def run_and_store(bucket, key, s3, force=False, sink=None):
+    """
+    Run the pipeline for one TIFF and store its result JSON. Returns
+    (result_key, cached): with the result cache on and unchanged inputs /
+    pipeline version, the existing result is returned without rerunning.
+    `force` skips the whole-result lookup (stage records are still reused).
+    The processed_images row of a fresh result is buffered in `sink`.
+    """
+    fingerprint = None
+    if RESULT_CACHE_ENABLED:
+        fingerprint = input_fingerprint(s3, bucket, key, key.split('/')[2])
+        if not force:
+            cached_key = lookup_result(s3, bucket, fingerprint)
+            if cached_key:
+                print(f"Result cache hit for {key}: {cached_key}")
+                return cached_key, True
+
+    result = process_plant_image(bucket, key, s3=s3, fingerprint=fingerprint)
+    artifacts = result.pop("artifacts", []) if result is not None else []
     # Save ONLY in results/ folder
-    result_key = f"results/{date}/{plant_id}/{result_filename}"
-    s3.put_object(Bucket=bucket, Key=result_key, Body=json.dumps(result))
-    return {"result_key": result_key}
+    result_key = result_key_for(key)
+    body = json.dumps(result)
+    s3.put_object(Bucket=bucket, Key=result_key, Body=body)
+    if result is not None:
+        # one GET for readers: every artifact of the run plus the features
+        prefix = result_key.rsplit('/', 1)[0]
+        try:
+            manifest = build_manifest(s3, bucket, prefix, key, result_key, result,
+                                      artifacts + [(result_key, len(body), "application/json")])
+            save_manifest(s3, bucket, prefix, manifest)
+        except Exception as e:
+            # readers fall back to listing the prefix
+            print(f"[WARN] Could not write manifest for {key}: {e}")
+        if sink is not None:
+            sink.add(processed_image_row(prefix, result))
+        # the DB sync picks the plant up from the event stream
+        publish_result_event(prefix)
+    if fingerprint and result is not None and not result.get("upload_stats", {}).get("failed"):
+        store_result(s3, bucket, fingerprint, result_key)
+    return result_key, False
+
+
+@celery_app.task(name="backend.tasks.analyze_plant_task")
+def analyze_plant_task(bucket, key, force=False):
+    s3 = get_artifact_writer().client
+    sink = result_sink()
+    result_key, cached = run_and_store(bucket, key, s3, force=force, sink=sink)
+    flush_sink(sink)
+    return {"result_key": result_key, "cached": cached}
+
+
+def list_source_dates(s3, bucket):
+    paginator = s3.get_paginator('list_objects_v2')
+    dates = []
+    for page in paginator.paginate(Bucket=bucket, Prefix=f"{SOURCE_PREFIX}/", Delimiter='/'):
+        for cp in page.get('CommonPrefixes', []):
+            dates.append(cp['Prefix'].rstrip('/').split('/')[-1])
+    return sorted(dates)
+
+
+def list_batch_keys(s3, bucket, dates, plant_ids=None, frame=8):
+    """
+    List the source TIFFs for the given dates once. Keeps keys of the form
+    Sorghum_dataset/{date}/{plant}/{plant}_frame{frame}.tif, optionally
+    restricted to `plant_ids`; `frame=None` keeps every frame.
+    """
+    wanted = set(plant_ids) if plant_ids else None
+    paginator = s3.get_paginator('list_objects_v2')
+    keys = []
+    for date in dates:
+        for page in paginator.paginate(Bucket=bucket, Prefix=f"{SOURCE_PREFIX}/{date}/"):
+            for obj in page.get('Contents', []):
+                parts = obj['Key'].split('/')
+                if len(parts) != 4 or not parts[3].endswith('.tif'):
+                    continue
+                plant_id = parts[2]
+                if wanted is not None and plant_id not in wanted:
+                    continue
+                if frame is not None and parts[3] != f"{plant_id}_frame{frame}.tif":
+                    continue
+                keys.append(obj['Key'])
+    return sorted(keys)
+
+
+@celery_app.task(bind=True, name="backend.tasks.analyze_batch_task")
+def analyze_batch_task(self, bucket, date=None, start_date=None, end_date=None, plant_ids=None, frame=8,
+                       force=False):
+    """
+    Run the pipeline over every matching TIFF of one date or an inclusive
+    date range, sharing one S3 client, the bbox lookups and the loaded model.
+    Progress is reported through the PROGRESS state; the consolidated
+    manifest is written to results/batches/{task_id}.json. processed_images
+    rows are buffered and written DB_SINK_BATCH_SIZE at a time.
+    """
+    s3 = get_artifact_writer().client
+    if date:
+        dates = [date]
+    else:
+        dates = [d for d in list_source_dates(s3, bucket) if start_date <= d <= end_date]
+    keys = list_batch_keys(s3, bucket, dates, plant_ids=plant_ids, frame=frame)
+
+    # one listing of bouningbox/ for the whole batch; lookups are dict reads
+    bbox_index = get_bbox_index(bucket, s3=s3)
+    bbox_index.refresh()
+    items = []
+    total = len(keys)
+    self.update_state(state="PROGRESS", meta={"done": 0, "total": total, "items": items})
+
+    sink = result_sink()
+    with ThreadPoolExecutor(max_workers=max(1, BATCH_PLANT_WORKERS)) as ex:
+        futures = {ex.submit(run_and_store, bucket, k, s3, force, sink): k for k in keys}
+        for fut in as_completed(futures):
+            k = futures[fut]
+            parts = k.split('/')
+            item = {"key": k, "date": parts[1], "plant_id": parts[2]}
+            try:
+                item["result_key"], item["cached"] = fut.result()
+                item["status"] = "SUCCESS"
+            except Exception as e:
+                item["status"] = "FAILURE"
+                item["error"] = str(e)
+                print(f"[ERROR] Batch item {k} failed: {e}")
+            items.append(item)
+            self.update_state(state="PROGRESS", meta={"done": len(items), "total": total, "items": items})
+            if sink is not None and sink.full:
+                flush_sink(sink)
+    flush_sink(sink)
+
+    manifest_key = f"results/batches/{self.request.id}.json"
+    manifest = {
+        "task_id": self.request.id,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "dates": dates,
+        "plant_ids": plant_ids,
+        "frame": frame,
+        "total": total,
+        "succeeded": sum(1 for i in items if i["status"] == "SUCCESS"),
+        "failed": sum(1 for i in items if i["status"] == "FAILURE"),
+        "items": sorted(items, key=lambda i: i["key"]),
+        "bbox_stats": bbox_index.stats(),
+        "db_rows_written": sink.written if sink is not None else None,
+    }
+    s3.put_object(Bucket=bucket, Key=manifest_key, Body=json.dumps(manifest, indent=2),
+                  ContentType="application/json")
+    return {"manifest_key": manifest_key, "total": total,
+            "succeeded": manifest["succeeded"], "failed": manifest["failed"]}
@@ -18,8 +18,11 @@ ls -l /app/backend/db/migrations/versions || echo "No Alembic version files foun
 # echo "Running Alembic migrations..."
 # alembic --config /app/backend/db/alembic.ini upgrade head
 
-# Run the sync script before starting the backend
-python /app/scripts/sync_s3_to_db.py
+# The sync-db service keeps processed_images current; SYNC_ON_START=1 also
+# runs one incremental sync before starting the backend
+if [ "${SYNC_ON_START:-0}" = "1" ]; then
+    python /app/scripts/sync_s3_to_db.py || echo "[WARN] Startup sync failed"
+fi
 
 # If there are arguments, run them (for celery, etc.)
 if [ $# -gt 0 ]; then
@@ -9,8 +9,20 @@ export async function analyzePlant(plantId, date) {
   return res.data;
 }
 
-export async function getPlantResults(plantId, date) {
-  const url = `${API_BASE}/plant-results/${plantId}?date=${date}`;
-  const res = await axios.get(url);
+// fields: optional subset of images, result, morphology, texture, vegetation_indices
+export async function getPlantResults(plantId, date, fields) {
+  const params = new URLSearchParams({ date });
+  (fields || []).forEach(f => params.append('fields', f));
+  const res = await axios.get(`${API_BASE}/plant-results/${plantId}?${params.toString()}`);
+  return res.data;
+}
+
+export async function analyzeBatch({ date, startDate, endDate, plantIds } = {}) {
+  const params = new URLSearchParams();
+  if (date) params.append('date', date);
+  if (startDate) params.append('start_date', startDate);
+  if (endDate) params.append('end_date', endDate);
+  (plantIds || []).forEach(id => params.append('plant_ids', id));
+  const res = await axios.post(`${API_BASE}/analyze-batch?${params.toString()}`);
   return res.data;
 }
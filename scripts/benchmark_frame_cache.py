@@ -0,0 +1,74 @@
+"""
+Frame cache: cold (download + decode + write) vs warm (memmap) frame loads.
+
+Loads the same frame --repeats times through src.data_loader with the
+frame cache in a temporary directory, checks that the composite and bands
+built from the cached stack are identical to the ones from the decoded
+TIFF, and prints the time per load. Without --bucket/--key a synthetic
+16-bit frame is written to a temp dir and loaded with load_local_frame.
+
+Usage:
+    python scripts/benchmark_frame_cache.py --bucket my-bucket --key raw/2024-05-01/plant7/plant7_frame8.tif
+    python scripts/benchmark_frame_cache.py --size 2048
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import src.frame_cache as frame_cache  # noqa: E402
+from src.composite import process_raw_image  # noqa: E402
+from src.data_loader import load_frame_from_s3, load_local_frame, load_single_frame_from_s3  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--bucket")
+    ap.add_argument("--key")
+    ap.add_argument("--size", type=int, default=2048, help="synthetic frame size")
+    ap.add_argument("--repeats", type=int, default=5)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="frame_cache_")
+    frame_cache.FRAME_CACHE_ENABLED = True
+    frame_cache._CACHE = frame_cache.FrameCache(os.path.join(tmp, "cache"))
+
+    if args.bucket and args.key:
+        import boto3
+        s3 = boto3.client("s3")
+        reference = load_single_frame_from_s3(args.bucket, args.key, s3=s3)
+        load = lambda: load_frame_from_s3(args.bucket, args.key, s3=s3)  # noqa: E731
+    else:
+        path = os.path.join(tmp, "frame.tif")
+        rng = np.random.default_rng(0)
+        Image.fromarray(rng.integers(0, 4096, (args.size, args.size)).astype(np.uint16)).save(path)
+        reference = Image.open(path)
+        load = lambda: load_local_frame(path)  # noqa: E731
+
+    times = []
+    for _ in range(args.repeats):
+        t0 = time.perf_counter()
+        stack = load()
+        comp, bands = process_raw_image(stack)
+        times.append(time.perf_counter() - t0)
+
+    ref_comp, ref_bands = process_raw_image(reference)
+    same = np.array_equal(ref_comp, comp) and all(np.array_equal(ref_bands[b], bands[b]) for b in ref_bands)
+    print(f"identical to decoded TIFF: {same}")
+    print(f"cold load + composite: {times[0] * 1e3:8.1f} ms")
+    if len(times) > 1:
+        print(f"warm load + composite: {np.median(times[1:]) * 1e3:8.1f} ms (median of {len(times) - 1})")
+    print(f"cache: {frame_cache._CACHE.stats()}")
+    if not same:
+        print("[ERROR] cached frame differs from the decoded TIFF")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
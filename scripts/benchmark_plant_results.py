@@ -0,0 +1,136 @@
+"""
+/plant-results latency: p50 / p99 for a full-plant result and per `fields`.
+
+Calls the FastAPI endpoint in-process (TestClient). By default the S3
+client is a stand-in that serves a synthetic full-plant layout (PNGs for
+every texture band / vegetation index / morphology image plus the JSON
+documents) and sleeps --latency-ms per request, so sequential
+(--workers 1, the old behaviour) and concurrent fetches can be compared
+without AWS. --manifest adds the run manifest.json to the synthetic
+layout, so the endpoint reads it instead of listing the prefix. --real
+uses the configured bucket instead.
+
+Usage:
+    python scripts/benchmark_plant_results.py --requests 50 --workers 1 16
+    python scripts/benchmark_plant_results.py --manifest
+    python scripts/benchmark_plant_results.py --real --plant plant7 --date 2024-12-04
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+import backend.api.plant_analysis_api as api  # noqa: E402
+from backend.services.result_manifest import build_manifest, manifest_key  # noqa: E402
+
+TEXTURE_BANDS = ["color", "green", "nir", "pca", "red", "red_edge"]
+TEXTURE_PNGS = ["01_orig", "02_gray", "03_lbp", "04_hog", "05_lac1", "06_lac2", "07_lac3", "08_ehd_map"]
+
+
+def synthetic_layout(prefix, n_indices=44, n_morph=12):
+    keys = {f"{prefix}{n}.png": None for n in ("original", "mask", "overlay", "segmented")}
+    keys.update({f"{prefix}texture/{b}/{p}.png": None for b in TEXTURE_BANDS for p in TEXTURE_PNGS})
+    keys.update({f"{prefix}vegetation_indices/IDX{i}.png": None for i in range(n_indices)})
+    keys.update({f"{prefix}morphology/images/m{i}.png": None for i in range(n_morph)})
+    feats = [{f"IDX{i}_{s}": 0.5 for i in range(n_indices) for s in ("mean", "std", "min", "max")}]
+    keys[f"{prefix}plant7_frame8_result.json"] = {"plant_id": "plant7", "vegetation_indices": feats,
+                                                   "texture_features": [{"f": 1.0}]}
+    keys[f"{prefix}vegetation_indices/vegetation_features.json"] = feats
+    keys[f"{prefix}texture/texture_features.json"] = [{"f": 1.0}]
+    keys[f"{prefix}morphology/plant7_traits.json"] = {"size_traits": {"area": 1}, "morphology_traits": {}}
+    return keys
+
+
+class LatencyS3:
+    """Minimal list_objects_v2 / get_object stand-in with a fixed per-request delay."""
+
+    def __init__(self, objects, latency):
+        self.objects, self.latency = objects, latency
+
+    def get_paginator(self, _):
+        outer = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                time.sleep(outer.latency)
+                keys = [k for k in outer.objects if k.startswith(Prefix)]
+                for i in range(0, len(keys), 1000):
+                    yield {"Contents": [{"Key": k} for k in keys[i:i + 1000]]}
+        return Paginator()
+
+    def get_object(self, Bucket, Key):
+        time.sleep(self.latency)
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        return {"Body": io.BytesIO(json.dumps(self.objects[Key]).encode("utf-8"))}
+
+
+def add_manifest(objects, prefix):
+    result_key = next(k for k in objects if k.endswith("_result.json"))
+    doc = objects[result_key]
+    result = {"vegetation_indices": doc["vegetation_indices"], "texture_features": doc["texture_features"],
+              "morphology": {"plant7": objects[f"{prefix}morphology/plant7_traits.json"]}}
+    uploaded = [(k, 1, "application/json" if k.endswith(".json") else "image/png") for k in objects]
+    objects[manifest_key(prefix)] = build_manifest(None, None, prefix, "source.tif", result_key, result, uploaded)
+
+
+def timed(client, url, n):
+    times = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        r = client.get(url)
+        times.append(time.perf_counter() - t0)
+        r.raise_for_status()
+    return np.array(times) * 1e3, r.json()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--real", action="store_true", help="query the real bucket")
+    ap.add_argument("--plant", default="plant7")
+    ap.add_argument("--date", default="2024-12-04")
+    ap.add_argument("--requests", type=int, default=30)
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    ap.add_argument("--manifest", action="store_true", help="synthetic layout includes manifest.json")
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, api.RESULTS_FETCH_WORKERS])
+    args = ap.parse_args()
+
+    if not args.real:
+        prefix = f"results/{args.date}/{args.plant}/"
+        objects = synthetic_layout(prefix)
+        if args.manifest:
+            add_manifest(objects, prefix)
+        s3 = LatencyS3(objects, args.latency_ms / 1e3)
+        api._s3_client = lambda: s3
+        print(f"synthetic layout: {len(s3.objects)} keys, "
+              f"{sum(k.endswith('.json') for k in s3.objects)} JSON, {args.latency_ms:.0f} ms per request")
+
+    app = FastAPI()
+    app.include_router(api.router, prefix="/api")
+    client = TestClient(app)
+    base = f"/api/plant-results/{args.plant}?date={args.date}"
+    cases = [("full", base)] + [(f, f"{base}&fields={f}") for f in api.RESULT_SECTIONS]
+
+    print(f"\n{'workers':>7} {'fields':>20} {'keys':>5} {'p50 ms':>8} {'p99 ms':>8}")
+    for workers in args.workers:
+        pool = ThreadPoolExecutor(max_workers=workers)
+        api._fetch_pool = lambda: pool
+        for name, url in cases:
+            ms, body = timed(client, url, args.requests)
+            print(f"{workers:>7} {name:>20} {len(body):>5} {np.percentile(ms, 50):>8.1f} {np.percentile(ms, 99):>8.1f}")
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+RAW frame band extraction: legacy crop/stack path vs. zero-copy views.
+
+Each path runs in a fresh process per frame. Peak RSS growth is the
+kernel's high-water mark (VmHWM) reset right before the path runs
+(/proc/self/clear_refs, Linux), minus the RSS at that point; ru_maxrss
+would also count the parent's memory inherited across fork/exec. Peak
+traced numpy memory (tracemalloc) and wall time are reported as well.
+The bands and the uint8 composite must be identical to the legacy ones.
+
+Usage:
+    python scripts/benchmark_raw_frame.py --tiff plant7_frame8.tif
+    python scripts/benchmark_raw_frame.py --size 2048      # synthetic 16-bit frame
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+from itertools import product
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.composite import convert_to_uint8, process_raw_image  # noqa: E402
+
+
+def legacy_process_raw_image(pil_img):
+    d = pil_img.size[0] // 2
+    boxes = [(j, i, j + d, i + d)
+             for i, j in product(range(0, pil_img.height, d),
+                                range(0, pil_img.width, d))]
+    stack = np.stack([np.array(pil_img.crop(b), float) for b in boxes], axis=-1)
+    green, red, red_edge, nir = np.split(stack, 4, axis=-1)
+    comp = np.concatenate([green, red_edge, red], axis=-1)
+    return convert_to_uint8(comp), {"green": green, "red": red, "red_edge": red_edge, "nir": nir}
+
+
+PATHS = {"legacy": legacy_process_raw_image, "views": process_raw_image}
+
+
+def open_frame(tiff, size):
+    if tiff:
+        return Image.open(tiff)
+    rng = np.random.default_rng(0)
+    return Image.fromarray(rng.integers(0, 4096, (size, size)).astype(np.uint16))
+
+
+def _status_mb(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024.0
+    return float("nan")
+
+
+def reset_peak_rss():
+    """Reset VmHWM to the current RSS; False where the kernel does not allow it."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def measure(path, tiff, size, queue):
+    img = open_frame(tiff, size)
+    img.load()
+    rss0 = _status_mb("VmRSS") if reset_peak_rss() else float("nan")
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    comp, bands = PATHS[path](img)
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    hwm = _status_mb("VmHWM")
+    queue.put((elapsed, peak, hwm - rss0, hwm))
+
+
+def check(tiff, size):
+    img = open_frame(tiff, size)
+    ref_comp, ref_bands = legacy_process_raw_image(img)
+    comp, bands = process_raw_image(img)
+    same_bands = all(np.array_equal(ref_bands[b], bands[b].astype(float)) for b in ref_bands)
+    comp_diff = int(np.abs(ref_comp.astype(int) - comp.astype(int)).max())
+    print(f"bands identical: {same_bands}, composite max diff: {comp_diff} "
+          f"({np.count_nonzero(ref_comp != comp)} of {comp.size} values differ)")
+    print("band dtype / contiguous: "
+          + ", ".join(f"{b}={bands[b].dtype}/{bands[b].flags['C_CONTIGUOUS']}" for b in bands))
+    return same_bands and comp_diff == 0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tiff", help="4-band RAW TIFF (default: synthetic frame)")
+    ap.add_argument("--size", type=int, default=2048)
+    args = ap.parse_args()
+
+    ok = check(args.tiff, args.size)
+
+    ctx = multiprocessing.get_context("spawn")
+    print(f"\n{'path':>8} {'time (s)':>9} {'traced peak MB':>15} {'RSS growth MB':>14} {'peak RSS MB':>12}")
+    for path in PATHS:
+        q = ctx.Queue()
+        p = ctx.Process(target=measure, args=(path, args.tiff, args.size, q))
+        p.start()
+        elapsed, peak, growth, rss = q.get()
+        p.join()
+        print(f"{path:>8} {elapsed:>9.3f} {peak / 1e6:>15.1f} {growth:>14.1f} {rss:>12.1f}")
+
+    if not ok:
+        print("\n[ERROR] zero-copy path does not match the legacy output")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Index / texture PNG rendering: matplotlib figure vs. lookup-table renderer.
+
+1. Colors: the LUT-colored map must match matplotlib's cmap(Normalize(...))
+   output (max channel difference, in 0-255 units) for every colormap in
+   index_cmap_settings. Exits non-zero above --tol.
+2. Benchmark: time per PNG for both renderers (encode included).
+
+Usage:
+    python scripts/benchmark_render.py --size 1024 --repeats 5
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import matplotlib  # noqa: E402
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt  # noqa: E402
+from matplotlib.colors import Normalize  # noqa: E402
+
+from src.features import index_cmap_settings  # noqa: E402
+from src.colormap_render import apply_colormap, render_png  # noqa: E402
+
+
+def matplotlib_png(img, cmap, vmin, vmax, title):
+    norm = Normalize(vmin=vmin, vmax=vmax)
+    colored = cmap(norm(img))
+    colored[np.isnan(img)] = [1, 1, 1, 1]
+    fig, ax = plt.subplots(figsize=(5, 5))
+    ax.imshow(colored)
+    ax.axis('off')
+    sm = plt.cm.ScalarMappable(cmap=cmap, norm=norm)
+    sm.set_array([])
+    cbar = fig.colorbar(sm, ax=ax, orientation='vertical', fraction=0.046, pad=0.04)
+    cbar.set_label(title)
+    buf = io.BytesIO()
+    fig.subplots_adjust(left=0, right=1, top=1, bottom=0)
+    fig.savefig(buf, format='png', dpi=150, bbox_inches='tight', pad_inches=0)
+    plt.close(fig)
+    return buf.getvalue()
+
+
+def synthetic_map(size, seed=0):
+    rng = np.random.default_rng(seed)
+    img = rng.integers(0, 256, (size, size)).astype(np.uint8)
+    yy, xx = np.ogrid[:size, :size]
+    img[(yy - size // 2) ** 2 + (xx - size // 2) ** 2 > (size // 3) ** 2] = 0
+    return img
+
+
+def check_colors(img, tol):
+    ok = True
+    print(f"{'index':>12} {'cmap':>10} {'max diff':>9}")
+    for title, (cmap, vmin, vmax) in index_cmap_settings.items():
+        vmin = np.nanmin(img) if vmin is None else vmin
+        vmax = np.nanmax(img) if vmax is None else vmax
+        ref = np.round(cmap(Normalize(vmin=vmin, vmax=vmax)(img))[..., :3] * 255).astype(int)
+        bgr, _, _ = apply_colormap(img, cmap, vmin, vmax)
+        diff = int(np.abs(bgr[..., ::-1].astype(int) - ref).max())
+        flag = "" if diff <= tol else "  <-- MISMATCH"
+        ok &= not flag
+        print(f"{title:>12} {cmap.name:>10} {diff:>9}{flag}")
+    return ok
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", type=int, default=1024)
+    ap.add_argument("--repeats", type=int, default=5)
+    ap.add_argument("--tol", type=int, default=1)
+    args = ap.parse_args()
+
+    img = synthetic_map(args.size)
+    ok = check_colors(img, args.tol)
+
+    cmap, vmin, vmax = index_cmap_settings["NDVI"]
+    print(f"\n{'renderer':>12} {'s/png':>10} {'KB':>8}")
+    for label, fn in [
+        ("matplotlib", lambda: matplotlib_png(img, cmap, vmin, vmax, "NDVI")),
+        ("lut", lambda: render_png(img, cmap, vmin, vmax, label="NDVI")),
+    ]:
+        times = []
+        for _ in range(args.repeats):
+            t0 = time.perf_counter()
+            png = fn()
+            times.append(time.perf_counter() - t0)
+        print(f"{label:>12} {min(times):>10.4f} {len(png) / 1024:>8.1f}")
+
+    if not ok:
+        print("\n[ERROR] LUT colors differ from matplotlib")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark RMBG throughput against batch size.
+
+Runs the pipeline's batched predict function directly for each batch size,
+then drives the SegmentationBatcher from concurrent threads to show the
+end-to-end effect of max_batch_size / max_wait_ms.
+
+Usage:
+    python scripts/benchmark_segmentation.py --batch-sizes 1 2 4 8 --images 16
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.services.pipeline_runner import predict_rmbg_batch  # noqa: E402
+from backend.services.model_registry import get_device, get_model  # noqa: E402
+from backend.services.segmentation_backends import SEGMENTATION_BACKEND  # noqa: E402
+from backend.services.segmentation_batcher import SegmentationBatcher  # noqa: E402
+
+
+def bench_direct(batch_size, n_images, size):
+    inputs = [torch.randn(3, size, size) for _ in range(batch_size)]
+    predict_rmbg_batch(inputs)  # warmup
+    done = 0
+    t0 = time.perf_counter()
+    while done < n_images:
+        predict_rmbg_batch(inputs)
+        done += batch_size
+    return done / (time.perf_counter() - t0)
+
+
+def bench_batcher(batch_size, n_images, size, max_wait_ms):
+    batcher = SegmentationBatcher(predict_rmbg_batch, max_batch_size=batch_size, max_wait_ms=max_wait_ms)
+    inputs = [torch.randn(3, size, size) for _ in range(n_images)]
+    batcher.segment(inputs[0])  # warmup
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=batch_size) as ex:
+        list(ex.map(batcher.segment, inputs))
+    elapsed = time.perf_counter() - t0
+    batcher.close()
+    return n_images / elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    ap.add_argument("--images", type=int, default=16)
+    ap.add_argument("--size", type=int, default=1024)
+    ap.add_argument("--max-wait-ms", type=float, default=50.0)
+    args = ap.parse_args()
+
+    if get_model("segmenter") is None:
+        print("[ERROR] RMBG model not available; cannot benchmark.")
+        sys.exit(1)
+
+    print(f"backend={SEGMENTATION_BACKEND} device={get_device()} threads={torch.get_num_threads()} images={args.images} size={args.size}")
+    print(f"{'batch':>6} {'direct img/s':>14} {'batcher img/s':>14}")
+    for bs in args.batch_sizes:
+        direct = bench_direct(bs, args.images, args.size)
+        queued = bench_batcher(bs, args.images, args.size, args.max_wait_ms)
+        print(f"{bs:>6} {direct:>14.3f} {queued:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
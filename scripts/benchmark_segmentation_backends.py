@@ -0,0 +1,113 @@
+"""
+Segmentation backends: mask parity + latency / memory benchmark.
+
+Each backend runs in its own process (so peak RSS is its own) over the same
+inputs. Masks (probability > 0.5) are compared with the eager PyTorch
+backend by IoU; the script exits non-zero when any backend's worst-case
+IoU drops below 1 - --max-iou-drop.
+
+Inputs are the images in --images (any format PIL reads, e.g. composites
+saved by the pipeline) or, without it, random tensors (latency only; IoU
+on noise is not meaningful).
+
+Usage:
+    python scripts/benchmark_segmentation_backends.py --images ./samples \
+        --backends torch torch:int8 torchscript onnx onnx:int8 --threads 4
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+def load_inputs(image_dir, n_random, size):
+    import torch
+    from PIL import Image
+    from torchvision import transforms
+    tf = transforms.Compose([
+        transforms.Resize((size, size)),
+        transforms.ToTensor(),
+        transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225]),
+    ])
+    if image_dir:
+        paths = sorted(p for p in glob.glob(os.path.join(image_dir, "*"))
+                       if p.lower().endswith((".png", ".jpg", ".jpeg", ".tif", ".tiff")))
+        return [tf(Image.open(p).convert("RGB")).numpy() for p in paths]
+    g = torch.Generator().manual_seed(0)
+    return [torch.randn(3, size, size, generator=g).numpy() for _ in range(n_random)]
+
+
+def run_backend(spec, inputs, threads, warmup, queue):
+    from backend.services.segmentation_backends import create_backend
+    name, _, variant = spec.partition(":")
+    backend = create_backend(name, quantize=(variant == "int8"), threads=threads)
+    for x in inputs[:warmup]:
+        backend.predict(x[None])
+    masks, times = [], []
+    for x in inputs:
+        t0 = time.perf_counter()
+        prob = backend.predict(x[None])[0]
+        times.append(time.perf_counter() - t0)
+        masks.append(prob > 0.5)
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    queue.put((np.stack(masks), times, rss_mb))
+
+
+def iou(a, b):
+    union = np.logical_or(a, b).sum()
+    return 1.0 if union == 0 else float(np.logical_and(a, b).sum() / union)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--images", help="directory of input images")
+    ap.add_argument("--random", type=int, default=8, help="random inputs when --images is not given")
+    ap.add_argument("--size", type=int, default=1024)
+    ap.add_argument("--backends", nargs="+", default=["torch", "torch:int8", "torchscript", "onnx", "onnx:int8"])
+    ap.add_argument("--threads", type=int, default=0)
+    ap.add_argument("--warmup", type=int, default=1)
+    ap.add_argument("--max-iou-drop", type=float, default=0.02)
+    args = ap.parse_args()
+
+    inputs = load_inputs(args.images, args.random, args.size)
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    for spec in ["torch"] + [b for b in args.backends if b != "torch"]:
+        q = ctx.Queue()
+        p = ctx.Process(target=run_backend, args=(spec, inputs, args.threads, args.warmup, q))
+        p.start()
+        try:
+            results[spec] = q.get()
+        except Exception as e:
+            print(f"[WARN] {spec} failed: {e}")
+        p.join()
+        if p.exitcode and spec not in results:
+            print(f"[WARN] {spec} exited with code {p.exitcode}")
+
+    if "torch" not in results:
+        print("[ERROR] reference torch backend failed")
+        sys.exit(1)
+    ref = results["torch"][0]
+    ok = True
+    print(f"{'backend':>14} {'p50 ms':>9} {'mean ms':>9} {'peak RSS MB':>12} {'min IoU':>8} {'mean IoU':>9}")
+    for spec, (masks, times, rss) in results.items():
+        ious = [iou(m, r) for m, r in zip(masks, ref)]
+        flag = ""
+        if args.images and min(ious) < 1.0 - args.max_iou_drop:
+            flag, ok = "  <-- IoU below bound", False
+        print(f"{spec:>14} {np.median(times) * 1e3:>9.1f} {np.mean(times) * 1e3:>9.1f} {rss:>12.0f} "
+              f"{min(ious):>8.4f} {np.mean(ious):>9.4f}{flag}")
+
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Spectral projection: equivalence with sklearn + benchmark.
+
+1. Equivalence: first_component (closed-form 4x4 / 3x3 covariance, eigh)
+   and a basis accumulated over chunks must match
+   PCA(n_components=1, whiten=True).fit_transform, sign included, within
+   --atol. Exits non-zero on a mismatch.
+2. Benchmark: the texture 'pca' band of a synthetic plant, the old sklearn
+   body vs texture_band_image fitting per plant vs applying one saved
+   dataset basis (SPECTRAL_BASIS); the uint8 bands are compared.
+
+Usage:
+    python scripts/benchmark_spectral_projection.py --size 2048 --coverage 0.3 --repeats 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from sklearn.decomposition import PCA
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import src.spectral_projection as sp  # noqa: E402
+from src.feature_texture import PCA_BANDS, texture_band_image  # noqa: E402
+
+
+def check_equivalence(atol, seed=0):
+    rng = np.random.default_rng(seed)
+    ok = True
+    for c, n in ((4, 200_000), (3, 512 * 512), (4, 40)):
+        x = rng.normal(size=(n, c)) @ rng.normal(size=(c, c)) * 300 + 2000
+        ref = PCA(n_components=1, whiten=True).fit_transform(x).ravel()
+        acc = sp.CovarianceAccumulator(range(c))
+        for chunk in np.array_split(x, 7):
+            acc.update(chunk)
+        for name, got in (("first_component", sp.first_component(x)), ("accumulated", acc.basis().project(x))):
+            err = float(np.abs(got - ref).max())
+            print(f"{'[ERROR]' if err > atol else '       '} {c} channels x {n}: {name} max abs err {err:.1e}")
+            ok &= err <= atol
+    return ok
+
+
+def synthetic_plant(size, coverage, seed=0):
+    rng = np.random.default_rng(seed)
+    mix = rng.normal(size=(4, 4))
+    spec = rng.normal(size=(size * size, 4)) @ mix * 300 + 2000
+    mask = np.zeros((size, size), np.uint8)
+    r = int(size * np.sqrt(coverage / np.pi))
+    yy, xx = np.ogrid[:size, :size]
+    mask[(yy - size // 2) ** 2 + (xx - size // 2) ** 2 <= r * r] = 255
+    stack = {b: spec[:, i].reshape(size, size, 1).astype(np.uint16) for i, b in enumerate(PCA_BANDS)}
+    return {"mask": mask, "spectral_stack": stack}
+
+
+def legacy_pca_band(pdata):
+    """The 'pca' band before src/spectral_projection.py."""
+    mask = pdata['mask']
+    full = np.stack([np.where(mask > 0, pdata['spectral_stack'][b].squeeze(-1).astype(float), np.nan)
+                     for b in PCA_BANDS], axis=-1)
+    h, w, c = full.shape
+    flat = full.reshape(-1, c)
+    valid = ~np.isnan(flat).any(axis=1)
+    vec = np.zeros(h * w)
+    vec[valid] = PCA(n_components=1, whiten=True).fit_transform(flat[valid].reshape(-1, c)).squeeze()
+    gray_f = vec.reshape(h, w)
+    m, M = gray_f[mask > 0].min(), gray_f[mask > 0].max()
+    return ((gray_f - m) / (M - m) * 255).astype(np.uint8)
+
+
+def timed(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t0)
+    return np.median(times) * 1e3, out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", type=int, default=2048)
+    ap.add_argument("--coverage", type=float, default=0.3)
+    ap.add_argument("--repeats", type=int, default=5)
+    ap.add_argument("--atol", type=float, default=1e-9)
+    args = ap.parse_args()
+
+    ok = check_equivalence(args.atol)
+
+    pdata = synthetic_plant(args.size, args.coverage)
+    legacy_ms, legacy = timed(lambda: legacy_pca_band(pdata), args.repeats)
+    fit_ms, (_, fitted) = timed(lambda: texture_band_image(pdata, 'pca'), args.repeats)
+
+    sel = pdata["mask"] > 0
+    pixels = np.stack([pdata["spectral_stack"][b][..., 0][sel] for b in PCA_BANDS], axis=1)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "basis.json")
+        sp.save_basis(sp.fit_basis(pixels, PCA_BANDS), path)
+        sp.SPECTRAL_BASIS = path
+        try:
+            basis_ms, (_, applied) = timed(lambda: texture_band_image(pdata, 'pca'), args.repeats)
+        finally:
+            sp.SPECTRAL_BASIS = ""
+
+    print(f"\n'pca' band, {args.size}x{args.size}, {int(sel.sum())} plant pixels (median of {args.repeats}):")
+    print(f"  sklearn PCA per plant  {legacy_ms:8.1f} ms")
+    print(f"  closed form per plant  {fit_ms:8.1f} ms ({legacy_ms / fit_ms:.1f}x)")
+    print(f"  saved dataset basis    {basis_ms:8.1f} ms ({legacy_ms / basis_ms:.1f}x)")
+    for name, band in (("per plant", fitted), ("saved basis", applied)):
+        diff = np.abs(band.astype(int) - legacy.astype(int))
+        print(f"  {name}: {int((diff > 0).sum())} px differ from sklearn, max {int(diff.max())}")
+        ok &= diff.max() <= 1
+    if not ok:
+        print("[ERROR] spectral projection does not match sklearn")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+S3 -> Postgres results sync: throughput and incremental behaviour.
+
+Seeds --plants synthetic result manifests into a bucket (MinIO or any
+S3_ENDPOINT_URL store), then checks:
+
+    1. full sync writes every plant               (reports rows/sec)
+    2. a second incremental sync writes nothing   (all ETags unchanged)
+    3. after rewriting --changed manifests only those rows are written
+
+and that processed_images holds one row per plant. Exits non-zero if any
+count is off. Uses DB_CONNECTION_STRING / DB_TEST_CONNECTION_STRING.
+
+Usage (docker/common/docker-compose.test.yml, service test-runner-sync):
+    S3_ENDPOINT_URL=http://minio:9000 python scripts/benchmark_sync.py --plants 2000 --changed 50
+"""
+import argparse
+import json
+import os
+import sys
+
+import psycopg2
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.services.result_manifest import MANIFEST_VERSION, manifest_key  # noqa: E402
+from backend.services.results_sync import ensure_state_tables, run_scan, s3_client  # noqa: E402
+
+PROCESSED_IMAGES = """
+CREATE TABLE IF NOT EXISTS processed_images (
+    id SERIAL PRIMARY KEY,
+    plant_id VARCHAR,
+    image_key VARCHAR,
+    date DATE,
+    vegetation_features JSON,
+    morphology_features JSON,
+    texture_features JSON
+)
+"""
+
+
+def manifest(plant, revision):
+    feats = [{f"NDVI_{s}": 0.1 * revision for s in ("mean", "std", "min", "max")}]
+    return {"version": MANIFEST_VERSION, "artifacts": {}, "result": {
+        "vegetation_indices": feats, "texture_features": [{"lbp_mean": 1.0}],
+        "morphology": {plant: {"size_traits": {"area": 100 + revision}, "morphology_traits": {}}}}}
+
+
+def seed(s3, bucket, prefixes, revision):
+    from concurrent.futures import ThreadPoolExecutor
+
+    def put(prefix):
+        plant = prefix.rsplit('/', 1)[-1]
+        s3.put_object(Bucket=bucket, Key=manifest_key(prefix), Body=json.dumps(manifest(plant, revision)),
+                      ContentType="application/json")
+    with ThreadPoolExecutor(max_workers=16) as ex:
+        list(ex.map(put, prefixes))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--bucket", default=os.getenv("S3_BUCKET_NAME", "plant-analysis-sync-test"))
+    ap.add_argument("--plants", type=int, default=1000)
+    ap.add_argument("--dates", type=int, default=10)
+    ap.add_argument("--changed", type=int, default=25)
+    args = ap.parse_args()
+
+    s3 = s3_client()
+    try:
+        s3.create_bucket(Bucket=args.bucket)
+    except s3.exceptions.ClientError:
+        pass
+    per_date = max(1, args.plants // args.dates)
+    prefixes = [f"results/2025-01-{d + 1:02d}/plant{p + 1}" for d in range(args.dates) for p in range(per_date)]
+    seed(s3, args.bucket, prefixes, 0)
+
+    dsn = os.getenv("DB_CONNECTION_STRING") or os.getenv("DB_TEST_CONNECTION_STRING")
+    conn = psycopg2.connect(dsn.replace('postgresql+psycopg2://', 'postgresql://'))
+    with conn.cursor() as cur:
+        cur.execute(PROCESSED_IMAGES)
+        cur.execute("DROP TABLE IF EXISTS sync_state, sync_manifests")
+        cur.execute("DELETE FROM processed_images WHERE date >= '2025-01-01' AND date < '2025-02-01'")
+    conn.commit()
+    ensure_state_tables(conn)
+
+    ok = True
+    full = run_scan(s3, args.bucket, conn, full=True)
+    print(f"full sync:        {full['written']} rows in {full['seconds']:.2f}s ({full['rows_per_sec']:.0f} rows/s)")
+    ok &= full["written"] == len(prefixes)
+
+    again = run_scan(s3, args.bucket, conn, full=True)
+    print(f"unchanged resync: {again['written']} rows, {again['unchanged']} skipped in {again['seconds']:.2f}s")
+    ok &= again["written"] == 0 and again["unchanged"] == len(prefixes)
+
+    changed = prefixes[-args.changed:]
+    seed(s3, args.bucket, changed, 1)
+    inc = run_scan(s3, args.bucket, conn)
+    print(f"incremental:      {inc['written']} rows of {inc['prefixes']} scanned since {inc['since']} "
+          f"in {inc['seconds']:.2f}s")
+    ok &= inc["written"] == len(changed)
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT count(*), count(DISTINCT (plant_id, date)) FROM processed_images "
+                    "WHERE date >= '2025-01-01' AND date < '2025-02-01'")
+        rows, distinct = cur.fetchone()
+    print(f"processed_images: {rows} rows, {distinct} distinct plant/date")
+    ok &= rows == distinct == len(prefixes)
+    conn.close()
+    if not ok:
+        print("[ERROR] sync counts do not match")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Texture engine: parity check + per-band benchmark.
+
+1. Parity: texture_maps from src.feature_texture.compute_texture_maps
+   (batched DBC / EHD, summed-area-table lacunarity, LBP + HOG on the
+   thread pool) must match the legacy one-band-at-a-time loop (new torch
+   tensors and a new DBC_Lacunarity per call, two uniform_filter passes per
+   lacunarity window). uint8 maps may differ by at most --tolerance grey
+   levels on a handful of pixels (float32 filter vs float64 table rounding,
+   batched conv accumulation order), ehd_feats within 1e-5. Exits non-zero
+   on a mismatch.
+   With compact=True (EHD_COMPACT) the EHD map must be unchanged and
+   'ehd_hist' must be the normalised histogram of the edge classes under
+   the plant mask in place of 'ehd_feats'.
+2. Benchmark: per-band time of each legacy step (LBP, HOG, lac1+lac2, DBC,
+   EHD with per-call masks and nine pooling passes) and the whole six-band
+   texture_maps build, legacy vs engine, plus the bytes texture_maps keeps
+   per plant with and without EHD_COMPACT.
+3. Peak memory: RSS growth of one six-band build (legacy loop, engine,
+   engine with EHD_COMPACT), each in a fresh process, from the kernel's
+   high-water mark (VmHWM) reset right before the build through
+   /proc/self/clear_refs (Linux). The engine batches --torch-batch bands
+   per torch pass (TEXTURE_TORCH_BATCH).
+
+Usage:
+    python scripts/benchmark_texture_engine.py --size 512 --repeats 3
+    python scripts/benchmark_texture_engine.py --size 1024 --repeats 1 --torch-batch 6
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.composite import convert_to_uint8  # noqa: E402
+from src.DBC_Lacunarity import DBC_Lacunarity  # noqa: E402
+from src.feature_texture import (  # noqa: E402
+    LACUNARITY_WINDOW, TEXTURE_BANDS, TEXTURE_TORCH_BATCH, Generate_masks, compute_texture_maps, ehd_edge_index,
+    hog_image, lbp_image, compute_local_lac, texture_band_image, texture_workers,
+)
+from src.lacunarity import configured_scales  # noqa: E402
+
+
+def synthetic_plant(size, coverage=0.3, seed=0):
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[:size, :size] / size
+    base = np.sin(12 * xx) * np.cos(9 * yy)
+    spec = {b: (2048 + 1500 * base * (i + 1) / 4 + rng.normal(0, 120, (size, size)))[..., None]
+            for i, b in enumerate(("green", "red", "red_edge", "nir"))}
+    mask = np.zeros((size, size), np.uint8)
+    r = int(size * np.sqrt(coverage / np.pi))
+    cv2.circle(mask, (size // 2, size // 2), r, 255, -1)
+    composite = np.dstack([convert_to_uint8(spec[b].squeeze(-1)) for b in ("green", "red", "nir")])
+    return {"composite": composite, "mask": mask, "spectral_stack": spec}
+
+
+def legacy_ehd(X):
+    """Get_EHD before the cached filter bank: masks rebuilt per call, one avg_pool2d per edge class."""
+    masks = torch.tensor(Generate_masks()).float().unsqueeze(1).repeat(1, X.shape[1], 1, 1)
+    edge_responses = torch.nn.functional.conv2d(X, masks, dilation=7)
+    value, index = torch.max(edge_responses, dim=1)
+    index[value < 0.9] = masks.shape[0]
+    feat_vect = []
+    for edge in range(masks.shape[0] + 1):
+        pooled = torch.nn.functional.avg_pool2d((index == edge).unsqueeze(1).float(), [5, 5], stride=1,
+                                                count_include_pad=False)
+        feat_vect.append(pooled.squeeze(1))
+    return torch.stack(feat_vect, dim=1)
+
+
+def _status_mb(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024.0
+    return float("nan")
+
+
+def _peak_child(kind, size, torch_batch, queue):
+    pdata = synthetic_plant(size)
+    band_images = {band: texture_band_image(pdata, band) for band in TEXTURE_BANDS}
+    if kind == "legacy":
+        def build():
+            return {band: legacy_steps(gray)[1] for band, (_, gray) in band_images.items()}
+    else:
+        def build():
+            return compute_texture_maps(band_images, compact=kind == "engine, EHD_COMPACT",
+                                        mask=pdata["mask"], torch_batch=torch_batch)
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        queue.put(float("nan"))
+        return
+    rss0 = _status_mb("VmRSS")
+    maps = build()
+    queue.put(_status_mb("VmHWM") - rss0)
+    del maps
+
+
+def peak_rss_growth(kind, size, torch_batch):
+    """MB the peak RSS of a fresh process grows by during one six-band build."""
+    ctx = multiprocessing.get_context("spawn")
+    q = ctx.Queue()
+    p = ctx.Process(target=_peak_child, args=(kind, size, torch_batch, q))
+    p.start()
+    growth = q.get()
+    p.join()
+    return growth
+
+
+def retained_bytes(maps):
+    return sum(a.nbytes for band in maps.values() for k, a in band.items() if k not in ("orig", "gray"))
+
+
+def masked_ehd_hist(gray, mask):
+    """Reference histogram: edge classes of the valid conv positions centred on plant pixels."""
+    X = torch.from_numpy(gray.astype(np.float32) / 255.0)[None, None]
+    index, n_angles = ehd_edge_index(X)
+    index = index[0].numpy()
+    oy, ox = (np.array(gray.shape) - index.shape) // 2
+    sel = mask[oy:oy + index.shape[0], ox:ox + index.shape[1]] > 0
+    counts = np.bincount(index[sel], minlength=n_angles + 1)
+    return counts / max(counts.sum(), 1)
+
+
+def check_compact(full, compact, mask):
+    ok = True
+    for band, maps in compact.items():
+        if "ehd_feats" in maps or not np.array_equal(maps["ehd_map"], full[band]["ehd_map"]):
+            print(f"[ERROR] {band}: compact EHD output differs from the full one")
+            ok = False
+        hist, ref = maps["ehd_hist"], masked_ehd_hist(maps["gray"], mask)
+        if hist.shape != ref.shape or np.abs(hist - ref).max() > 1e-6:
+            print(f"[ERROR] {band}: ehd_hist {np.round(hist, 4)} != masked reference {np.round(ref, 4)}")
+            ok = False
+    return ok
+
+
+def legacy_steps(gray, window=LACUNARITY_WINDOW):
+    """The old per-band body, step by step: ({step: seconds}, maps)."""
+    steps = {}
+    t0 = time.perf_counter()
+    lbp = lbp_image(gray)
+    steps["lbp"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    hog = cv2.convertScaleAbs(hog_image(gray))
+    steps["hog"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    lac1 = convert_to_uint8(compute_local_lac(gray, window))
+    lac2 = convert_to_uint8(np.mean([compute_local_lac(gray, s) for s in configured_scales(window)], axis=0))
+    steps["lac1+lac2"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    x = torch.from_numpy(gray.astype(np.float32) / 255.0)[None, None]
+    layer = DBC_Lacunarity(window_size=window).eval()
+    with torch.no_grad():
+        lac3 = convert_to_uint8(layer(x).squeeze().cpu().numpy())
+    steps["dbc"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    X = torch.from_numpy(gray.astype(np.float32) / 255.0).unsqueeze(0).unsqueeze(0)
+    ehd_feats = legacy_ehd(X).squeeze(0).cpu().numpy()
+    ehd_map = np.argmax(ehd_feats, axis=0).astype(np.uint8)
+    steps["ehd"] = time.perf_counter() - t0
+    maps = {"lbp": lbp, "hog": hog, "lac1": lac1, "lac2": lac2, "lac3": lac3,
+            "ehd_feats": ehd_feats, "ehd_map": ehd_map}
+    return steps, maps
+
+
+def check_parity(legacy, engine, tolerance):
+    ok = True
+    for band, ref in legacy.items():
+        got = engine[band]
+        for name, want in ref.items():
+            have = got[name]
+            if have.shape != want.shape or have.dtype != want.dtype:
+                print(f"[ERROR] {band}/{name}: {have.shape} {have.dtype} != {want.shape} {want.dtype}")
+                ok = False
+                continue
+            if name == "ehd_feats":
+                err = float(np.abs(have - want).max())
+                bad, shown = err > 1e-5, err > 0
+                detail = f"max abs err {err:.2e}"
+            else:
+                diff = np.abs(have.astype(int) - want.astype(int))
+                bad, shown = diff.max() > tolerance, diff.max() > 0
+                detail = f"{int((diff > 0).sum())} px differ, max {int(diff.max())}"
+            if shown:
+                print(f"{'[ERROR]' if bad else '[WARN]'} {band}/{name}: {detail}")
+            ok &= not bad
+    return ok
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", type=int, default=512)
+    ap.add_argument("--repeats", type=int, default=3)
+    ap.add_argument("--tolerance", type=int, default=1, help="max grey-level difference on uint8 maps")
+    ap.add_argument("--torch-batch", type=int, default=TEXTURE_TORCH_BATCH, help="bands per batched torch pass")
+    args = ap.parse_args()
+
+    pdata = synthetic_plant(args.size)
+    band_images = {band: texture_band_image(pdata, band) for band in TEXTURE_BANDS}
+
+    # warm-up (pool threads, torch kernels, the cached DBC module)
+    compute_texture_maps(band_images, torch_batch=args.torch_batch)
+
+    per_band, legacy_total, legacy = {}, [], {}
+    for _ in range(args.repeats):
+        t0 = time.perf_counter()
+        for band, (_, gray) in band_images.items():
+            steps, legacy[band] = legacy_steps(gray)
+            for step, sec in steps.items():
+                per_band.setdefault(band, {}).setdefault(step, []).append(sec)
+        legacy_total.append(time.perf_counter() - t0)
+
+    engine_total = []
+    for _ in range(args.repeats):
+        t0 = time.perf_counter()
+        engine = compute_texture_maps(band_images, torch_batch=args.torch_batch)
+        engine_total.append(time.perf_counter() - t0)
+
+    steps = list(next(iter(per_band.values())))
+    print(f"{args.size}x{args.size}, {len(TEXTURE_BANDS)} bands, {texture_workers()} texture workers, "
+          f"{args.torch_batch} bands per torch pass, "
+          f"torch threads {torch.get_num_threads()}; legacy ms per band (median of {args.repeats})")
+    print(f"{'band':>10} " + " ".join(f"{s:>10}" for s in steps) + f" {'total':>10}")
+    for band, times in per_band.items():
+        med = [np.median(times[s]) * 1e3 for s in steps]
+        print(f"{band:>10} " + " ".join(f"{m:>10.1f}" for m in med) + f" {sum(med):>10.1f}")
+
+    lt, et = np.median(legacy_total) * 1e3, np.median(engine_total) * 1e3
+    print(f"\nall bands: legacy {lt:.1f} ms, engine {et:.1f} ms ({lt / et:.2f}x), "
+          f"engine per band {et / len(TEXTURE_BANDS):.1f} ms")
+
+    compact = compute_texture_maps(band_images, compact=True, mask=pdata["mask"], torch_batch=args.torch_batch)
+    print(f"retained texture maps: full {retained_bytes(engine) / 2**20:.1f} MiB, "
+          f"EHD_COMPACT {retained_bytes(compact) / 2**20:.1f} MiB")
+
+    peaks = {kind: peak_rss_growth(kind, args.size, args.torch_batch)
+             for kind in ("legacy", "engine", "engine, EHD_COMPACT")}
+    print("peak RSS growth per six-band build: " + ", ".join(f"{k} {v:.0f} MB" for k, v in peaks.items()))
+
+    if not check_parity(legacy, engine, args.tolerance) or not check_compact(engine, compact, pdata["mask"]):
+        print("[ERROR] texture engine does not match the per-band loop")
+        sys.exit(1)
+    print("parity: ok")
+
+
+if __name__ == "__main__":
+    main()
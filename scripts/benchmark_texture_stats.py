@@ -0,0 +1,101 @@
+"""
+Texture feature statistics: equivalence check + benchmark.
+
+1. Equivalence: map_statistics on unsigned-integer maps (one np.bincount)
+   must give the np.nan* values of the float path: identical for mean /
+   min / max / median / q25 / q75 / nan_fraction, std within 1e-12
+   relative (the histogram path sums exactly). Random uint8 / uint16
+   samples of varied size and level count. Exits non-zero on a mismatch.
+2. Benchmark: compute_texture_features on a synthetic plant (5 maps x 6
+   bands), np.nan* per map vs the histogram path, same feature keys.
+
+Usage:
+    python scripts/benchmark_texture_stats.py --size 1024 --coverage 0.3 --repeats 5
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import src.feature_texture as ft  # noqa: E402
+
+
+def check_equivalence(trials, seed=0):
+    rng = np.random.default_rng(seed)
+    worst = 0.0
+    for t in range(trials):
+        n = int(rng.integers(1, 5000))
+        dtype, levels = (np.uint16, 65535) if t % 5 == 0 else (np.uint8, int(rng.choice([2, 10, 256])))
+        values = rng.integers(0, levels, n).astype(dtype)
+        hist, ref = ft._histogram_stats(values), ft._float_stats(values)
+        if list(hist) != list(ref):
+            print(f"[ERROR] keys differ: {list(hist)} != {list(ref)}")
+            return False
+        for stat, want in ref.items():
+            err = abs(hist[stat] - want)
+            if stat == "std":
+                worst = max(worst, err / max(abs(want), 1e-300))
+                bad = err > 1e-12 * max(abs(want), 1.0)
+            else:
+                bad = err != 0
+            if bad:
+                print(f"[ERROR] {stat} n={n} {dtype.__name__}: histogram {hist[stat]!r} != {want!r}")
+                return False
+    print(f"equivalence: {trials} samples ok (std max rel err {worst:.1e})")
+    return True
+
+
+def synthetic_maps(size, coverage, seed=0):
+    rng = np.random.default_rng(seed)
+    mask = np.zeros((size, size), np.uint8)
+    r = int(size * np.sqrt(coverage / np.pi))
+    yy, xx = np.ogrid[:size, :size]
+    mask[(yy - size // 2) ** 2 + (xx - size // 2) ** 2 <= r * r] = 255
+    maps = {band: {key: rng.integers(0, 256, (size, size)).astype(np.uint8)
+                   for key in ("lbp", "hog", "lac1", "lac2", "lac3")}
+            for band in ft.TEXTURE_BANDS}
+    return {"plant": {"mask": mask, "texture_maps": maps}}
+
+
+def timed(plants, repeats):
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        feats = ft.compute_texture_features(plants)
+        times.append(time.perf_counter() - t0)
+    return np.median(times) * 1e3, feats[0]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", type=int, default=1024)
+    ap.add_argument("--coverage", type=float, default=0.3)
+    ap.add_argument("--repeats", type=int, default=5)
+    ap.add_argument("--trials", type=int, default=2000)
+    args = ap.parse_args()
+
+    ok = check_equivalence(args.trials)
+
+    plants = synthetic_maps(args.size, args.coverage)
+    hist_ms, hist = timed(plants, args.repeats)
+    histogram_stats = ft._histogram_stats
+    ft._histogram_stats = ft._float_stats
+    try:
+        float_ms, ref = timed(plants, args.repeats)
+    finally:
+        ft._histogram_stats = histogram_stats
+    if list(hist) != list(ref):
+        print("[ERROR] compute_texture_features keys changed")
+        ok = False
+    print(f"compute_texture_features {args.size}x{args.size}, {len(hist) - 1} features: "
+          f"np.nan* {float_ms:.1f} ms, histogram {hist_ms:.1f} ms ({float_ms / hist_ms:.1f}x)")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Vegetation index engine: numerical equivalence check + benchmark.
+
+1. Equivalence: every index from src.veg_index_engine (float64) must match
+   the reference lambdas in VEG_INDEX_FORMULAS on the plant pixels
+   (NaN/inf in the same places, values within --rtol). The float32 path is
+   reported as max absolute error over the index's value range.
+   Exits non-zero on a float64 mismatch.
+2. Benchmark: per-plant time and peak traced memory for the legacy
+   full-frame loop vs. the engine (float64 / float32).
+
+Usage:
+    python scripts/benchmark_veg_indices.py --size 1024 --coverage 0.3 --repeats 3
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.features import VEG_INDEX_FORMULAS, VEG_INDEX_CHANNELS  # noqa: E402
+from src.veg_index_engine import compute_index_values  # noqa: E402
+
+
+def synthetic_plant(size, coverage, seed=0):
+    rng = np.random.default_rng(seed)
+    spec = {b: rng.integers(0, 4096, (size, size, 1)).astype(float) for b in ("green", "red", "red_edge", "nir")}
+    # some exact zeros to exercise the guarded divisions
+    for b in spec.values():
+        b[rng.random(b.shape) < 0.001] = 0
+    mask = np.zeros((size, size), np.uint8)
+    r = int(size * np.sqrt(coverage / np.pi))
+    yy, xx = np.ogrid[:size, :size]
+    mask[(yy - size // 2) ** 2 + (xx - size // 2) ** 2 <= r * r] = 255
+    return spec, mask
+
+
+def legacy(spec, mask):
+    raw = {}
+    with np.errstate(all="ignore"):
+        for idx, func in VEG_INDEX_FORMULAS.items():
+            vals = [spec[b].squeeze(-1) for b in VEG_INDEX_CHANNELS[idx]]
+            raw[idx] = np.where(mask == 255, func(*vals), np.nan)
+    return raw
+
+
+def engine(spec, mask, dtype):
+    sel = mask == 255
+    bands = {b: spec[b].squeeze(-1)[sel] for b in spec}
+    return compute_index_values(bands, dtype=dtype)
+
+
+def check_equivalence(spec, mask, rtol):
+    sel = mask == 255
+    ref = legacy(spec, mask)
+    names, v64 = engine(spec, mask, np.float64)
+    _, v32 = engine(spec, mask, np.float32)
+    ok = True
+    print(f"{'index':>12} {'f64 max rel err':>16} {'f32 err / range':>16}")
+    for i, idx in enumerate(names):
+        r = ref[idx][sel]
+        same_nonfinite = np.array_equal(~np.isfinite(r), ~np.isfinite(v64[i]))
+        fin = np.isfinite(r) & np.isfinite(v64[i])
+        denom = np.maximum(np.abs(r[fin]), 1e-12)
+        e64 = float(np.max(np.abs(v64[i][fin] - r[fin]) / denom)) if fin.any() else 0.0
+        fin32 = fin & np.isfinite(v32[i])
+        # float32 error relative to the index's value range (values near 0 make
+        # per-pixel relative error meaningless after cancellation)
+        span = max(float(np.ptp(r[fin32])), 1e-12) if fin32.any() else 1.0
+        e32 = float(np.max(np.abs(v32[i][fin32] - r[fin32])) / span) if fin32.any() else 0.0
+        flag = "" if (same_nonfinite and e64 <= rtol) else "  <-- MISMATCH"
+        ok &= not flag
+        print(f"{idx:>12} {e64:>16.3e} {e32:>16.3e}{flag}")
+    return ok
+
+
+def measure(fn, repeats):
+    times, peak = [], 0
+    for _ in range(repeats):
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return min(times), peak
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", type=int, default=1024)
+    ap.add_argument("--coverage", type=float, default=0.3, help="fraction of the frame covered by the plant")
+    ap.add_argument("--repeats", type=int, default=3)
+    ap.add_argument("--rtol", type=float, default=1e-12)
+    args = ap.parse_args()
+
+    spec, mask = synthetic_plant(args.size, args.coverage)
+    print(f"frame {args.size}x{args.size}, plant pixels {(mask == 255).sum()}")
+
+    ok = check_equivalence(spec, mask, args.rtol)
+
+    print(f"\n{'path':>16} {'time/plant (s)':>15} {'peak MB':>10}")
+    for label, fn in [
+        ("legacy", lambda: legacy(spec, mask)),
+        ("engine float64", lambda: engine(spec, mask, np.float64)),
+        ("engine float32", lambda: engine(spec, mask, np.float32)),
+    ]:
+        t, peak = measure(fn, args.repeats)
+        print(f"{label:>16} {t:>15.4f} {peak / 1e6:>10.1f}")
+
+    if not ok:
+        print("\n[ERROR] float64 engine does not match VEG_INDEX_FORMULAS")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Export the RMBG segmentation model for the torchscript / onnx backends.
+
+Writes into MODELS_DIRECTORY (see backend/services/segmentation_backends.py):
+    rmbg.torchscript.pt, rmbg.torchscript.int8.pt   (torch.jit.trace)
+    rmbg.onnx, rmbg.int8.onnx                        (torch.onnx.export +
+                                                      onnxruntime dynamic int8)
+
+Usage:
+    python scripts/export_segmentation_model.py --formats torchscript onnx --quantize
+"""
+import argparse
+import os
+import sys
+
+import torch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.services.model_registry import get_model  # noqa: E402
+from backend.services.segmentation_backends import exported_model_path  # noqa: E402
+
+
+class _LastOutput(torch.nn.Module):
+    """RMBG returns a list of side outputs; the pipeline only uses the last one."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x):
+        return self.model(x)[-1]
+
+
+def export_torchscript(model, example, quantize):
+    if quantize:
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    path = exported_model_path("torchscript", quantize)
+    with torch.no_grad():
+        traced = torch.jit.trace(_LastOutput(model), example, check_trace=False)
+    traced.save(str(path))
+    print(f"wrote {path}")
+
+
+def export_onnx(model, example, opset, quantize, dynamic_size=False):
+    path = exported_model_path("onnx")
+    axes = {0: "batch", 2: "height", 3: "width"} if dynamic_size else {0: "batch"}
+    torch.onnx.export(
+        _LastOutput(model), example, str(path),
+        input_names=["image"], output_names=["logits"],
+        dynamic_axes={"image": axes, "logits": axes},
+        opset_version=opset,
+    )
+    print(f"wrote {path}")
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        qpath = exported_model_path("onnx", True)
+        quantize_dynamic(str(path), str(qpath), weight_type=QuantType.QInt8)
+        print(f"wrote {qpath}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--formats", nargs="+", choices=["torchscript", "onnx"], default=["torchscript", "onnx"])
+    ap.add_argument("--quantize", action="store_true", help="also write dynamic int8 variants")
+    ap.add_argument("--size", type=int, default=1024)
+    ap.add_argument("--opset", type=int, default=17)
+    ap.add_argument("--dynamic-size", action="store_true",
+                    help="ONNX: dynamic height/width (needed with SEGMENTATION_CROP=1)")
+    args = ap.parse_args()
+
+    model = get_model("rmbg")
+    if model is None:
+        print("[ERROR] RMBG model not available; cannot export.")
+        sys.exit(1)
+    model = model.cpu().eval()
+    example = torch.randn(1, 3, args.size, args.size)
+    exported_model_path("onnx").parent.mkdir(parents=True, exist_ok=True)
+
+    for fmt in args.formats:
+        if fmt == "torchscript":
+            export_torchscript(model, example, False)
+            if args.quantize:
+                export_torchscript(model, example, True)
+        else:
+            export_onnx(model, example, args.opset, args.quantize, args.dynamic_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Fit one spectral basis (first component of nir, red_edge, red, green) over
+every processed plant of a date and save it for the texture 'pca' band.
+
+Each results/{date}/{plant_id} prefix with a manifest contributes the
+plant pixels of its source frame (manifest "source_key") under its
+mask.png to one covariance accumulator (src/spectral_projection.py), so
+the fit streams plant by plant. Point the workers at the output with
+SPECTRAL_BASIS and reprocess the date.
+
+Usage:
+    python scripts/fit_spectral_basis.py --date 2024-12-04 \
+        --out s3://plant-analysis-data/spectral_basis/2024-12-04.json
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.services.result_manifest import load_manifest  # noqa: E402
+from backend.services.results_sync import s3_client, scan_prefixes  # noqa: E402
+from src.composite import process_raw_image  # noqa: E402
+from src.data_loader import load_frame_from_s3  # noqa: E402
+from src.feature_texture import PCA_BANDS  # noqa: E402
+from src.spectral_projection import CovarianceAccumulator, save_basis  # noqa: E402
+
+
+def plant_pixels(s3, bucket, prefix):
+    """(N, 4) PCA_BANDS values under the plant mask, or None."""
+    manifest = load_manifest(s3, bucket, prefix)
+    if not manifest or not manifest.get("source_key"):
+        print(f"[WARN] Skipping {prefix}: no manifest")
+        return None
+    body = s3.get_object(Bucket=bucket, Key=f"{prefix}/mask.png")['Body'].read()
+    mask = cv2.imdecode(np.frombuffer(body, np.uint8), cv2.IMREAD_GRAYSCALE)
+    _, spec = process_raw_image(load_frame_from_s3(bucket, manifest["source_key"], s3=s3))
+    sel = mask > 0
+    if sel.shape != spec[PCA_BANDS[0]].shape[:2]:
+        print(f"[WARN] Skipping {prefix}: mask {sel.shape} does not match the frame")
+        return None
+    return np.stack([spec[b][..., 0][sel] for b in PCA_BANDS], axis=1)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--date", required=True, help="results date folder, YYYY-MM-DD")
+    ap.add_argument("--out", required=True, help="local path or s3:// URI of the basis JSON")
+    ap.add_argument("--bucket", default=os.getenv("S3_BUCKET_NAME", "plant-analysis-data"))
+    ap.add_argument("--workers", type=int, default=4)
+    args = ap.parse_args()
+
+    s3 = s3_client(args.workers)
+    prefixes = [p for p in scan_prefixes(s3, args.bucket, since_date=args.date) if p.split('/')[-2] == args.date]
+    acc = CovarianceAccumulator(PCA_BANDS)
+    plants = 0
+
+    def load(prefix):
+        try:
+            return plant_pixels(s3, args.bucket, prefix)
+        except Exception as e:
+            print(f"[WARN] Skipping {prefix}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as ex:
+        for pixels in ex.map(load, prefixes):
+            if pixels is not None and len(pixels):
+                acc.update(pixels)
+                plants += 1
+    if plants == 0:
+        print(f"[ERROR] No plants with manifests and masks under results/{args.date}/")
+        sys.exit(1)
+
+    basis = acc.basis()
+    save_basis(basis, args.out, s3=s3)
+    print(f"{plants} plants, {basis.n_samples} pixels: component "
+          f"{dict(zip(PCA_BANDS, np.round(basis.component, 4)))}, saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,18 +4,18 @@ from skimage.morphology import (erosion, dilation, opening, closing,  # noqa
                                 white_tophat)
 import matplotlib.pyplot as plt
 import numpy as np
-from sklearn.decomposition import PCA
 from sklearn.preprocessing import MinMaxScaler
 
+from src.spectral_projection import first_component
+
 
 def CCA_Preprocess(composite_img,folder, img_index, title, k=2):
 
     #Use pca to reduce vector 
     reshaped_composite_img = np.reshape(composite_img,(-1,3))
     
-    #Apply PCA
-    pca = PCA(n_components=1, whiten=True)
-    gray_vector = pca.fit_transform(reshaped_composite_img)
+    #Apply PCA (closed-form first component, same scores as sklearn's whitened PCA)
+    gray_vector = first_component(reshaped_composite_img)
     
     #Visualize image
     gray_img = np.reshape(gray_vector,(512,512))
@@ -22,7 +22,8 @@ class DBC_Lacunarity(nn.Module):
         min_pool_output = -self.max_pool(-image)
 
         nr = torch.ceil(max_pool_output / (self.r + self.eps)) - torch.ceil(min_pool_output / (self.r + self.eps)) - 1
-        Mr = torch.sum(nr)
+        # per sample, so a batch of images gives the same maps as one at a time
+        Mr = torch.sum(nr, dim=(1, 2, 3), keepdim=True)
         Q_mr = nr / (self.window_size - self.r + 1)
         L_r = (Mr**2) * Q_mr / (Mr * Q_mr + self.eps)**2
         return L_r
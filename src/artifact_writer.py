@@ -0,0 +1,217 @@
+# src/artifact_writer.py
+"""
+Background S3 artifact writer.
+
+One pooled boto3 client per process and a bounded upload queue drained by
+a few uploader threads. Pipeline code enqueues bytes (or a callable that
+produces them, e.g. a PNG encoder) and keeps computing; `flush(task_id)` is
+the per-task barrier that waits for that task's uploads only and returns
+its upload statistics.
+
+    writer = get_artifact_writer()
+    with writer.task_scope("plant7-2024-12-04"):
+        writer.put(bucket, key, png_bytes, "image/png")
+        ...
+    stats = writer.flush("plant7-2024-12-04")
+"""
+import os
+import time
+import queue
+import threading
+import contextlib
+import contextvars
+
+import boto3
+from botocore.config import Config
+
+DEFAULT_TASK = "default"
+
+_CURRENT_TASK = contextvars.ContextVar("artifact_task", default=DEFAULT_TASK)
+
+
+class _TaskState:
+    def __init__(self):
+        self.pending = 0
+        self.uploaded = 0
+        self.bytes = 0
+        self.errors = []
+        self.artifacts = []
+        self.started = time.monotonic()
+
+
+class ArtifactWriter:
+    def __init__(self, concurrency=8, max_queue=256, max_retries=4):
+        self.concurrency = max(1, int(concurrency))
+        self.max_queue = max(1, int(max_queue))
+        self.max_retries = max(0, int(max_retries))
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+        self._tasks = {}
+        self._client = None
+        self._queue = None
+        self._threads = []
+        self._pid = None
+
+    # -----------------------------
+    # Client / workers
+    # -----------------------------
+    @property
+    def client(self):
+        """
+        Process-wide S3 client with a connection pool sized for the uploaders.
+        botocore's retries (transient errors and throttling, exponential
+        backoff with jitter) are the only retry layer: up to max_retries
+        retries per request.
+        """
+        self._check_pid()
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = boto3.client('s3', config=Config(
+                        max_pool_connections=max(10, self.concurrency * 2),
+                        retries={"total_max_attempts": self.max_retries + 1, "mode": "standard"},
+                    ))
+        return self._client
+
+    def _check_pid(self):
+        # clients, queues and threads do not survive fork(): start over in the child
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._client = None
+                    self._queue = None
+                    self._threads = []
+                    self._tasks = {}
+                    self._pid = os.getpid()
+
+    def _ensure_workers(self):
+        self._check_pid()
+        if self._queue is not None:
+            return
+        with self._lock:
+            if self._queue is not None:
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            for i in range(self.concurrency):
+                t = threading.Thread(target=self._run, args=(self._queue,),
+                                     name=f"artifact-uploader-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    # -----------------------------
+    # Public API
+    # -----------------------------
+    @contextlib.contextmanager
+    def task_scope(self, task_id):
+        """Attribute uploads made in this context to `task_id`."""
+        token = _CURRENT_TASK.set(task_id)
+        try:
+            yield task_id
+        finally:
+            _CURRENT_TASK.reset(token)
+
+    def put(self, bucket, key, payload, content_type=None, task_id=None):
+        """
+        Enqueue one upload. `payload` is bytes or a zero-arg callable
+        returning bytes (run on the uploader thread, e.g. cv2.imencode).
+        Blocks only when the bounded queue is full (back-pressure).
+        """
+        task_id = task_id or _CURRENT_TASK.get()
+        self._ensure_workers()
+        with self._lock:
+            self._tasks.setdefault(task_id, _TaskState()).pending += 1
+        self._queue.put((task_id, bucket, key, payload, content_type))
+
+    def flush(self, task_id=None, timeout=None):
+        """
+        Wait until every upload enqueued for `task_id` has finished and
+        return its stats: uploaded, failed, bytes, seconds, bytes_per_sec,
+        errors [(key, message)] and artifacts [(key, size, content_type)].
+        """
+        task_id = task_id or _CURRENT_TASK.get()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._done:
+            state = self._tasks.get(task_id)
+            while state is not None and state.pending > 0:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"{state.pending} uploads still pending for task {task_id}")
+                self._done.wait(remaining)
+            self._tasks.pop(task_id, None)
+        if state is None:
+            state = _TaskState()
+        elapsed = max(time.monotonic() - state.started, 1e-9)
+        return {
+            "uploaded": state.uploaded,
+            "failed": len(state.errors),
+            "bytes": state.bytes,
+            "seconds": elapsed,
+            "bytes_per_sec": state.bytes / elapsed,
+            "errors": state.errors,
+            "artifacts": state.artifacts,
+        }
+
+    # -----------------------------
+    # Uploader threads
+    # -----------------------------
+    def _upload(self, bucket, key, data, content_type):
+        extra = {"ContentType": content_type} if content_type else {}
+        self.client.put_object(Bucket=bucket, Key=key, Body=data, **extra)
+
+    def _run(self, q):
+        while True:
+            task_id, bucket, key, payload, content_type = q.get()
+            nbytes, error = 0, None
+            try:
+                data = payload() if callable(payload) else payload
+                if data is None:
+                    raise ValueError("payload produced no data")
+                nbytes = len(data)
+                self._upload(bucket, key, data, content_type)
+            except Exception as e:
+                error = str(e)
+                print(f"[ERROR] Upload failed for s3://{bucket}/{key}: {e}")
+            finally:
+                with self._done:
+                    state = self._tasks.setdefault(task_id, _TaskState())
+                    state.pending -= 1
+                    if error is None:
+                        state.uploaded += 1
+                        state.bytes += nbytes
+                        state.artifacts.append((key, nbytes, content_type))
+                    else:
+                        state.errors.append((key, error))
+                    self._done.notify_all()
+                q.task_done()
+
+
+def merge_upload_stats(stats, other):
+    """
+    Fold the flush stats of another task (e.g. a stage run in a worker
+    process) into `stats`, in place. `seconds` stays the caller's, which
+    waited for the other task.
+    """
+    for k in ("uploaded", "failed", "bytes"):
+        stats[k] += other[k]
+    stats["errors"] = stats["errors"] + other["errors"]
+    stats["artifacts"] = stats["artifacts"] + other["artifacts"]
+    stats["bytes_per_sec"] = stats["bytes"] / max(stats["seconds"], 1e-9)
+    return stats
+
+
+_WRITER = None
+_WRITER_LOCK = threading.Lock()
+
+
+def get_artifact_writer():
+    """Process-wide writer configured from ARTIFACT_UPLOAD_* env vars."""
+    global _WRITER
+    if _WRITER is None:
+        with _WRITER_LOCK:
+            if _WRITER is None:
+                _WRITER = ArtifactWriter(
+                    concurrency=int(os.getenv("ARTIFACT_UPLOAD_CONCURRENCY", "8")),
+                    max_queue=int(os.getenv("ARTIFACT_UPLOAD_QUEUE_SIZE", "256")),
+                    max_retries=int(os.getenv("ARTIFACT_UPLOAD_RETRIES", "4")),
+                )
+    return _WRITER
@@ -0,0 +1,173 @@
+# src/colormap_render.py
+"""
+Colormap rendering without matplotlib figures.
+
+Maps are colored through 256-entry lookup tables built once per colormap
+(and, for uint8 input, once per (colormap, vmin, vmax)), a vertical colorbar
+strip with tick labels is drawn straight into the array, and the result is
+PNG-encoded with cv2. Matplotlib is only used to sample the colormaps.
+
+IMAGE_RENDERER selects the backend for the save helpers in src.features and
+src.feature_texture: "lut" (default, this module) or "matplotlib" (the
+original figure + colorbar rendering).
+
+    png = render_png(index_u8, "RdYlGn", -1, 1, label="NDVI")
+"""
+import os
+import threading
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+IMAGE_RENDERER = os.getenv("IMAGE_RENDERER", "lut").lower()
+
+N_COLORS = 256
+NAN_COLOR = (255, 255, 255)  # BGR, white background like the matplotlib renderer
+N_TICKS = 5
+
+
+# pyplot's figure state is process-global and not thread-safe; the
+# matplotlib renderer draws under this lock when stages run on threads
+PYPLOT_LOCK = threading.RLock()
+
+
+def use_lut_renderer():
+    return IMAGE_RENDERER != "matplotlib"
+
+
+# -----------------------------
+# Lookup tables
+# -----------------------------
+@lru_cache(maxsize=None)
+def colormap_lut(cmap_name):
+    """(256, 3) uint8 BGR table sampled from the matplotlib colormap."""
+    from matplotlib import colormaps
+    rgba = colormaps[cmap_name](np.linspace(0.0, 1.0, N_COLORS))
+    rgb = np.clip(np.round(rgba[:, :3] * 255), 0, 255).astype(np.uint8)
+    return np.ascontiguousarray(rgb[:, ::-1])
+
+
+def _color_indices(values, vmin, vmax):
+    """Same binning as Normalize(vmin, vmax) followed by Colormap.__call__."""
+    values = np.asarray(values, dtype=np.float64)
+    if vmax == vmin:
+        return np.zeros(values.shape, dtype=np.intp)
+    x = (values - vmin) / (vmax - vmin)
+    idx = np.floor(np.nan_to_num(x, nan=0.0) * N_COLORS)
+    return np.clip(idx, 0, N_COLORS - 1).astype(np.intp)
+
+
+@lru_cache(maxsize=512)
+def _uint8_lut(cmap_name, vmin, vmax):
+    """uint8 value -> BGR color for a fixed (colormap, vmin, vmax)."""
+    return colormap_lut(cmap_name)[_color_indices(np.arange(256), vmin, vmax)]
+
+
+def _cmap_name(cmap):
+    return cmap if isinstance(cmap, str) else cmap.name
+
+
+def apply_colormap(img, cmap, vmin=None, vmax=None):
+    """
+    Color a 2-D map. NaNs are rendered white; missing vmin/vmax come from
+    the data (like imshow's autoscaling). Returns (bgr, vmin, vmax).
+    """
+    name = _cmap_name(cmap)
+    img = np.asarray(img)
+    if img.dtype != np.uint8:
+        finite = img[np.isfinite(img)]
+        lo = float(finite.min()) if finite.size else 0.0
+        hi = float(finite.max()) if finite.size else 0.0
+    elif vmin is None or vmax is None:
+        lo, hi = float(img.min()), float(img.max())
+    vmin = lo if vmin is None else float(vmin)
+    vmax = hi if vmax is None else float(vmax)
+
+    if img.dtype == np.uint8:
+        return _uint8_lut(name, vmin, vmax)[img], vmin, vmax
+
+    bgr = colormap_lut(name)[_color_indices(img, vmin, vmax)]
+    bgr[np.isnan(img)] = NAN_COLOR
+    return bgr, vmin, vmax
+
+
+# -----------------------------
+# Colorbar
+# -----------------------------
+def _tick_label(v):
+    return f"{v:.3g}"
+
+
+def _colorbar_strip(height, cmap_name, vmin, vmax, label=None):
+    """White strip holding a vertical gradient bar, tick labels and a rotated label."""
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    scale = max(0.35, height / 1400.0)
+    thick = 1 if scale < 0.8 else 2
+    pad = max(4, height // 100)
+    bar_w = max(10, height // 30)
+    ticks = np.linspace(vmin, vmax, N_TICKS) if vmax != vmin else np.array([vmin])
+    labels = [_tick_label(t) for t in ticks]
+    (tw, th), _ = cv2.getTextSize(max(labels, key=len), font, scale, thick)
+    label_w = 0
+    if label:
+        (lw, lh), lbase = cv2.getTextSize(label, font, scale, thick)
+        label_w = lh + lbase + pad
+
+    width = pad + bar_w + pad + tw + pad + label_w + pad
+    strip = np.full((height, width, 3), 255, dtype=np.uint8)
+
+    # gradient, vmax at the top
+    top, bottom = pad + th, height - pad - th
+    span = max(bottom - top, 1)
+    levels = np.linspace(N_COLORS - 1, 0, span).astype(np.intp)
+    strip[top:top + span, pad:pad + bar_w] = colormap_lut(cmap_name)[levels][:, None, :]
+    cv2.rectangle(strip, (pad, top), (pad + bar_w - 1, top + span - 1), (0, 0, 0), 1)
+
+    tx = pad + bar_w + pad
+    for t, text in zip(ticks, labels):
+        frac = 0.0 if vmax == vmin else (t - vmin) / (vmax - vmin)
+        y = int(round(top + (1.0 - frac) * (span - 1)))
+        cv2.line(strip, (pad + bar_w, y), (pad + bar_w + pad // 2, y), (0, 0, 0), 1)
+        cv2.putText(strip, text, (tx, y + th // 2), font, scale, (0, 0, 0), thick, cv2.LINE_AA)
+
+    if label:
+        # draw horizontally, then rotate into place (reads bottom-to-top)
+        canvas = np.full((lh + lbase + 2, lw + 2, 3), 255, dtype=np.uint8)
+        cv2.putText(canvas, label, (1, lh + 1), font, scale, (0, 0, 0), thick, cv2.LINE_AA)
+        rotated = cv2.rotate(canvas, cv2.ROTATE_90_COUNTERCLOCKWISE)
+        rh, rw = rotated.shape[:2]
+        if rh <= height:
+            y0 = (height - rh) // 2
+            x0 = width - pad - rw
+            strip[y0:y0 + rh, x0:x0 + rw] = rotated
+    return strip
+
+
+# -----------------------------
+# Public helpers
+# -----------------------------
+def render_colormap(img, cmap, vmin=None, vmax=None, label=None, colorbar=True):
+    """Colored map (BGR uint8) with an optional colorbar strip on the right."""
+    bgr, vmin, vmax = apply_colormap(img, cmap, vmin, vmax)
+    if not colorbar:
+        return bgr
+    strip = _colorbar_strip(bgr.shape[0], _cmap_name(cmap), vmin, vmax, label)
+    gap = np.full((bgr.shape[0], max(4, bgr.shape[0] // 60), 3), 255, dtype=np.uint8)
+    return np.hstack([bgr, gap, strip])
+
+
+def encode_png(bgr):
+    ok, buf = cv2.imencode('.png', bgr)
+    if not ok:
+        raise ValueError("PNG encoding failed")
+    return buf.tobytes()
+
+
+def render_png(img, cmap, vmin=None, vmax=None, label=None, colorbar=True):
+    return encode_png(render_colormap(img, cmap, vmin, vmax, label, colorbar))
+
+
+def render_rgb_png(rgb):
+    """PNG of an RGB image as imshow would display it (cv2 writes BGR)."""
+    return encode_png(cv2.cvtColor(np.ascontiguousarray(rgb), cv2.COLOR_RGB2BGR))
@@ -1,29 +1,68 @@
 # Cell 4: Composite & Spectral Stack
 import numpy as np
-from itertools import product
 
 def convert_to_uint8(arr):
     a = np.nan_to_num(arr, nan=0.0, posinf=0.0, neginf=0.0)
-    norm = (a - a.min()) / (np.ptp(a) + 1e-6) * 255
-    return norm.astype(np.uint8)
+    if not np.issubdtype(a.dtype, np.floating):
+        a = a.astype(float)
+    # same arithmetic as (a - min) / (ptp + 1e-6) * 255, on the one copy
+    lo, span = a.min(), np.ptp(a) + 1e-6
+    a -= lo
+    a /= span
+    a *= 255
+    return a.astype(np.uint8)
+
+
+RAW_BANDS = ("green", "red", "red_edge", "nir")
+
+
+def split_raw_bands(raw):
+    """
+    Band views into a 4-band RAW frame laid out as 2x2 tiles of d x d
+    (d = width // 2): [green | red] over [red_edge | nir]. No copies unless
+    the frame is smaller than 2d x 2d, in which case it is zero-padded
+    once (what PIL's crop did per tile). Each band is (d, d, 1) in the
+    frame's native dtype.
+    """
+    raw = np.asarray(raw)
+    d = raw.shape[1] // 2
+    if raw.shape[0] < 2 * d or raw.shape[1] < 2 * d:
+        padded = np.zeros((2 * d, 2 * d), dtype=raw.dtype)
+        padded[:raw.shape[0], :raw.shape[1]] = raw[:2 * d, :2 * d]
+        raw = padded
+    return {
+        "green": raw[:d, :d, None],
+        "red": raw[:d, d:2 * d, None],
+        "red_edge": raw[d:2 * d, :d, None],
+        "nir": raw[d:2 * d, d:2 * d, None],
+    }
+
+
+def raw_band_stack(raw):
+    """(4, d, d) contiguous stack of the RAW_BANDS (the frame cache's format)."""
+    bands = split_raw_bands(raw)
+    return np.stack([bands[b][..., 0] for b in RAW_BANDS])
 
 
 def process_raw_image(pil_img):
-    # split the 4-band RAW into tiles and stack them
-    d = pil_img.size[0] // 2
-    boxes = [(j, i, j + d, i + d)
-             for i, j in product(range(0, pil_img.height, d),
-                                range(0, pil_img.width,  d))]
-    stack = np.stack([np.array(pil_img.crop(b), float) for b in boxes], axis=-1)
-    # bands come in order: [green, red, red_edge, nir]
-    #green = stack[:, :, 0] 
-    #red = stack[:, :, 1]
-    #red_edge = stack[:, :, 2]
-    #nir = stack[:, :, 3]
-    green, red, red_edge, nir = np.split(stack, 4, axis=-1)
-    # build pseudo-RGB as (nir, red_edge, red)
-    comp = np.concatenate([green, red_edge, red], axis=-1)
-    return convert_to_uint8(comp), {"green": green, "red": red, "red_edge": red_edge, "nir": nir}
+    """
+    `pil_img` is a RAW frame (PIL image or 2-D array) or a (4, d, d) band
+    stack from raw_band_stack / the frame cache; bands are views either way.
+    """
+    raw = np.asarray(pil_img)
+    if raw.ndim == 3:
+        bands = {b: raw[i, :, :, None] for i, b in enumerate(RAW_BANDS)}
+    else:
+        # read the 4-band RAW once; bands are views into that one array
+        bands = split_raw_bands(raw)
+    # pseudo-RGB (green, red_edge, red): the only float copy. float64 as
+    # before, so the uint8 composite (segmentation input, 'color' texture
+    # band) stays bit-identical to the crop/stack path.
+    green = bands["green"]
+    comp = np.empty(green.shape[:2] + (3,), dtype=np.float64)
+    for c, b in enumerate(("green", "red_edge", "red")):
+        comp[..., c] = bands[b][..., 0]
+    return convert_to_uint8(comp), bands
 
 # def create_composites(plants):
 #     """
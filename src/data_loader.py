@@ -4,19 +4,57 @@ import json
 import numpy as np
 import cv2
 import boto3
+import yaml
 from PIL import Image
 import io
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-def load_single_frame_from_s3(bucket, key):
+from src.composite import raw_band_stack
+from src.frame_cache import get_frame_cache
+
+def load_single_frame_from_s3(bucket, key, s3=None):
     """
     Load a single image from S3 and return it as a PIL Image (without converting color).
+    Pass `s3` to reuse an existing boto3 client.
     """
-    s3 = boto3.client('s3')
+    s3 = s3 or boto3.client('s3')
     response = s3.get_object(Bucket=bucket, Key=key)
     image_data = response['Body'].read()
     image = Image.open(io.BytesIO(image_data))
     return image
 
+def load_frame_from_s3(bucket, key, s3=None, etag=None):
+    """
+    RAW frame for create_composites: with FRAME_CACHE on, the memory-mapped
+    band stack from the local frame cache (downloaded and decoded only on a
+    miss), otherwise the PIL image as load_single_frame_from_s3 returns it.
+    `etag` (e.g. from result_cache.input_fingerprint) saves a HEAD request.
+    """
+    cache = get_frame_cache()
+    if cache is None:
+        return load_single_frame_from_s3(bucket, key, s3=s3)
+    s3 = s3 or boto3.client('s3')
+    etag = etag or s3.head_object(Bucket=bucket, Key=key)['ETag'].strip('"')
+    stack = cache.get(f"s3://{bucket}/{key}", etag)
+    if stack is None:
+        stack = cache.put(f"s3://{bucket}/{key}", etag,
+                          raw_band_stack(load_single_frame_from_s3(bucket, key, s3=s3)))
+    return stack
+
+def load_local_frame(path):
+    """Local-file counterpart of load_frame_from_s3 (versioned by mtime and size)."""
+    cache = get_frame_cache()
+    if cache is None:
+        return Image.open(path)
+    st = os.stat(path)
+    version = f"{st.st_mtime_ns}-{st.st_size}"
+    stack = cache.get(os.path.abspath(path), version)
+    if stack is None:
+        with Image.open(path) as img:
+            stack = cache.put(os.path.abspath(path), version, raw_band_stack(img))
+    return stack
+
 # # Plants to ignore completely
 # _IGNORE = {2, 3, 15, 36, 44}
 
@@ -551,63 +589,137 @@ def load_single_frame_from_s3(bucket, key):
 
 #     return plants
 
-def load_selected_frame_flat(input_root_folder):
-    """
-    Load frames per plant across all dates, flattening so each
-    dict key is YYYY_MM_DD_plantX_frameY and each value is:
-      {'raw_image': (PIL.Image, filename)}
-
-    Respects your same substitutes, frame_overrides, and multi-frame sets.
-    """
-    substitutes = {
-        'plant16': 'plant15', 'plant15': 'plant14', 'plant14': 'plant13',
-        'plant13': 'plant13', 'plant33': 'plant34', 'plant34': 'plant35',
-        'plant24': 'plant25', 'plant25': 'plant25', 'plant35': 'plant36',
-        'plant36': 'plant37', 'plant37': 'plant37', 'plant44': 'plant43',
-        'plant45': 'plant44',
-    }
-    frame_override = {
-        'plant1':'9','plant2':'10','plant3':'9','plant5':'7','plant6':'9', 'plant8':'5',
-        'plant7':'9','plant10':'9','plant11':'9','plant12':'9',
-        'plant13':'10','plant14':'8','plant15':'11','plant19':'4','plant20':'7',
-        'plant21':'9','plant22':'10','plant25':'4','plant26':'2','plant27':'10','plant28':'9','plant29':'2',
-        'plant30':'9','plant31':'10','plant32':'9','plant33':'8',
-        'plant35':'9','plant36':'4','plant38':'9','plant39':'9','plant41':'9',
-        'plant42':'6','plant43':'10','plant44':'9','plant45':'7',
-        'plant47':'10','plant48':'11',
+# -----------------------------
+# Selected-frame dataset (local tree or s3://bucket/prefix)
+# -----------------------------
+FRAME_SELECTION_CONFIG = os.getenv(
+    "FRAME_SELECTION_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "frame_selection.yaml"))
+
+
+def load_frame_selection(path=None):
+    """substitutes / frame_override / default_frame rules from the YAML config."""
+    with open(path or FRAME_SELECTION_CONFIG) as f:
+        cfg = yaml.safe_load(f) or {}
+    return {
+        "substitutes": dict(cfg.get("substitutes") or {}),
+        "frame_override": {p: int(f) for p, f in (cfg.get("frame_override") or {}).items()},
+        "default_frame": int(cfg.get("default_frame", 8)),
     }
-    
 
-    flat = {}
-    for date in sorted(os.listdir(input_root_folder)):
-        date_path = os.path.join(input_root_folder, date)
-        if not os.path.isdir(date_path):
-            continue
 
+def _split_s3_uri(root):
+    bucket, _, prefix = root[len("s3://"):].partition("/")
+    return bucket, prefix.strip("/")
+
+
+def _s3_tree(s3, bucket, prefix):
+    """{date: {plant: set(filenames)}} for {prefix}/{date}/{plant}/{file} objects."""
+    tree = {}
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=f"{prefix}/" if prefix else ""):
+        for obj in page.get('Contents', []):
+            parts = obj['Key'][len(prefix) + 1 if prefix else 0:].split('/')
+            if len(parts) == 3:
+                tree.setdefault(parts[0], {}).setdefault(parts[1], set()).add(parts[2])
+    return tree
+
+
+def _selected_frame_sources(root, selection, s3=None):
+    """(flat_key, location, filename) per date/plant, in sorted order; `location` is a path or S3 key."""
+    substitutes, frame_override = selection["substitutes"], selection["frame_override"]
+    if root.startswith("s3://"):
+        bucket, prefix = _split_s3_uri(root)
+        tree = _s3_tree(s3, bucket, prefix)
+        dates = sorted(tree)
+        plants = lambda date: sorted(tree[date])  # noqa: E731
+        exists = lambda date, source, fn: fn in tree[date].get(source, ())  # noqa: E731
+        location = lambda date, source, fn: "/".join(p for p in (prefix, date, source, fn) if p)  # noqa: E731
+    else:
+        dates = [d for d in sorted(os.listdir(root)) if os.path.isdir(os.path.join(root, d))]
+        plants = lambda date: [p for p in sorted(os.listdir(os.path.join(root, date)))  # noqa: E731
+                               if os.path.isdir(os.path.join(root, date, p))]
+        exists = lambda date, source, fn: os.path.exists(os.path.join(root, date, source, fn))  # noqa: E731
+        location = lambda date, source, fn: os.path.join(root, date, source, fn)  # noqa: E731
+
+    for date in dates:
         # switch dashes → underscores for key
         date_key = date.replace('-', '_')
+        for plant in plants(date):
+            source = substitutes.get(plant, plant)
+            f = frame_override.get(plant, selection["default_frame"])
+            fn = f"{source}_frame{f}.tif"
+            if exists(date, source, fn):
+                yield f"{date_key}_{plant}_frame{f}", location(date, source, fn), fn
+            else:
+                print(f"⚠ Missing {fn} in {location(date, source, '')}")
+
 
-        for plant in sorted(os.listdir(date_path)):
-            plant_path = os.path.join(date_path, plant)
-            if not os.path.isdir(plant_path):
+def _read_local_frame(path):
+    frame = load_local_frame(path)
+    if isinstance(frame, Image.Image):
+        frame.load()  # decode here (on the prefetch thread) and release the file
+    return frame
+
+
+def iter_selected_frames(input_root, selection=None, prefetch=0, s3=None):
+    """
+    Stream the selected frame of every plant on every date under
+    `input_root` (a local folder or s3://bucket/prefix laid out as
+    {date}/{plant}/{plant}_frame{N}.tif), yielding
+      (YYYY_MM_DD_plantX_frameY, {'raw_image': (frame, filename)})
+    one at a time. Frames are PIL images or, with FRAME_CACHE on, memory-
+    mapped band stacks. `selection` is a load_frame_selection() dict
+    (default: FRAME_SELECTION_CONFIG). With `prefetch` > 0 up to that many
+    frames are read ahead on a thread pool. Frames that fail to load are
+    reported and skipped.
+    """
+    selection = selection or load_frame_selection()
+    if input_root.startswith("s3://"):
+        s3 = s3 or boto3.client('s3')
+        bucket, _ = _split_s3_uri(input_root)
+        read = lambda key: load_frame_from_s3(bucket, key, s3=s3)  # noqa: E731
+    else:
+        read = _read_local_frame
+    sources = _selected_frame_sources(input_root, selection, s3)
+
+    if prefetch <= 0:
+        for flat_key, loc, fn in sources:
+            try:
+                frame = read(loc)
+            except Exception as e:
+                print(f"❌ Failed to load {loc}: {e}")
                 continue
+            yield flat_key, {'raw_image': (frame, fn)}
+        return
+
+    with ThreadPoolExecutor(max_workers=prefetch) as ex:
+        pending = deque()
+        for flat_key, loc, fn in sources:
+            pending.append((flat_key, loc, fn, ex.submit(read, loc)))
+            # keep `prefetch` reads in flight while the caller handles the oldest frame
+            if len(pending) <= prefetch:
+                continue
+            yield from _drain(pending.popleft())
+        while pending:
+            yield from _drain(pending.popleft())
 
-            source = substitutes.get(plant, plant)
 
-            
-            frames = [int(frame_override.get(plant, '8'))]
-
-            for f in frames:
-                fn = f"{source}_frame{f}.tif"
-                fp = os.path.join(date_path, source, fn)
-                if os.path.exists(fp):
-                    try:
-                        img = Image.open(fp)
-                        key = f"{date_key}_{plant}_frame{f}"
-                        flat[key] = {'raw_image': (img, fn)}
-                    except Exception as e:
-                        print(f"❌ Failed to load {fp}: {e}")
-                else:
-                    print(f"⚠ Missing {fn} in {os.path.join(date_path, source)}")
-
-    return flat
\ No newline at end of file
+def _drain(item):
+    flat_key, loc, fn, fut = item
+    try:
+        yield flat_key, {'raw_image': (fut.result(), fn)}
+    except Exception as e:
+        print(f"❌ Failed to load {loc}: {e}")
+
+
+def load_selected_frame_flat(input_root_folder):
+    """
+    Load frames per plant across all dates, flattening so each
+    dict key is YYYY_MM_DD_plantX_frameY and each value is:
+      {'raw_image': (frame, filename)}
+    where frame is a PIL.Image or, with FRAME_CACHE on, a memory-mapped
+    (4, d, d) band stack (both accepted by process_raw_image).
+
+    Holds every frame at once; prefer iter_selected_frames for large trees.
+    """
+    return dict(iter_selected_frames(input_root_folder))
@@ -1,18 +1,34 @@
+import os
 import torch
 import numpy as np
 import cv2
 import io
-import boto3
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from scipy.signal import convolve2d
-from sklearn.decomposition import PCA
 import torch.nn.functional as F
 from src.composite import convert_to_uint8
 from skimage.feature import local_binary_pattern, hog
 from skimage import exposure
 from scipy import ndimage, signal
 from torchvision import transforms
+from src.artifact_writer import get_artifact_writer
+from src.colormap_render import PYPLOT_LOCK, render_png, render_rgb_png, use_lut_renderer
+from src.lazy_artifacts import LazyArtifactSet, lazy_artifacts_enabled
+from src.lacunarity import LACUNARITY_WINDOW, configured_scales, lacunarity_stack
+from src.spectral_projection import configured_basis, fit_basis
+
+TEXTURE_BANDS = ['color', 'nir', 'red_edge', 'red', 'green', 'pca']
+# channels of the 'pca' band (first spectral component, see src/spectral_projection.py)
+PCA_BANDS = ('nir', 'red_edge', 'red', 'green')
+# keep only the EHD argmax map and per-band histogram, not the 9 x H x W feature stack
+EHD_COMPACT = os.getenv("EHD_COMPACT", "0").lower() in ("1", "true", "yes")
+# threads for LBP / HOG / lacunarity; 0 sizes the pool next to torch's threads (see texture_workers)
+TEXTURE_WORKERS = int(os.getenv("TEXTURE_WORKERS", "0"))
+# bands per batched torch pass (DBC / EHD); their intermediates scale with it
+TEXTURE_TORCH_BATCH = int(os.getenv("TEXTURE_TORCH_BATCH", "2"))
 
-s3 = boto3.client('s3')
 def lbp_image(gray, P=8, R=1):
     lbp = local_binary_pattern(gray, P, R, method='uniform')
     return convert_to_uint8(lbp)
@@ -52,19 +68,30 @@ def compute_local_lac(gray, w):
 #     pad = (window-1)//2
 #     L3 = np.pad(dbc, ((pad,pad),(pad,pad)), mode='constant')
 #     return convert_to_uint8(L1), convert_to_uint8(L2), convert_to_uint8(L3)
-def compute_three_lac(gray, window=15):
-    L1 = compute_local_lac(gray, window)
-    scales = [max(3, window//2), window, window*2]
-    L2 = np.mean([compute_local_lac(gray, s) for s in scales], axis=0)
+@lru_cache(maxsize=None)
+def dbc_layer(window=LACUNARITY_WINDOW):
+    """Shared DBC_Lacunarity module (no parameters, so one per window is enough)."""
+    return DBC_Lacunarity(window_size=window).eval()
+
+def local_lac_maps(gray, window=LACUNARITY_WINDOW):
+    """lac1 (single window) and lac2 (mean over the configured scales) as uint8."""
+    scales = configured_scales(window)
+    windows = tuple(dict.fromkeys(scales + (window,)))
+    stack = lacunarity_stack(gray, windows)
+    L1 = stack[windows.index(window)]
+    L2 = stack[[windows.index(s) for s in scales]].mean(axis=0)
+    return convert_to_uint8(L1), convert_to_uint8(L2)
+
+def compute_three_lac(gray, window=LACUNARITY_WINDOW):
+    L1, L2 = local_lac_maps(gray, window)
 
     # DBC output (no pad)
     x     = torch.from_numpy(gray.astype(np.float32)/255.0)[None,None]
-    layer = DBC_Lacunarity(window_size=window).eval()
     with torch.no_grad():
-        dbc = layer(x).squeeze().cpu().numpy()
+        dbc = dbc_layer(window)(x).squeeze().cpu().numpy()
 
     # Return L3 un–padded (you may need to crop/resize to match L1/L2)
-    return convert_to_uint8(L1), convert_to_uint8(L2), convert_to_uint8(dbc)
+    return L1, L2, convert_to_uint8(dbc)
 
 
 
@@ -79,135 +106,359 @@ def Generate_masks(mask_size=3, angle_res=45):
     angles = np.arange(0, 360, angle_res)
     masks = np.zeros((len(angles), mask_size, mask_size))
     for i, ang in enumerate(angles):
-        masks[i] = __import__('scipy').ndimage.rotate(Gy, ang, reshape=False, mode='nearest')
+        masks[i] = ndimage.rotate(Gy, ang, reshape=False, mode='nearest')
     return masks
 
-def Get_EHD(X, device=None):
-    masks = Generate_masks()
-    in_channels = X.shape[1]
-    masks = torch.tensor(masks).float().unsqueeze(1).repeat(1, in_channels, 1, 1)
+@lru_cache(maxsize=None)
+def ehd_filter_bank(mask_size=3, angle_res=45, dtype=torch.float32):
+    """(n_angles, 1, k, k) rotated edge masks, built once per key; do not modify in place."""
+    return torch.tensor(Generate_masks(mask_size, angle_res)).to(dtype).unsqueeze(1)
+
+def ehd_edge_index(X, device=None, mask_size=3, angle_res=45, threshold=0.9):
+    """
+    Strongest edge direction per position of B x C x H x W `X` (index
+    n_angles where no response reaches `threshold`) as uint8; returns
+    (index, n_angles). One sample at a time, so only one n_angles x h x w
+    response stack is alive.
+    """
+    masks = ehd_filter_bank(mask_size, angle_res, X.dtype)
+    if X.shape[1] != 1:
+        masks = masks.repeat(1, X.shape[1], 1, 1)
     if device:
         masks = masks.to(device)
-    edge_responses = F.conv2d(X, masks, dilation=7)
-    value, index = torch.max(edge_responses, dim=1)
-    index[value < 0.9] = masks.shape[0]
-
-    feat_vect = []
-    for edge in range(masks.shape[0] + 1):
-        pooled = F.avg_pool2d((index == edge).unsqueeze(1).float(), [5,5], stride=1, count_include_pad=False)
-        feat_vect.append(pooled.squeeze(1))
+    index = None
+    for i in range(X.shape[0]):
+        edge_responses = F.conv2d(X[i:i + 1], masks, dilation=7)
+        value, idx = torch.max(edge_responses[0], dim=0)
+        del edge_responses
+        if index is None:
+            index = torch.empty((X.shape[0],) + tuple(idx.shape), dtype=torch.uint8, device=idx.device)
+        index[i] = idx
+        index[i][value < threshold] = masks.shape[0]
+    return index, masks.shape[0]
+
+def _pooled_edge_class(index, edge):
+    # 5x5 local frequency of one edge class; one B x 1 x h x w float channel at a time
+    hit = (index == edge).unsqueeze(1).float()
+    return F.avg_pool2d(hit, [5,5], stride=1, count_include_pad=False)[:, 0]
+
+def pool_edge_index(index, n_angles):
+    """EHD features: 5x5 local frequency of each of the n_angles + 1 edge classes, B x (n_angles + 1) x h x w."""
+    first = _pooled_edge_class(index, 0)
+    feats = torch.empty((first.shape[0], n_angles + 1) + tuple(first.shape[-2:]))
+    feats[:, 0] = first
+    del first
+    for edge in range(1, n_angles + 1):
+        feats[:, edge] = _pooled_edge_class(index, edge)
+    return feats
+
+def ehd_argmax_map(index, n_angles):
+    """
+    argmax over the pooled edge classes (the EHD map) as uint8 B x h x w,
+    with a running max over one pooled channel at a time instead of the
+    whole feature stack; ties go to the lower class like torch.argmax.
+    """
+    best = _pooled_edge_class(index, 0)
+    ehd_map = torch.zeros(best.shape, dtype=torch.uint8)
+    for edge in range(1, n_angles + 1):
+        pooled = _pooled_edge_class(index, edge)
+        better = pooled > best
+        ehd_map[better] = edge
+        torch.maximum(best, pooled, out=best)
+    return ehd_map
+
+def ehd_valid_mask(mask, index_shape):
+    """
+    Plant mask (H x W, nonzero = plant) cropped to the h x w positions of a
+    valid (unpadded) EHD convolution; position (y, x) is centred on input
+    pixel (y + (H - h) // 2, x + (W - w) // 2).
+    """
+    h, w = index_shape[-2:]
+    oy, ox = (mask.shape[0] - h) // 2, (mask.shape[1] - w) // 2
+    return torch.from_numpy(np.ascontiguousarray(mask[oy:oy + h, ox:ox + w] > 0))
+
+def ehd_histogram(index, n_angles, valid=None):
+    """
+    Per-sample fraction of positions in each edge class, B x (n_angles + 1);
+    `valid` (B x h x w or h x w bool) restricts the counts to plant positions.
+    """
+    n_bins = n_angles + 1
+    if valid is not None:
+        valid = valid.expand_as(index)
+    counts = torch.stack([
+        torch.bincount((index[i] if valid is None else index[i][valid[i]]).flatten().long(), minlength=n_bins)
+        for i in range(index.shape[0])
+    ]).float()
+    return counts / counts.sum(dim=1, keepdim=True).clamp_min(1)
 
-    feat_vect = torch.stack(feat_vect, dim=1)
-    return feat_vect
+def Get_EHD(X, device=None):
+    index, n_angles = ehd_edge_index(X, device=device)
+    return pool_edge_index(index, n_angles)
 
 def save_image_to_s3(bucket, key, img_np, cmap='gray'):
+    if use_lut_renderer():
+        get_artifact_writer().put(bucket, key, lambda: render_png(img_np, cmap), 'image/png')
+        return
+
     import matplotlib.pyplot as plt
     import matplotlib
     matplotlib.use('Agg')
 
-    fig, ax = plt.subplots(figsize=(6, 6))
-    im = ax.imshow(img_np, cmap=cmap)
-    ax.axis('off')
-    fig.colorbar(im, ax=ax, fraction=0.046, pad=0.04)
-
     buf = io.BytesIO()
-    plt.savefig(buf, format='png', dpi=150, bbox_inches='tight')
-    plt.close(fig)
-    buf.seek(0)
-    s3.upload_fileobj(buf, bucket, key)
+    with PYPLOT_LOCK:
+        fig, ax = plt.subplots(figsize=(6, 6))
+        im = ax.imshow(img_np, cmap=cmap)
+        ax.axis('off')
+        fig.colorbar(im, ax=ax, fraction=0.046, pad=0.04)
+        fig.savefig(buf, format='png', dpi=150, bbox_inches='tight')
+        plt.close(fig)
+    get_artifact_writer().put(bucket, key, buf.getvalue(), 'image/png')
+
+def _ehd_channel_u8(channel):
+    rng = np.max(channel) - np.min(channel)
+    if rng == 0:
+        return np.zeros_like(channel, dtype=np.uint8)
+    return ((channel - np.min(channel)) / rng * 255).astype(np.uint8)
+
+def _texture_pngs(maps):
+    """(file name, map, cmap) of every texture PNG except 01_orig."""
+    pngs = [
+        ("02_gray.png", maps['gray'], 'gray'),
+        ("03_lbp.png", maps['lbp'], 'gray'),
+        ("04_hog.png", maps['hog'], 'gray'),
+        ("05_lac1.png", maps['lac1'], 'plasma'),
+        ("06_lac2.png", maps['lac2'], 'plasma'),
+        ("07_lac3.png", maps['lac3'], 'plasma'),
+        ("08_ehd_map.png", maps['ehd_map'], 'viridis'),
+    ]
+    # historical key layout: "{band}//09_ehd_feat_{i}.png"; none with EHD_COMPACT
+    for i in range(maps['ehd_feats'].shape[0] if 'ehd_feats' in maps else 0):
+        pngs.append((f"/09_ehd_feat_{i}.png", _ehd_channel_u8(maps['ehd_feats'][i]), 'magma'))
+    return pngs
+
+def _register_lazy_texture_maps(bucket, prefix, band, maps):
+    lazy = LazyArtifactSet(bucket, prefix, f"texture/{band}")
+    if band == 'color':
+        lazy.add(f"texture/{band}/01_orig.png", maps['orig'], rgb=True)
+    else:
+        lazy.add(f"texture/{band}/01_orig.png", maps['orig'], cmap='gray')
+    for name, arr, cmap in _texture_pngs(maps):
+        lazy.add(f"texture/{band}/{name}", arr, cmap=cmap)
+    lazy.save()
+
+def texture_band_image(pdata, band):
+    """(orig, gray uint8) of one texture band."""
+    mask = pdata.get('mask')
+    if band == 'color':
+        comp = pdata['composite']
+        masked = cv2.bitwise_and(comp, comp, mask=mask) if mask is not None else comp
+        return masked, cv2.cvtColor(masked, cv2.COLOR_BGR2GRAY)
+    if band == 'pca':
+        sel = mask > 0
+        if np.count_nonzero(sel) < 2:
+            # no component to fit on fewer than two plant pixels
+            gray = np.zeros(mask.shape, np.uint8)
+            return gray, gray
+        pixels = np.stack([pdata['spectral_stack'][b][..., 0][sel] for b in PCA_BANDS], axis=1)
+        basis = configured_basis(PCA_BANDS) or fit_basis(pixels, PCA_BANDS)
+        gray_f = np.zeros(mask.shape)
+        gray_f[sel] = basis.project(pixels)
+        m, M = gray_f[mask>0].min(), gray_f[mask>0].max()
+        if M <= m:
+            # constant projection (uniform plant pixels): nothing to stretch
+            gray = np.zeros(mask.shape, np.uint8)
+            return gray, gray
+        gray = ((gray_f - m)/(M-m)*255).astype(np.uint8)
+        return gray, gray
+    arr = pdata['spectral_stack'][band].squeeze(-1).astype(float)
+    arr_m = np.where(mask > 0, arr, np.nan)
+    m, M = np.nanmin(arr_m), np.nanmax(arr_m)
+    gray = ((np.nan_to_num(arr_m, nan=m) - m)/(M-m)*255).astype(np.uint8)
+    return gray, gray
+
+
+# -----------------------------
+# Batched texture engine
+# -----------------------------
+_TEXTURE_POOL = None
+_TEXTURE_POOL_PID = None
+_TEXTURE_POOL_LOCK = threading.Lock()
+
+def texture_workers():
+    """
+    TEXTURE_WORKERS, or the cores torch's intra-op threads (SEGMENTATION_THREADS
+    when set) leave free, since the CPU maps run alongside the batched torch pass.
+    """
+    if TEXTURE_WORKERS > 0:
+        return TEXTURE_WORKERS
+    free = (os.cpu_count() or 1) - torch.get_num_threads()
+    return max(1, min(len(TEXTURE_BANDS), free))
+
+def _texture_pool():
+    global _TEXTURE_POOL, _TEXTURE_POOL_PID
+    if _TEXTURE_POOL is None or _TEXTURE_POOL_PID != os.getpid():
+        with _TEXTURE_POOL_LOCK:
+            # one pool per process; threads do not survive fork()
+            if _TEXTURE_POOL is None or _TEXTURE_POOL_PID != os.getpid():
+                _TEXTURE_POOL = ThreadPoolExecutor(max_workers=texture_workers(), thread_name_prefix="texture")
+                _TEXTURE_POOL_PID = os.getpid()
+    return _TEXTURE_POOL
+
+def _cpu_texture_maps(gray, window=LACUNARITY_WINDOW):
+    """LBP, HOG and the uniform_filter lacunarity maps of one band (runs on the texture pool)."""
+    lac1, lac2 = local_lac_maps(gray, window)
+    return {'lbp': lbp_image(gray), 'hog': cv2.convertScaleAbs(hog_image(gray)), 'lac1': lac1, 'lac2': lac2}
+
+def batched_torch_maps(grays, window=LACUNARITY_WINDOW, compact=None, mask=None):
+    """
+    DBC lacunarity and EHD of same-shape uint8 images in one B x 1 x H x W
+    forward pass each; returns per-image {'lac3', 'ehd_map'} plus
+    'ehd_feats', or 'ehd_hist' when `compact` (default EHD_COMPACT). The
+    histogram counts only positions under `mask` (same shape as the images).
+    """
+    compact = EHD_COMPACT if compact is None else compact
+    X = torch.from_numpy(np.stack(grays).astype(np.float32) / 255.0).unsqueeze(1)
+    with torch.no_grad():
+        dbc = dbc_layer(window)(X)[:, 0].cpu().numpy()
+        index, n_angles = ehd_edge_index(X)
+        if compact:
+            # no 9 x H x W feature stack: the map streams over the pooled channels
+            ehd_map = ehd_argmax_map(index, n_angles).numpy()
+            valid = ehd_valid_mask(mask, index.shape) if mask is not None else None
+            ehd = ehd_histogram(index, n_angles, valid).cpu().numpy()
+        else:
+            feats = pool_edge_index(index, n_angles)
+            ehd_map = torch.argmax(feats, dim=1).to(torch.uint8).cpu().numpy()
+            ehd = feats.numpy()
+    out = []
+    for i in range(len(grays)):
+        out.append({'lac3': convert_to_uint8(dbc[i]), 'ehd_hist' if compact else 'ehd_feats': ehd[i],
+                    'ehd_map': ehd_map[i]})
+    return out
+
+def compute_texture_maps(band_images, window=LACUNARITY_WINDOW, compact=None, mask=None, torch_batch=None):
+    """
+    texture_maps for {band: (orig, gray)}: LBP / HOG / lac1 / lac2 per band
+    on the texture thread pool while the torch maps (lac3, EHD) of bands of
+    one shape run in batches of up to `torch_batch` (TEXTURE_TORCH_BATCH)
+    bands. Same values as one band at a time;
+    with `compact` each band keeps 'ehd_hist' (over the plant `mask`)
+    instead of 'ehd_feats'.
+    """
+    pool = _texture_pool()
+    cpu = {band: pool.submit(_cpu_texture_maps, gray, window) for band, (_, gray) in band_images.items()}
+
+    by_shape = {}
+    for band, (_, gray) in band_images.items():
+        by_shape.setdefault(gray.shape, []).append(band)
+    torch_maps = {}
+    step = max(1, TEXTURE_TORCH_BATCH if torch_batch is None else torch_batch)
+    for bands in by_shape.values():
+        shape_mask = mask if mask is not None and mask.shape == band_images[bands[0]][1].shape else None
+        for i in range(0, len(bands), step):
+            chunk = bands[i:i + step]
+            out = batched_torch_maps([band_images[b][1] for b in chunk], window, compact, shape_mask)
+            torch_maps.update(zip(chunk, out))
+
+    maps = {}
+    for band, (orig, gray) in band_images.items():
+        maps[band] = {'orig': orig, 'gray': gray, **cpu[band].result(), **torch_maps[band]}
+    return maps
 
 def analyze_texture_features(pdata, key=None, s3_bucket=None, s3_prefix=None):
     if not key:
         raise ValueError("Key (plant identifier) must be provided.")
 
-    bands = ['color', 'nir', 'red_edge', 'red', 'green', 'pca']
-    filters = Generate_masks(mask_size=3, angle_res=45)
-    pdata['texture_maps'] = {}
-
-    for band in bands:
-        if band == 'color':
-            comp = pdata['composite']
-            mask = pdata.get('mask')
-            masked = cv2.bitwise_and(comp, comp, mask=mask) if mask is not None else comp
-            orig_img = masked
-            gray = cv2.cvtColor(masked, cv2.COLOR_BGR2GRAY)
-        elif band == 'pca':
-            stack = []
-            mask = pdata.get('mask')
-            for b in ['nir', 'red_edge', 'red', 'green']:
-                arr = pdata['spectral_stack'][b].squeeze(-1).astype(float)
-                arr_m = np.where(mask > 0, arr, np.nan)
-                stack.append(arr_m)
-            full = np.stack(stack, axis=-1)
-            h, w, c = full.shape
-            flat = full.reshape(-1, c)
-            valid = ~np.isnan(flat).any(axis=1)
-            vec = np.zeros(h*w)
-            vec[valid] = PCA(n_components=1, whiten=True).fit_transform(flat[valid].reshape(-1,c)).squeeze()
-            gray_f = vec.reshape(h, w)
-            m, M = gray_f[mask>0].min(), gray_f[mask>0].max()
-            gray = ((gray_f - m)/(M-m)*255).astype(np.uint8)
-            orig_img = gray
-        else:
-            arr = pdata['spectral_stack'][band].squeeze(-1).astype(float)
-            mask = pdata.get('mask')
-            arr_m = np.where(mask > 0, arr, np.nan)
-            m, M = np.nanmin(arr_m), np.nanmax(arr_m)
-            gray = ((np.nan_to_num(arr_m, nan=m) - m)/(M-m)*255).astype(np.uint8)
-            orig_img = gray
-
-        lbp_map = lbp_image(gray)
-        hog_map = cv2.convertScaleAbs(hog_image(gray))
-        lac1, lac2, lac3 = compute_three_lac(gray)
-
-        X = torch.from_numpy(gray.astype(np.float32)/255.0).unsqueeze(0).unsqueeze(0)
-        feats = Get_EHD(X)
-        ehd_feats = feats.squeeze(0).cpu().numpy()
-        ehd_map = np.argmax(ehd_feats, axis=0).astype(np.uint8)
-
-        pdata['texture_maps'][band] = {
-            'orig': orig_img, 'gray': gray,
-            'lbp': lbp_map, 'hog': hog_map,
-            'lac1': lac1, 'lac2': lac2, 'lac3': lac3,
-            'ehd_feats': ehd_feats, 'ehd_map': ehd_map
-        }
-
-        if s3_bucket and s3_prefix:
+    pdata['texture_maps'] = compute_texture_maps({band: texture_band_image(pdata, band) for band in TEXTURE_BANDS},
+                                                 mask=pdata.get('mask'))
+
+    for band in TEXTURE_BANDS:
+        orig_img = pdata['texture_maps'][band]['orig']
+        if s3_bucket and s3_prefix and lazy_artifacts_enabled():
+            _register_lazy_texture_maps(s3_bucket, s3_prefix, band, pdata['texture_maps'][band])
+        elif s3_bucket and s3_prefix:
             bprefix = f"{s3_prefix}/texture/{band}"
-            if band == 'color':
+            if band == 'color' and use_lut_renderer():
+                get_artifact_writer().put(s3_bucket, f"{bprefix}/01_orig.png",
+                                          lambda img=orig_img: render_rgb_png(img), 'image/png')
+            elif band == 'color':
                 import matplotlib.pyplot as plt
                 import matplotlib
                 matplotlib.use('Agg')
-                fig, ax = plt.subplots(figsize=(6, 6))
-                ax.imshow(orig_img)
-                ax.axis('off')
                 buf = io.BytesIO()
-                plt.savefig(buf, format='png', dpi=150, bbox_inches='tight')
-                plt.close(fig)
-                buf.seek(0)
-                s3.upload_fileobj(buf, s3_bucket, f"{bprefix}/01_orig.png")
+                with PYPLOT_LOCK:
+                    fig, ax = plt.subplots(figsize=(6, 6))
+                    ax.imshow(orig_img)
+                    ax.axis('off')
+                    fig.savefig(buf, format='png', dpi=150, bbox_inches='tight')
+                    plt.close(fig)
+                get_artifact_writer().put(s3_bucket, f"{bprefix}/01_orig.png", buf.getvalue(), 'image/png')
             else:
                 save_image_to_s3(s3_bucket, f"{bprefix}/01_orig.png", orig_img, cmap='gray')
-            save_image_to_s3(s3_bucket, f"{bprefix}/02_gray.png", gray, cmap='gray')
-            save_image_to_s3(s3_bucket, f"{bprefix}/03_lbp.png", lbp_map, cmap='gray')
-            save_image_to_s3(s3_bucket, f"{bprefix}/04_hog.png", hog_map, cmap='gray')
-            save_image_to_s3(s3_bucket, f"{bprefix}/05_lac1.png", lac1, cmap='plasma')
-            save_image_to_s3(s3_bucket, f"{bprefix}/06_lac2.png", lac2, cmap='plasma')
-            save_image_to_s3(s3_bucket, f"{bprefix}/07_lac3.png", lac3, cmap='plasma')
-            save_image_to_s3(s3_bucket, f"{bprefix}/08_ehd_map.png", ehd_map, cmap='viridis')
-
-            for i in range(ehd_feats.shape[0]):
-                channel = ehd_feats[i]
-                rng = np.max(channel) - np.min(channel)
-                if rng == 0:
-                    ch8 = np.zeros_like(channel, dtype=np.uint8)
-                else:
-                    ch8 = ((channel - np.min(channel)) / rng * 255).astype(np.uint8)
-                save_image_to_s3(s3_bucket, f"{bprefix}//09_ehd_feat_{i}.png", ch8, cmap='magma')
+            for name, arr, cmap in _texture_pngs(pdata['texture_maps'][band]):
+                save_image_to_s3(s3_bucket, f"{bprefix}/{name}", arr, cmap=cmap)
 
 
     return pdata
 
+def _lerp(a, b, t):
+    # same rounding as numpy's default ('linear') percentile interpolation
+    diff = b - a
+    return b - diff * (1 - t) if t >= 0.5 else a + diff * t
+
+def _histogram_stats(values):
+    """
+    mean / std / max / min / median / q25 / q75 / nan_fraction of an
+    unsigned-integer array from one np.bincount: O(n), no sort, the same
+    values np.nan* gives for the percentiles and exact sums for mean / std.
+    """
+    n = values.size
+    counts = np.bincount(values.ravel())
+    levels = np.nonzero(counts)[0]
+    cum = np.cumsum(counts[levels])
+
+    def order_stat(k):
+        # k-th smallest value (0-based)
+        return float(levels[np.searchsorted(cum, k, side='right')])
+
+    def percentile(q):
+        pos = (q / 100) * (n - 1)
+        lo = int(np.floor(pos))
+        return _lerp(order_stat(lo), order_stat(min(lo + 1, n - 1)), pos - lo)
+
+    s1 = int(np.dot(levels, counts[levels]))
+    s2 = int(np.dot(levels.astype(np.int64) ** 2, counts[levels]))
+    mid = (n - 1) // 2
+    median = order_stat(mid) if n % 2 else (order_stat(mid) + order_stat(mid + 1)) / 2
+    return {
+        "mean": s1 / n,
+        "std": float(np.sqrt((n * s2 - s1 * s1) / (n * n))),
+        "max": float(levels[-1]),
+        "min": float(levels[0]),
+        "median": median,
+        "q25": percentile(25),
+        "q75": percentile(75),
+        "nan_fraction": 0.0,
+    }
+
+def _float_stats(values):
+    return {
+        "mean": float(np.nanmean(values)),
+        "std": float(np.nanstd(values)),
+        "max": float(np.nanmax(values)),
+        "min": float(np.nanmin(values)),
+        "median": float(np.nanmedian(values)),
+        "q25": float(np.nanpercentile(values, 25)),
+        "q75": float(np.nanpercentile(values, 75)),
+        "nan_fraction": float(np.isnan(values).sum() / values.size),
+    }
+
+def map_statistics(values):
+    """Summary statistics of masked map values; uint8/uint16 maps take the histogram path."""
+    if values.dtype.kind == 'u' and values.dtype.itemsize <= 2:
+        return _histogram_stats(values)
+    return _float_stats(values)
+
 def compute_texture_features(plants):
     feature_table = []
 
@@ -235,14 +486,12 @@ def compute_texture_features(plants):
                 if values.size == 0:
                     continue
 
-                feature_vector[f"{band}_{key}_mean"] = float(np.nanmean(values))
-                feature_vector[f"{band}_{key}_std"] = float(np.nanstd(values))
-                feature_vector[f"{band}_{key}_max"] = float(np.nanmax(values))
-                feature_vector[f"{band}_{key}_min"] = float(np.nanmin(values))
-                feature_vector[f"{band}_{key}_median"] = float(np.nanmedian(values))
-                feature_vector[f"{band}_{key}_q25"] = float(np.nanpercentile(values, 25))
-                feature_vector[f"{band}_{key}_q75"] = float(np.nanpercentile(values, 75))
-                feature_vector[f"{band}_{key}_nan_fraction"] = float(np.isnan(values).sum() / values.size)
+                for stat, value in map_statistics(values).items():
+                    feature_vector[f"{band}_{key}_{stat}"] = value
+
+            # EHD_COMPACT: edge-class fractions over the plant instead of the feature maps
+            for i, value in enumerate(maps.get('ehd_hist', ())):
+                feature_vector[f"{band}_ehd_hist_{i}"] = float(value)
 
         feature_table.append(feature_vector)
 
@@ -1,9 +1,13 @@
 import os
 import numpy as np
 from src.composite import convert_to_uint8
+from src.veg_index_engine import compute_index_values
+from src.fused_stats import pixel_stats_rows
 import cv2
-import boto3
 import io
+from src.artifact_writer import get_artifact_writer
+from src.colormap_render import PYPLOT_LOCK, render_png, use_lut_renderer
+from src.lazy_artifacts import LazyArtifactSet, lazy_artifacts_enabled
 import matplotlib.pyplot as plt
 from matplotlib import cm
 from matplotlib.colors import Normalize
@@ -50,44 +54,55 @@ index_cmap_settings = {
 
 
 
-# Save image to S3 helper
-s3_client = boto3.client('s3')
+# float64 reproduces VEG_INDEX_FORMULAS exactly; float32 is faster / smaller
+VEG_INDEX_DTYPE = os.getenv("VEG_INDEX_DTYPE", "float64")
 
+# Save image to S3 helpers (queued on the shared background writer)
 def save_index_to_s3(bucket, key, image_np):
-    s3 = boto3.client('s3')
     success, encoded_img = cv2.imencode('.png', image_np)
     if success:
-        s3.upload_fileobj(io.BytesIO(encoded_img.tobytes()), bucket, key)
+        get_artifact_writer().put(bucket, key, encoded_img.tobytes(), 'image/png')
 
-def save_image_to_s3(bucket, key, img_np, cmap_name='viridis', title=None):
+def index_render_args(title, img_np):
+    """(cmap, vmin, vmax) for an index map; open ranges come from the data."""
     cmap, vmin, vmax = index_cmap_settings.get(title, (cm.viridis, np.nanmin(img_np), np.nanmax(img_np)))
-    
+
     # Handle None ranges
     if vmin is None:
         vmin = np.nanmin(img_np)
     if vmax is None:
         vmax = np.nanmax(img_np)
+    return cmap, vmin, vmax
+
+def save_image_to_s3(bucket, key, img_np, cmap_name='viridis', title=None):
+    cmap, vmin, vmax = index_render_args(title, img_np)
+
+    if use_lut_renderer():
+        # lookup-table renderer, encoded on the uploader thread
+        get_artifact_writer().put(bucket, key, lambda: render_png(img_np, cmap, vmin, vmax, label=title),
+                                  'image/png')
+        return
 
     # Normalize and apply colormap (set background NaNs to white)
     norm = Normalize(vmin=vmin, vmax=vmax)
     colored = cmap(norm(img_np))
     colored[np.isnan(img_np)] = [1, 1, 1, 1]  # White background for NaNs
 
-    fig, ax = plt.subplots(figsize=(5, 5))
-    ax.imshow(colored)
-    ax.axis('off')
+    buf = io.BytesIO()
+    with PYPLOT_LOCK:
+        fig, ax = plt.subplots(figsize=(5, 5))
+        ax.imshow(colored)
+        ax.axis('off')
 
-    sm = plt.cm.ScalarMappable(cmap=cmap, norm=norm)
-    sm.set_array([])
-    cbar = fig.colorbar(sm, ax=ax, orientation='vertical', fraction=0.046, pad=0.04)
-    cbar.set_label(title)
+        sm = plt.cm.ScalarMappable(cmap=cmap, norm=norm)
+        sm.set_array([])
+        cbar = fig.colorbar(sm, ax=ax, orientation='vertical', fraction=0.046, pad=0.04)
+        cbar.set_label(title)
 
-    buf = io.BytesIO()
-    plt.subplots_adjust(left=0, right=1, top=1, bottom=0)
-    plt.savefig(buf, format='png', dpi=150, bbox_inches='tight', pad_inches=0)
-    plt.close(fig)
-    buf.seek(0)
-    s3_client.upload_fileobj(buf, bucket, key)
+        fig.subplots_adjust(left=0, right=1, top=1, bottom=0)
+        fig.savefig(buf, format='png', dpi=150, bbox_inches='tight', pad_inches=0)
+        plt.close(fig)
+    get_artifact_writer().put(bucket, key, buf.getvalue(), 'image/png')
 
 # Vegetation Indices
 VEG_INDEX_FORMULAS = {
@@ -197,61 +212,73 @@ VEG_INDEX_CHANNELS = {
     "CCCI": ["nir", "red_edge", "red"]
 }
 
-def compute_veg_indices(plants, s3_bucket=None, s3_prefix=None):
+def compute_veg_indices(plants, s3_bucket=None, s3_prefix=None, dtype=None):
+    """
+    Compute every index in VEG_INDEX_FORMULAS for each plant with the
+    single-pass engine (src.veg_index_engine): only the plant pixels are
+    evaluated, shared band terms are computed once, and the results land in
+    one preallocated (n_indices, n_pixels) matrix. `dtype` defaults to
+    VEG_INDEX_DTYPE (float64 matches the lambdas; float32 halves memory).
+    """
+    dtype = np.dtype(dtype or VEG_INDEX_DTYPE)
 
     for p, d in plants.items():
         spec, mask = d.get("spectral_stack"), d.get("mask")
         if spec is None or mask is None:
             continue
 
-        raw, disp = {}, {}
+        sel = (mask == 255)
+        names = [idx for idx in VEG_INDEX_FORMULAS
+                 if idx in VEG_INDEX_CHANNELS and all(b in spec for b in VEG_INDEX_CHANNELS[idx])]
+        bands = {b: spec[b].squeeze(-1)[sel] for b in {b for idx in names for b in VEG_INDEX_CHANNELS[idx]}}
+        names, values = compute_index_values(bands, names=names, dtype=dtype)
 
-        for idx, func in VEG_INDEX_FORMULAS.items():
-            bands = VEG_INDEX_CHANNELS.get(idx)
-            if bands is None:
-                continue
-            try:
-                vals = [spec[b].squeeze(-1) for b in bands]
-            except KeyError:
-                continue
-
-            arr = func(*vals)
-            masked = np.where(mask == 255, arr, np.nan)
-            img8 = convert_to_uint8(masked)
-            raw[idx], disp[idx] = masked, img8
+        lazy = LazyArtifactSet(s3_bucket, s3_prefix, "vegetation_indices") if lazy_artifacts_enabled() else None
+        disp = {}
+        for i, idx in enumerate(names):
+            img8 = _pixels_to_uint8(values[i], sel)
+            disp[idx] = img8
 
             if s3_bucket and s3_prefix:
+                if lazy is not None:
+                    cmap, vmin, vmax = index_render_args(idx, img8)
+                    lazy.add(f"vegetation_indices/{idx}.png", img8, cmap, vmin, vmax, label=idx)
+                    continue
                 s3_key = f"{s3_prefix}/vegetation_indices/{idx}.png"
                 save_image_to_s3(s3_bucket, s3_key, img8, cmap_name=idx, title=idx)
 
+        if lazy is not None and s3_bucket and s3_prefix:
+            lazy.save()
         d["vegetation_indices"] = disp
-        d["original_index_values"] = raw
+        # plant pixels only; consumed (and dropped) by compute_veg_index_features
+        d["index_pixel_values"] = (names, values)
 
     return plants
 
+def _pixels_to_uint8(values, sel):
+    """
+    convert_to_uint8 of the full-frame map that is `values` on `sel` and NaN
+    elsewhere, without building that float map.
+    """
+    if sel.all():
+        return convert_to_uint8(values).reshape(sel.shape)
+    # background pixels become 0 in convert_to_uint8, so 0 takes part in min / ptp
+    norm = convert_to_uint8(np.append(values, values.dtype.type(0)))
+    img8 = np.full(sel.shape, norm[-1], dtype=np.uint8)
+    img8[sel] = norm[:-1]
+    return img8
+
 def compute_veg_index_features(plants):
+    """
+    Per-index statistics over the plant pixels (fused single-partition
+    kernel, see src.fused_stats). The per-pixel index values are released
+    from `plants` once their statistics are computed.
+    """
     feature_table = []
     for plant_id, data in plants.items():
-        mask = data.get("mask")
-        indices = data.get("original_index_values")
-        if mask is None or indices is None:
+        pixel_values = data.pop("index_pixel_values", None)
+        if pixel_values is None:
             continue
-        mask = (mask == 255)
-        for idx_name, idx_array in indices.items():
-            if idx_array is None:
-                continue
-            values = idx_array[mask]
-            if values.size == 0:
-                continue
-            feature_table.append({
-                "index": idx_name,
-                "mean": float(np.nanmean(values)),
-                "std": float(np.nanstd(values)),
-                "max": float(np.nanmax(values)),
-                "min": float(np.nanmin(values)),
-                "median": float(np.nanmedian(values)),
-                "q25": float(np.nanpercentile(values, 25)),
-                "q75": float(np.nanpercentile(values, 75)),
-                "nan_fraction": float(np.isnan(values).sum() / values.size)
-            })
+        names, values = pixel_values
+        feature_table.extend(pixel_stats_rows(names, values))
     return feature_table
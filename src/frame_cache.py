@@ -0,0 +1,121 @@
+# src/frame_cache.py
+"""
+Local disk cache of decoded RAW frames.
+
+Each frame is stored once as its (4, d, d) band stack (green, red,
+red_edge, nir; see composite.split_raw_bands) in a `.npy` file named after
+the source key and its version (S3 ETag, or mtime/size for local files),
+and read back with np.load(mmap_mode="r"). Reprocessing a frame, or a
+second stage reading it, then costs page-cache reads instead of an S3
+download plus a TIFF decode. A changed source gets a new version and so a
+new file; stale ones age out.
+
+Files are evicted least-recently-used first (hits refresh the mtime) once
+the directory grows past FRAME_CACHE_MAX_MB. Writes go to a temp file and
+are renamed into place, so concurrent worker processes never see a partial
+stack; evicting a file another process has mapped is safe on POSIX.
+
+    cache = get_frame_cache()
+    stack = cache.get(key, etag)          # memmap or None
+    stack = cache.put(key, etag, stack)   # returns the memmap
+"""
+import os
+import hashlib
+import threading
+from pathlib import Path
+
+import numpy as np
+
+FRAME_CACHE_ENABLED = os.getenv("FRAME_CACHE", "0").lower() in ("1", "true", "yes")
+FRAME_CACHE_DIRECTORY = os.getenv("FRAME_CACHE_DIRECTORY", "/app/backend/frame_cache")
+FRAME_CACHE_MAX_MB = float(os.getenv("FRAME_CACHE_MAX_MB", "8192"))
+
+
+class FrameCache:
+    def __init__(self, directory=FRAME_CACHE_DIRECTORY, max_bytes=FRAME_CACHE_MAX_MB * 1024 * 1024):
+        self.directory = Path(directory)
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0, "writes": 0, "evicted": 0, "errors": 0}
+
+    def path(self, key, version):
+        digest = hashlib.sha256(f"{key}\0{version}".encode("utf-8")).hexdigest()[:32]
+        return self.directory / f"{digest}.npy"
+
+    def get(self, key, version):
+        """Memory-mapped band stack, or None on a miss."""
+        path = self.path(key, version)
+        try:
+            stack = np.load(path, mmap_mode="r")
+            os.utime(path)  # LRU order is by mtime
+        except FileNotFoundError:
+            self._counts["misses"] += 1
+            return None
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Unreadable frame cache entry {path}: {e}")
+            self._counts["errors"] += 1
+            return None
+        self._counts["hits"] += 1
+        return stack
+
+    def put(self, key, version, stack):
+        """Store `stack` and return it memory-mapped from disk (or as is if the write fails)."""
+        path = self.path(key, version)
+        tmp = path.with_name(f".{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(tmp, "wb") as f:
+                np.save(f, np.ascontiguousarray(stack))
+            os.replace(tmp, path)
+            self._counts["writes"] += 1
+            self.evict()
+            return np.load(path, mmap_mode="r")
+        except OSError as e:
+            print(f"[WARN] Could not write frame cache entry for {key}: {e}")
+            self._counts["errors"] += 1
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+            return stack
+
+    def evict(self):
+        """Delete least-recently-used entries until the cache fits in max_bytes."""
+        with self._lock:
+            entries = []
+            for path in self.directory.glob("*.npy"):
+                try:
+                    st = path.stat()
+                except FileNotFoundError:
+                    continue  # evicted by another process
+                entries.append((st.st_mtime, st.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    path.unlink()
+                    self._counts["evicted"] += 1
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def stats(self):
+        entries = list(self.directory.glob("*.npy")) if self.directory.is_dir() else []
+        return dict(self._counts, entries=len(entries),
+                    bytes=sum(p.stat().st_size for p in entries if p.exists()))
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_frame_cache():
+    """Process-wide cache, or None when FRAME_CACHE is off."""
+    global _CACHE
+    if not FRAME_CACHE_ENABLED:
+        return None
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = FrameCache()
+        return _CACHE
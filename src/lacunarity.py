@@ -0,0 +1,84 @@
+# src/lacunarity.py
+"""
+Multi-scale local lacunarity from summed-area tables.
+
+Local lacunarity at window w is var / mean^2 + 1 over the w x w box
+around each pixel (0 where the mean is ~0), the same map as
+feature_texture.compute_local_lac, which runs two ndimage.uniform_filter
+passes per window. Here the image is padded once (symmetric padding, i.e.
+uniform_filter's default 'reflect' mode) and summed-area tables of I and
+I^2 are built once (cv2.integral2); every window's box sums are then four
+lookups into each table.
+
+The scales come from LACUNARITY_SCALES (comma-separated window sizes);
+unset, they follow the historical lac2 set around LACUNARITY_WINDOW:
+max(3, w // 2), w, 2 * w.
+
+    stack = lacunarity_stack(gray)              # (len(scales), H, W) float32
+    stack = lacunarity_stack(gray, (7, 15, 30))
+"""
+import os
+
+import cv2
+import numpy as np
+
+LACUNARITY_WINDOW = int(os.getenv("LACUNARITY_WINDOW", "15"))
+EPS = 1e-6
+
+
+def configured_scales(window=LACUNARITY_WINDOW):
+    """Window sizes of the multi-scale stack (LACUNARITY_SCALES, or the lac2 default)."""
+    raw = os.getenv("LACUNARITY_SCALES", "").strip()
+    if raw:
+        return tuple(int(s) for s in raw.split(",") if s.strip())
+    return (max(3, window // 2), window, window * 2)
+
+
+def summed_area_tables(gray, pad):
+    """
+    Zero-led summed-area tables of I and I^2 (float64, exact for integer
+    images) over `gray` padded by `pad`; table[y, x] is the sum over
+    padded[:y, :x]. BORDER_REFLECT is uniform_filter's 'reflect' mode.
+    """
+    if gray.dtype not in (np.uint8, np.float32, np.float64):
+        gray = gray.astype(np.float64)
+    padded = cv2.copyMakeBorder(gray, pad, pad, pad, pad, cv2.BORDER_REFLECT)
+    s1, s2 = cv2.integral2(padded, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+    return s1, s2
+
+
+def _box_sum(table, pad, shape, w):
+    # the w-wide window of output i spans [i - w//2, i - w//2 + w) like uniform_filter's
+    h, wd = shape
+    o = pad - w // 2
+    out = table[o + w:o + w + h, o + w:o + w + wd] - table[o:o + h, o + w:o + w + wd]
+    out -= table[o + w:o + w + h, o:o + wd]
+    out += table[o:o + h, o:o + wd]
+    return out
+
+
+def local_lacunarity(s1, s2, pad, shape, w):
+    """Lacunarity map of window `w` from tables built with pad >= w // 2."""
+    area = float(w * w)
+    m1 = _box_sum(s1, pad, shape, w)
+    m1 /= area
+    var = _box_sum(s2, pad, shape, w)
+    var /= area
+    sq = m1 * m1
+    var -= sq
+    sq += EPS
+    lac = np.divide(var, sq, out=var)
+    lac += 1
+    lac[m1 <= EPS] = 0
+    return lac.astype(np.float32)
+
+
+def lacunarity_stack(gray, scales=None):
+    """(len(scales), H, W) float32 local lacunarity of a 2-D image, one table build."""
+    scales = tuple(scales or configured_scales())
+    pad = max(scales) // 2
+    s1, s2 = summed_area_tables(gray, pad)
+    out = np.empty((len(scales),) + gray.shape, dtype=np.float32)
+    for i, w in enumerate(scales):
+        out[i] = local_lacunarity(s1, s2, pad, gray.shape, w)
+    return out
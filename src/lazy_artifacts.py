@@ -0,0 +1,110 @@
+# src/lazy_artifacts.py
+"""
+Lazy (on-demand) diagnostic images.
+
+With ARTIFACT_MODE=lazy the pipeline does not render the per-index,
+per-texture-map and morphology PNGs. Each stage instead stores its compact
+maps (uint8 index maps, texture maps, morphology images) in one compressed
+npz bundle plus a small JSON listing that says how to render every PNG:
+
+    {prefix}/{section}/lazy_maps.npz
+    {prefix}/{section}/lazy_artifacts.json
+        {"bundle": "<s3 key>", "artifacts": {"<png path under prefix>": spec}}
+
+The API renders a PNG on first request with `render_artifact` and writes it
+to the key the eager pipeline would have used, so later requests (and
+/plant-results) find it like any other artifact. ARTIFACT_MODE=eager
+(default) keeps rendering everything up front.
+"""
+import io
+import os
+import json
+
+import numpy as np
+
+from src.artifact_writer import get_artifact_writer
+from src.colormap_render import encode_png, render_png, render_rgb_png
+
+ARTIFACT_MODE = os.getenv("ARTIFACT_MODE", "eager").lower()
+
+LISTING_NAME = "lazy_artifacts.json"
+BUNDLE_NAME = "lazy_maps.npz"
+
+
+def lazy_artifacts_enabled():
+    return ARTIFACT_MODE == "lazy"
+
+
+def _json_number(v):
+    return None if v is None else float(v)
+
+
+class LazyArtifactSet:
+    """Collects the maps of one pipeline section and writes bundle + listing."""
+
+    def __init__(self, bucket, prefix, section):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.section = section.strip("/")
+        self.arrays = {}
+        self.artifacts = {}
+
+    def add(self, name, array, cmap=None, vmin=None, vmax=None, label=None, rgb=False, colorbar=True):
+        """
+        Register the PNG `{prefix}/{name}`. `cmap=None` and `rgb=False`
+        encodes the array as is (cv2 / BGR), like the eager save helpers.
+        """
+        array_id = f"a{len(self.arrays)}"
+        self.arrays[array_id] = np.ascontiguousarray(array)
+        self.artifacts[name] = {
+            "array": array_id,
+            "cmap": cmap if cmap is None or isinstance(cmap, str) else cmap.name,
+            "vmin": _json_number(vmin),
+            "vmax": _json_number(vmax),
+            "label": label,
+            "rgb": bool(rgb),
+            "colorbar": bool(colorbar),
+        }
+
+    def save(self):
+        if not self.artifacts:
+            return
+        base = f"{self.prefix}/{self.section}"
+        bundle_key = f"{base}/{BUNDLE_NAME}"
+        arrays = self.arrays
+
+        def _npz():
+            buf = io.BytesIO()
+            np.savez_compressed(buf, **arrays)
+            return buf.getvalue()
+
+        writer = get_artifact_writer()
+        writer.put(self.bucket, bundle_key, _npz, "application/octet-stream")
+        listing = {"bundle": bundle_key, "artifacts": self.artifacts}
+        writer.put(self.bucket, f"{base}/{LISTING_NAME}", json.dumps(listing).encode("utf-8"),
+                   "application/json")
+
+
+# -----------------------------
+# Rendering (API side)
+# -----------------------------
+def listing_candidates(prefix, name):
+    """Listing keys that may describe `{prefix}/{name}`, deepest section first."""
+    parts = [p for p in os.path.dirname(name).split("/") if p]
+    return [f"{prefix}/{'/'.join(parts[:i])}/{LISTING_NAME}" for i in range(len(parts), 0, -1)]
+
+
+def load_bundle(data):
+    with np.load(io.BytesIO(data)) as npz:
+        return {k: npz[k] for k in npz.files}
+
+
+def render_artifact(spec, arrays):
+    """PNG bytes for one listing entry, using the arrays of its bundle."""
+    img = arrays[spec["array"]]
+    if spec.get("rgb"):
+        return render_rgb_png(img)
+    if spec.get("cmap") is None:
+        return encode_png(img)
+    return render_png(img, spec["cmap"], spec.get("vmin"), spec.get("vmax"),
+                      label=spec.get("label"), colorbar=spec.get("colorbar", True))
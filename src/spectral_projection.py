@@ -0,0 +1,174 @@
+# src/spectral_projection.py
+"""
+First principal component of a few spectral channels, in closed form.
+
+The texture 'pca' band (nir, red_edge, red, green) and CCA_Preprocess
+(3 composite channels) need only the first component of a 3-4 channel
+problem. Instead of a general sklearn PCA per image, the channel mean and
+covariance are accumulated in float64 (batches merged with Chan's update,
+so a whole date can be streamed through one accumulator) and the top
+eigenvector comes from np.linalg.eigh on the c x c matrix. Signs and
+whitening follow sklearn's PCA(n_components=1, whiten=True): the
+largest-magnitude loading is positive and the projection is divided by
+the component's standard deviation, so `project` matches fit_transform.
+
+A basis fitted once over a date or experiment can be saved as JSON (local
+path or s3:// URI) and applied to every plant as one matrix-vector product
+per pixel, which also keeps the projection consistent between plants.
+SPECTRAL_BASIS names such a basis for the texture stage; unset, each plant
+gets its own fit as before. Use a new path for a refitted basis: the
+result cache keys on the setting, not the file.
+
+    acc = CovarianceAccumulator(("nir", "red_edge", "red", "green"))
+    acc.update(pixels)                 # (N, 4), repeat per plant
+    basis = acc.basis()
+    save_basis(basis, "s3://bucket/spectral_basis/2024-12-04.json")
+    gray = basis.project(pixels)       # (N,)
+"""
+import os
+import json
+from functools import lru_cache
+
+import numpy as np
+
+SPECTRAL_BASIS = os.getenv("SPECTRAL_BASIS", "")
+BASIS_VERSION = 1
+
+
+class SpectralBasis:
+    def __init__(self, mean, component, variance, channels=None, n_samples=0):
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.component = np.asarray(component, dtype=np.float64)
+        self.variance = float(variance)
+        self.channels = tuple(channels) if channels else None
+        self.n_samples = int(n_samples)
+        # whitened projection ((x - mean) . component) / std as x . weights - offset
+        scale = np.sqrt(self.variance) if self.variance > 0 else 1.0
+        self.weights = self.component / scale
+        self.offset = float(self.mean @ self.weights)
+
+    def project(self, pixels):
+        """(N, c) -> (N,) float64 first-component scores."""
+        out = np.asarray(pixels, dtype=np.float64) @ self.weights
+        out -= self.offset
+        return out
+
+    def to_dict(self):
+        return {"version": BASIS_VERSION, "channels": list(self.channels or ()), "n_samples": self.n_samples,
+                "mean": self.mean.tolist(), "component": self.component.tolist(), "variance": self.variance}
+
+    @classmethod
+    def from_dict(cls, doc):
+        if doc.get("version") != BASIS_VERSION:
+            raise ValueError(f"Unsupported spectral basis version {doc.get('version')}")
+        return cls(doc["mean"], doc["component"], doc["variance"], doc.get("channels"), doc.get("n_samples", 0))
+
+
+class CovarianceAccumulator:
+    def __init__(self, channels):
+        self.channels = tuple(channels)
+        c = len(self.channels)
+        self.n = 0
+        self.mean = np.zeros(c)
+        self.m2 = np.zeros((c, c))
+
+    def update(self, pixels):
+        """Add (N, c) samples (no NaNs)."""
+        x = np.asarray(pixels, dtype=np.float64).reshape(-1, len(self.channels))
+        nb = x.shape[0]
+        if nb == 0:
+            return self
+        mb = x.mean(axis=0)
+        xc = x - mb
+        mb2 = xc.T @ xc
+        n = self.n + nb
+        delta = mb - self.mean
+        self.m2 += mb2 + np.outer(delta, delta) * (self.n * nb / n)
+        self.mean += delta * (nb / n)
+        self.n = n
+        return self
+
+    def covariance(self):
+        return self.m2 / max(self.n - 1, 1)
+
+    def basis(self):
+        if self.n < 2:
+            raise ValueError("Need at least two samples to fit a spectral basis")
+        eigvals, eigvecs = np.linalg.eigh(self.covariance())
+        component = eigvecs[:, -1]
+        # sklearn's svd_flip(u_based_decision=False): largest |loading| positive
+        if component[np.argmax(np.abs(component))] < 0:
+            component = -component
+        return SpectralBasis(self.mean.copy(), component, max(eigvals[-1], 0.0), self.channels, self.n)
+
+
+def fit_basis(pixels, channels=None):
+    """Basis of one (N, c) sample."""
+    pixels = np.asarray(pixels)
+    channels = channels or tuple(str(i) for i in range(pixels.shape[-1]))
+    return CovarianceAccumulator(channels).update(pixels).basis()
+
+
+def first_component(pixels, channels=None):
+    """
+    Whitened first-component scores of (N, c) pixels, fitted on those
+    pixels; zeros for fewer than two pixels (nothing to fit).
+    """
+    pixels = np.asarray(pixels)
+    if pixels.reshape(-1, pixels.shape[-1]).shape[0] < 2:
+        return np.zeros(pixels.reshape(-1, pixels.shape[-1]).shape[0])
+    return fit_basis(pixels, channels).project(pixels)
+
+
+# -----------------------------
+# Persistence
+# -----------------------------
+def _s3_location(uri):
+    bucket, _, key = uri[len("s3://"):].partition("/")
+    return bucket, key
+
+
+def save_basis(basis, path, s3=None):
+    body = json.dumps(basis.to_dict(), indent=2)
+    if path.startswith("s3://"):
+        import boto3
+        bucket, key = _s3_location(path)
+        (s3 or boto3.client('s3')).put_object(Bucket=bucket, Key=key, Body=body, ContentType="application/json")
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(body)
+    os.replace(tmp, path)
+
+
+def load_basis(path, s3=None):
+    if path.startswith("s3://"):
+        import boto3
+        bucket, key = _s3_location(path)
+        body = (s3 or boto3.client('s3')).get_object(Bucket=bucket, Key=key)['Body'].read()
+    else:
+        with open(path) as f:
+            body = f.read()
+    return SpectralBasis.from_dict(json.loads(body))
+
+
+@lru_cache(maxsize=None)
+def _configured_basis(path):
+    try:
+        return load_basis(path)
+    except Exception as e:
+        print(f"[WARN] Could not load spectral basis {path} ({e}); fitting per plant.")
+        return None
+
+
+def configured_basis(channels):
+    """The SPECTRAL_BASIS basis if it is set and covers `channels` (in order), else None."""
+    if not SPECTRAL_BASIS:
+        return None
+    basis = _configured_basis(SPECTRAL_BASIS)
+    if basis is not None and basis.channels != tuple(channels):
+        print(f"[WARN] Spectral basis {SPECTRAL_BASIS} has channels {basis.channels}, not {tuple(channels)}; "
+              f"fitting per plant.")
+        return None
+    return basis
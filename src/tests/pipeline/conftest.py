@@ -0,0 +1,6 @@
+# src/tests/pipeline/conftest.py
+"""Pipeline tests import `src.*` / `backend.*` from the repository root."""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
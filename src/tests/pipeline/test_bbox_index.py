@@ -0,0 +1,96 @@
+# src/tests/pipeline/test_bbox_index.py
+"""
+BBoxIndex lookups from BATCH_PLANT_WORKERS threads: no lost counter
+updates, stats() during refreshes; failed fetches are not downloads.
+"""
+import sys
+import threading
+
+from backend.services.bbox_index import BBoxIndex
+
+
+class FakeS3:
+    """Lists two boxes whose ETags change on every listing, so each refresh re-downloads and swaps."""
+
+    def __init__(self):
+        self.listings = 0
+
+    def get_paginator(self, name):
+        fake = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                fake.listings += 1
+                yield {"Contents": [{"Key": f"{Prefix}{pid}.json", "ETag": f'"{pid}-{fake.listings}"'}
+                                    for pid in ("p1", "bad")]}
+        return Paginator()
+
+    def get_object(self, Bucket, Key):
+        body = b'{"shapes": [{"shape_type": "rectangle", "points": [[1, 2], [3, 4]]}]}' if "p1" in Key else b"{}"
+
+        class Body:
+            def read(self):
+                return body
+        return {"Body": Body()}
+
+
+def test_concurrent_lookups_are_all_counted():
+    # switch threads as often as possible so unlocked read-modify-writes interleave
+    old_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        _run_lookups()
+    finally:
+        sys.setswitchinterval(old_interval)
+
+
+def _run_lookups():
+    index = BBoxIndex("bucket", s3=FakeS3(), local_dir=None, refresh_seconds=0)
+    index.refresh()
+    threads, n, errors = 8, 2000, []
+
+    def lookups():
+        for i in range(n):
+            index.get(("p1", "bad", "missing")[i % 3])
+
+    def stats():
+        try:
+            for _ in range(200):
+                index.stats()
+                index.refresh()
+        except Exception as e:  # e.g. "dictionary changed size during iteration"
+            errors.append(e)
+
+    workers = [threading.Thread(target=lookups) for _ in range(threads)] + [threading.Thread(target=stats)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join(timeout=120)
+
+    assert not errors
+    per_thread = [sum(1 for i in range(n) if i % 3 == k) for k in range(3)]
+    counts = index.stats()
+    assert counts["lookups"] == threads * n
+    assert counts["missing"] == threads * per_thread[2]
+    assert counts["malformed"] == threads * per_thread[1]
+    assert counts["plants"] == 2 and counts["malformed_files"] == 1
+
+
+class FlakyS3(FakeS3):
+    """The "bad" box cannot be fetched."""
+
+    def get_object(self, Bucket, Key):
+        if "bad" in Key:
+            raise OSError("503 Slow Down")
+        return super().get_object(Bucket, Key)
+
+
+def test_failed_fetches_are_counted_apart_from_downloads():
+    index = BBoxIndex("bucket", s3=FlakyS3(), local_dir=None, refresh_seconds=0)
+    index.refresh()
+    index.refresh()
+    counts = index.stats()
+    assert counts["refreshes"] == 2
+    assert counts["downloads"] == 2 and counts["download_errors"] == 2
+    assert counts["s3_errors"] == 0
+    assert index.get("p1") == (1, 2, 3, 4) and index.get("bad") is None
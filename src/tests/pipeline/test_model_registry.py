@@ -0,0 +1,79 @@
+# src/tests/pipeline/test_model_registry.py
+"""Model registry: nested loads and the shared model under quantization."""
+import threading
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from backend.services import model_registry, segmentation_backends  # noqa: E402
+
+
+class StubRMBG(torch.nn.Module):
+    """Tiny stand-in for RMBG: per-pixel Linear head, list output like the real model."""
+
+    def __init__(self):
+        super().__init__()
+        torch.manual_seed(0)
+        self.head = torch.nn.Linear(3, 1)
+        self.moved_to_cpu = False
+
+    def cpu(self):
+        self.moved_to_cpu = True
+        return super().cpu()
+
+    def forward(self, x):
+        return [self.head(x.permute(0, 2, 3, 1)).permute(0, 3, 1, 2)]
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    stub = StubRMBG().eval()
+    monkeypatch.setattr(model_registry, "_MODELS", {})
+    monkeypatch.setattr(model_registry, "_NAME_LOCKS", {}, raising=False)
+    monkeypatch.setattr(model_registry, "_LOADERS", {"rmbg": lambda: stub,
+                                                     "segmenter": segmentation_backends.create_backend})
+    monkeypatch.setattr(segmentation_backends, "SEGMENTATION_BACKEND", "torch")
+    monkeypatch.setattr(segmentation_backends, "SEGMENTATION_QUANTIZE", False)
+    return stub
+
+
+def _in_thread(fn, timeout=20):
+    out = {}
+    t = threading.Thread(target=lambda: out.setdefault("value", fn()), daemon=True)
+    t.start()
+    t.join(timeout)
+    assert not t.is_alive(), "model load did not return (deadlock)"
+    return out.get("value")
+
+
+def test_segmenter_loads_rmbg_without_deadlock(registry):
+    backend = _in_thread(lambda: model_registry.get_model("segmenter"))
+    assert isinstance(backend, segmentation_backends.TorchBackend)
+    assert backend.model is registry
+    assert model_registry.is_loaded("rmbg")
+
+
+def test_warmup_all_models(registry):
+    _in_thread(model_registry.warmup)
+    assert model_registry.is_loaded("rmbg") and model_registry.is_loaded("segmenter")
+
+
+def test_concurrent_requests_load_once(monkeypatch):
+    calls = []
+    monkeypatch.setattr(model_registry, "_MODELS", {})
+    monkeypatch.setattr(model_registry, "_NAME_LOCKS", {}, raising=False)
+    monkeypatch.setattr(model_registry, "_LOADERS", {"m": lambda: calls.append(1) or object()})
+    threads = [threading.Thread(target=model_registry.get_model, args=("m",)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    assert len(calls) == 1
+
+
+def test_quantize_leaves_shared_model_alone(registry):
+    backend = segmentation_backends.create_backend("torch", quantize=True, threads=0)
+    assert not registry.moved_to_cpu
+    assert isinstance(registry.head, torch.nn.Linear)
+    assert backend.model is not registry
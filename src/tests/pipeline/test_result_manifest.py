@@ -0,0 +1,39 @@
+# src/tests/pipeline/test_result_manifest.py
+"""Manifests store the result JSON once; features and inlined documents are derived from it."""
+from backend.services.result_manifest import build_manifest, manifest_documents, manifest_features
+
+PREFIX = "results/2024-12-04/plant7"
+RESULT_KEY = f"{PREFIX}/plant7_frame8_result.json"
+RESULT = {
+    "plant_id": "plant7",
+    "vegetation_indices": [{"NDVI_mean": 0.4}],
+    "texture_features": [{"lbp_mean": 1.0}],
+    "morphology": {"plant7": {"size_traits": {"area": 120}, "morphology_traits": {"tips": 3}}},
+}
+UPLOADED = [(RESULT_KEY, 10, "application/json"),
+            (f"{PREFIX}/vegetation_indices/vegetation_features.json", 10, "application/json"),
+            (f"{PREFIX}/texture/texture_features.json", 10, "application/json"),
+            (f"{PREFIX}/morphology/plant7_traits.json", 10, "application/json")]
+
+
+def test_features_are_read_from_the_result():
+    manifest = build_manifest(None, None, PREFIX, "source.tif", RESULT_KEY, RESULT, UPLOADED)
+    assert "features" not in manifest and manifest["result"] is RESULT
+    features = manifest_features(manifest)
+    assert features["vegetation_features"] == RESULT["vegetation_indices"]
+    assert features["texture_features"] == RESULT["texture_features"]
+    assert features["morphology"] == RESULT["morphology"]
+    docs = manifest_documents(manifest, PREFIX)
+    assert docs[RESULT_KEY] is RESULT
+    assert docs[f"{PREFIX}/morphology/plant7_traits.json"] == RESULT["morphology"]["plant7"]
+
+
+def test_manifests_without_result_use_their_features():
+    features = {"vegetation_features": [{"NDVI_mean": 0.2}], "texture_features": [],
+                "morphology": {"plant7": {"size_traits": {"area": 99}, "morphology_traits": {}}}}
+    manifest = {"version": 1, "result_key": RESULT_KEY, "features": features,
+                "artifacts": {k[len(PREFIX) + 1:]: {} for k, _, _ in UPLOADED}}
+    assert manifest_features(manifest) == features
+    docs = manifest_documents(manifest, PREFIX)
+    assert RESULT_KEY not in docs  # fetched from S3
+    assert docs[f"{PREFIX}/vegetation_indices/vegetation_features.json"] == [{"NDVI_mean": 0.2}]
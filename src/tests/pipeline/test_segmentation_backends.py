@@ -0,0 +1,140 @@
+# src/tests/pipeline/test_segmentation_backends.py
+"""Mask parity between segmentation backends (IoU against the eager torch backend)."""
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from backend.services import model_registry, segmentation_backends  # noqa: E402
+
+MIN_IOU = 0.98
+
+
+def fixed_input(size=256):
+    """Normalised (1, 3, size, size) batch: a green disc on a grey background."""
+    img = np.full((size, size, 3), 0.45, np.float32)
+    yy, xx = np.ogrid[:size, :size]
+    img[(yy - size / 2) ** 2 + (xx - size / 2) ** 2 <= (size / 3) ** 2] = (0.2, 0.6, 0.15)
+    mean, std = np.array([0.485, 0.456, 0.406], np.float32), np.array([0.229, 0.224, 0.225], np.float32)
+    return ((img - mean) / std).transpose(2, 0, 1)[None].copy()
+
+
+def iou(a, b):
+    union = np.logical_or(a, b).sum()
+    return 1.0 if union == 0 else float(np.logical_and(a, b).sum() / union)
+
+
+class _LastOutput(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x):
+        return self.model(x)[-1]
+
+
+class TinySegmenter(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        torch.manual_seed(0)
+        self.conv = torch.nn.Conv2d(3, 1, 3, padding=1)
+
+    def forward(self, x):
+        return [self.conv(x)]
+
+
+class TinyLinearSegmenter(torch.nn.Module):
+    """Per-pixel MLP head: Linear layers, so dynamic int8 quantization has something to quantize."""
+
+    def __init__(self):
+        super().__init__()
+        torch.manual_seed(0)
+        self.hidden = torch.nn.Linear(3, 16)
+        self.out = torch.nn.Linear(16, 1)
+
+    def forward(self, x):
+        y = self.out(torch.relu(self.hidden(x.permute(0, 2, 3, 1))))
+        return [y.permute(0, 3, 1, 2)]
+
+
+def textured_input(size=256, seed=0):
+    """fixed_input plus noise, so many logits sit near the 0.5 threshold."""
+    rng = np.random.default_rng(seed)
+    return (fixed_input(size) + rng.normal(0, 0.5, (1, 3, size, size))).astype(np.float32)
+
+
+def test_torchscript_matches_torch_on_traced_graph(tmp_path, monkeypatch):
+    model = TinySegmenter().eval()
+    batch = fixed_input()
+    monkeypatch.setattr(segmentation_backends, "MODELS_DIRECTORY", str(tmp_path))
+    with torch.no_grad():
+        torch.jit.trace(_LastOutput(model), torch.from_numpy(batch)).save(
+            str(segmentation_backends.exported_model_path("torchscript")))
+
+    eager = segmentation_backends.TorchBackend(model).predict(batch)
+    traced = segmentation_backends.create_backend("torchscript", quantize=False, threads=0).predict(batch)
+    assert eager.shape == traced.shape == (1, 256, 256)
+    np.testing.assert_allclose(traced, eager, atol=1e-5)
+    assert iou(traced > 0.5, eager > 0.5) == 1.0
+
+
+def _real_backend(name):
+    if name == "torch" and model_registry.local_model_path(model_registry.RMBG_MODEL_ID) is None:
+        pytest.skip("RMBG weights not in MODELS_DIRECTORY")
+    if name != "torch" and not segmentation_backends.exported_model_path(name).exists():
+        pytest.skip(f"no exported {name} graph (scripts/export_segmentation_model.py)")
+    try:
+        return segmentation_backends.create_backend(name, quantize=False, threads=0)
+    except Exception as e:
+        pytest.skip(f"{name} backend unavailable: {e}")
+
+
+def test_rmbg_torchscript_iou_against_torch():
+    torch_backend = _real_backend("torch")
+    script_backend = _real_backend("torchscript")
+    batch = fixed_input(1024)
+    ref = torch_backend.predict(batch)[0] > 0.5
+    got = script_backend.predict(batch)[0] > 0.5
+    assert iou(got, ref) >= MIN_IOU
+
+
+def test_onnx_matches_torch(tmp_path, monkeypatch):
+    pytest.importorskip("onnxruntime")
+    from scripts.export_segmentation_model import export_onnx
+
+    model = TinySegmenter().eval()
+    batch = fixed_input()
+    monkeypatch.setattr(segmentation_backends, "MODELS_DIRECTORY", str(tmp_path))
+    export_onnx(model, torch.from_numpy(batch), opset=17, quantize=False)
+
+    eager = segmentation_backends.TorchBackend(model).predict(batch)
+    onnx = segmentation_backends.create_backend("onnx", quantize=False, threads=0).predict(batch)
+    assert eager.shape == onnx.shape == (1, 256, 256)
+    np.testing.assert_allclose(onnx, eager, atol=1e-5)
+    assert iou(onnx > 0.5, eager > 0.5) == 1.0
+
+
+def test_int8_torch_iou_against_float():
+    model = TinyLinearSegmenter().eval()
+    batch = textured_input()
+    ref = segmentation_backends.TorchBackend(model).predict(batch) > 0.5
+    quantized = segmentation_backends.TorchBackend(model, quantize=True)
+    assert isinstance(quantized.model.hidden, torch.ao.nn.quantized.dynamic.Linear)
+    assert isinstance(model.hidden, torch.nn.Linear)  # the shared model is left alone
+    got = quantized.predict(batch) > 0.5
+    assert 0.05 < ref.mean() < 0.95
+    assert iou(got, ref) >= MIN_IOU
+
+
+def test_int8_onnx_iou_against_float(tmp_path, monkeypatch):
+    pytest.importorskip("onnxruntime")
+    from scripts.export_segmentation_model import export_onnx
+
+    model = TinyLinearSegmenter().eval()
+    batch = textured_input()
+    monkeypatch.setattr(segmentation_backends, "MODELS_DIRECTORY", str(tmp_path))
+    export_onnx(model, torch.from_numpy(batch), opset=17, quantize=True)
+
+    ref = segmentation_backends.TorchBackend(model).predict(batch) > 0.5
+    got = segmentation_backends.create_backend("onnx", quantize=True, threads=0).predict(batch) > 0.5
+    assert iou(got, ref) >= MIN_IOU
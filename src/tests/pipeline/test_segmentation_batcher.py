@@ -0,0 +1,135 @@
+# src/tests/pipeline/test_segmentation_batcher.py
+"""
+SegmentationBatcher: a lone session runs at once, concurrent sessions
+share one predict call, and a batch never waits for a session that has
+already submitted.
+"""
+import threading
+import time
+
+from backend.services.segmentation_batcher import SegmentationBatcher
+
+MAX_WAIT_MS = 2000
+
+
+def _batcher(calls):
+    def predict(items):
+        calls.append(list(items))
+        return [x * 10 for x in items]
+    return SegmentationBatcher(predict, max_batch_size=4, max_wait_ms=MAX_WAIT_MS, group_key=lambda x: 0)
+
+
+def test_single_session_does_not_wait():
+    calls = []
+    batcher = _batcher(calls)
+    try:
+        with batcher.session():
+            t0 = time.monotonic()
+            assert batcher.segment(3, timeout=10) == 30
+            assert time.monotonic() - t0 < MAX_WAIT_MS / 1000 / 4
+    finally:
+        batcher.close()
+    assert calls == [[3]]
+
+
+def test_concurrent_sessions_are_batched():
+    calls, results = [], {}
+    batcher = _batcher(calls)
+    ready = threading.Barrier(3)
+
+    def plant(i):
+        with batcher.session():
+            ready.wait()
+            results[i] = batcher.segment(i, timeout=10)
+
+    threads = [threading.Thread(target=plant, args=(i,)) for i in range(3)]
+    try:
+        t0 = time.monotonic()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=10)
+        elapsed = time.monotonic() - t0
+    finally:
+        batcher.close()
+    assert results == {0: 0, 1: 10, 2: 20}
+    assert [sorted(c) for c in calls] == [[0, 1, 2]]
+    # the batch closed once every open session had submitted, not at max_wait
+    assert elapsed < MAX_WAIT_MS / 1000 / 2
+
+
+def test_last_submitter_does_not_wait_for_finished_sessions():
+    calls = []
+    batcher = _batcher(calls)
+    first_done, second_done = threading.Event(), threading.Event()
+    elapsed = {}
+
+    def early():
+        with batcher.session():
+            batcher.segment(1, timeout=10)
+            first_done.set()
+            # still in its session (e.g. running the texture stages)
+            second_done.wait(timeout=10)
+
+    def late():
+        first_done.wait(timeout=10)
+        with batcher.session():
+            t0 = time.monotonic()
+            batcher.segment(2, timeout=10)
+            elapsed["late"] = time.monotonic() - t0
+            second_done.set()
+
+    threads = [threading.Thread(target=early), threading.Thread(target=late)]
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=10)
+    finally:
+        batcher.close()
+    assert calls == [[1], [2]]
+    assert elapsed["late"] < MAX_WAIT_MS / 1000 / 4
+
+
+def test_session_closing_without_input_releases_the_batch():
+    calls = []
+    batcher = _batcher(calls)
+    submitted, elapsed = threading.Event(), {}
+
+    def plant():
+        with batcher.session():
+            t0 = time.monotonic()
+            fut = batcher.submit(1)
+            submitted.set()
+            fut.result(timeout=10)
+            elapsed["plant"] = time.monotonic() - t0
+
+    def no_bbox():
+        with batcher.session():
+            # e.g. a plant that fails before segmentation
+            submitted.wait(timeout=10)
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=no_bbox), threading.Thread(target=plant)]
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=10)
+    finally:
+        batcher.close()
+    assert calls == [[1]]
+    assert elapsed["plant"] < MAX_WAIT_MS / 1000 / 4
+
+
+def test_without_sessions_waits_for_company():
+    calls = []
+    batcher = SegmentationBatcher(lambda items: (calls.append(list(items)), items)[1],
+                                  max_batch_size=2, max_wait_ms=50, group_key=lambda x: 0)
+    try:
+        t0 = time.monotonic()
+        assert batcher.segment(1, timeout=10) == 1
+        assert time.monotonic() - t0 >= 0.04
+    finally:
+        batcher.close()
+    assert calls == [[1]]
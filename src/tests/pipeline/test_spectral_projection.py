@@ -0,0 +1,55 @@
+# src/tests/pipeline/test_spectral_projection.py
+"""Closed-form first component vs sklearn's whitened PCA, and the degenerate 'pca' texture band."""
+import warnings
+
+import numpy as np
+import pytest
+from sklearn.decomposition import PCA
+
+from src.feature_texture import PCA_BANDS, texture_band_image
+from src.spectral_projection import CovarianceAccumulator, first_component
+
+
+def _pixels(n=5000, c=4, seed=0):
+    rng = np.random.default_rng(seed)
+    mix = rng.normal(size=(c, c))
+    return rng.normal(size=(n, c)) @ mix + rng.uniform(0, 255, c)
+
+
+@pytest.mark.parametrize("c", [3, 4])
+def test_first_component_matches_sklearn_up_to_sign(c):
+    x = _pixels(c=c)
+    ref = PCA(n_components=1, whiten=True).fit_transform(x)[:, 0]
+    got = first_component(x)
+    sign = np.sign(got @ ref)
+    np.testing.assert_allclose(sign * got, ref, rtol=1e-6, atol=1e-6)
+
+
+def test_accumulated_basis_matches_one_fit():
+    x = _pixels()
+    acc = CovarianceAccumulator(range(4))
+    for chunk in np.array_split(x, 7):
+        acc.update(chunk)
+    np.testing.assert_allclose(acc.basis().project(x), first_component(x), rtol=1e-9, atol=1e-9)
+
+
+def test_first_component_of_fewer_than_two_pixels_is_zero():
+    assert first_component(np.ones((1, 4))).tolist() == [0.0]
+    assert first_component(np.ones((0, 4))).shape == (0,)
+
+
+def _pdata(mask, values):
+    return {"mask": mask, "spectral_stack": {b: np.full(mask.shape + (1,), v, np.float32)
+                                             for b, v in zip(PCA_BANDS, values)}}
+
+
+@pytest.mark.parametrize("plant_pixels", [0, 1, 50])
+def test_degenerate_pca_band_is_zero(plant_pixels):
+    mask = np.zeros((16, 16), np.uint8)
+    mask.flat[:plant_pixels] = 255
+    # uniform bands: the projection is constant over the plant
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        orig, gray = texture_band_image(_pdata(mask, (0.6, 0.4, 0.2, 0.3)), 'pca')
+    assert gray.dtype == np.uint8 and gray.shape == mask.shape
+    assert not gray.any()
@@ -0,0 +1,134 @@
+# src/tests/pipeline/test_stage_scheduler.py
+"""
+Stage fan-out under a Celery prefork worker: the pool children are
+daemonic and may not start processes, so the stages must run on threads
+there instead of warning and falling back inline on every task. Stages
+run in worker processes flush their own uploads; those stats must reach
+the caller's manifest and cache decisions.
+"""
+import os
+import threading
+import multiprocessing
+
+import pytest
+
+pytest.importorskip("plantcv")  # backend.services.stage_scheduler imports src.morphology
+
+import backend.services.stage_scheduler as scheduler  # noqa: E402
+from src.artifact_writer import _CURRENT_TASK, get_artifact_writer, merge_upload_stats  # noqa: E402
+
+
+def _where(pdata, flat_key, plant_id, bucket, prefix):
+    return {"pid": os.getpid(), "thread": threading.current_thread().name,
+            "task": _CURRENT_TASK.get(), "mask_sum": int(pdata["mask"].sum())}
+
+
+def _fail(pdata, flat_key, plant_id, bucket, prefix):
+    raise ValueError("boom")
+
+
+def _pdata():
+    import numpy as np
+    mask = np.zeros((8, 8), np.uint8)
+    mask[2:5, 2:5] = 1
+    return {"composite": np.zeros((8, 8, 3), np.uint8), "mask": mask,
+            "spectral_stack": {"nir": np.zeros((8, 8, 1), np.float32)}}
+
+
+@pytest.fixture
+def stub_stages(monkeypatch):
+    monkeypatch.setattr(scheduler, "STAGES", {"a": _where, "b": _where, "bad": _fail})
+    monkeypatch.setattr(scheduler, "STAGE_WORKERS", 2)
+    monkeypatch.setattr(scheduler, "STAGE_EXECUTOR", "auto")
+    monkeypatch.setattr(scheduler, "_POOL", None)
+    monkeypatch.setattr(scheduler, "_POOL_KIND", None)
+    monkeypatch.setattr(scheduler, "_PROCESS_POOL_FAILED_PID", None)
+    yield
+    scheduler._reset_pool()
+
+
+def _prefork_child(out):
+    # what a Celery prefork child does per task: run the stages of one plant
+    with get_artifact_writer().task_scope("plant-1") as task_id:
+        results, timings = scheduler.run_independent_stages(_pdata(), "k", "plant-1", "bucket", "prefix")
+    out.put((os.getpid(), task_id, scheduler._POOL_KIND, results, sorted(timings)))
+
+
+def test_daemonic_worker_runs_stages_on_threads(stub_stages, capfd):
+    ctx = multiprocessing.get_context("fork")
+    out = ctx.Queue()
+    child = ctx.Process(target=_prefork_child, args=(out,), daemon=True)
+    child.start()
+    pid, task_id, kind, results, timings = out.get(timeout=60)
+    child.join(timeout=60)
+
+    assert child.exitcode == 0
+    assert kind == "thread"
+    assert "unavailable" not in capfd.readouterr().out
+    for stage in ("a", "b"):
+        assert results[stage]["pid"] == pid
+        assert results[stage]["thread"].startswith("pipeline-stage")
+        assert results[stage]["task"] == task_id  # uploads go to the caller's flush
+        assert results[stage]["mask_sum"] == 9
+    assert results["bad"] is None
+    assert timings == ["a", "b", "independent_stages_wall"]
+
+
+def test_failed_process_pool_is_not_retried(stub_stages, monkeypatch, capfd):
+    created = []
+
+    class NoChildren:
+        def __init__(self, *args, **kwargs):
+            created.append(self)
+
+        def submit(self, *args, **kwargs):
+            raise AssertionError("daemonic processes are not allowed to have children")
+
+        def shutdown(self, wait=True, cancel_futures=False):
+            pass
+
+    monkeypatch.setattr(scheduler, "ProcessPoolExecutor", NoChildren)
+    monkeypatch.setattr(scheduler, "_is_daemonic", lambda: False)
+
+    for _ in range(3):
+        results, _ = scheduler.run_independent_stages(_pdata(), "k", "plant-1", "bucket", "prefix")
+        assert results["a"]["mask_sum"] == 9 and results["bad"] is None
+
+    assert len(created) == 1
+    assert capfd.readouterr().out.count("unavailable") == 1
+    assert scheduler._POOL_KIND == "thread"
+
+
+def _uploads(pdata, flat_key, plant_id, bucket, prefix):
+    writer = get_artifact_writer()
+    writer.put(bucket, f"{prefix}/texture/ok.png", b"png", "image/png")
+    writer.put(bucket, f"{prefix}/texture/bad.png", b"png", "image/png")
+    return "done"
+
+
+def test_worker_upload_stats_reach_the_caller(stub_stages, monkeypatch):
+    def fake_upload(self, bucket, key, data, content_type):
+        if key.endswith("bad.png"):
+            raise OSError("503 Slow Down")
+
+    monkeypatch.setattr(type(get_artifact_writer()), "_upload", fake_upload)
+    monkeypatch.setitem(scheduler.STAGES, "uploads", _uploads)
+    shm, desc = scheduler._share_arrays({"composite": _pdata()["composite"], "mask": _pdata()["mask"]})
+    try:
+        out, _, worker = scheduler._run_stage_in_worker("uploads", desc, "k", "plant-1", "bucket", "prefix")
+    finally:
+        shm.close()
+        shm.unlink()
+
+    assert out == "done"
+    assert worker["uploaded"] == 1 and worker["failed"] == 1
+    assert worker["artifacts"] == [("prefix/texture/ok.png", 3, "image/png")]
+
+    writer = get_artifact_writer()
+    with writer.task_scope("plant-1") as task_id:
+        writer.put("bucket", "prefix/mask.png", b"mask", "image/png")
+    parent = writer.flush(task_id)
+    merge_upload_stats(parent, worker)
+    assert parent["uploaded"] == 2 and parent["failed"] == 1 and parent["bytes"] == 7
+    assert [a[0] for a in parent["artifacts"]] == ["prefix/mask.png", "prefix/texture/ok.png"]
+    assert parent["errors"] == [("prefix/texture/bad.png", "503 Slow Down")]
@@ -0,0 +1,51 @@
+# src/tests/pipeline/test_texture_ehd.py
+"""EHD_COMPACT: the per-band edge histogram covers plant pixels only and reaches the texture features."""
+import numpy as np
+import torch
+
+from src.feature_texture import compute_texture_features, compute_texture_maps, ehd_edge_index, ehd_histogram
+
+
+def _band_images(size=96, seed=0):
+    rng = np.random.default_rng(seed)
+    # flat plant on the left, strong edges (stripes) in the background on the right
+    gray = np.full((size, size), 120, np.uint8)
+    gray[:, size // 2:] = np.where((np.arange(size // 2) // 3) % 2, 255, 0).astype(np.uint8)
+    gray[:, :size // 2] += rng.integers(0, 3, (size, size // 2)).astype(np.uint8)
+    mask = np.zeros((size, size), np.uint8)
+    mask[:, :size // 2 - 10] = 255
+    return {"nir": (gray, gray), "red": (255 - gray, 255 - gray)}, mask
+
+
+def test_histogram_counts_only_mask_positions():
+    band_images, mask = _band_images()
+    maps = compute_texture_maps(band_images, compact=True, mask=mask)
+    for band, (_, gray) in band_images.items():
+        index, n_angles = ehd_edge_index(torch.from_numpy(gray.astype(np.float32) / 255.0)[None, None])
+        index = index[0].numpy()
+        oy, ox = (np.array(gray.shape) - index.shape) // 2
+        sel = mask[oy:oy + index.shape[0], ox:ox + index.shape[1]] > 0
+        ref = np.bincount(index[sel], minlength=n_angles + 1) / sel.sum()
+        np.testing.assert_allclose(maps[band]["ehd_hist"], ref, atol=1e-6)
+        # the striped background would put most positions in an edge class
+        unmasked = np.bincount(index.ravel(), minlength=n_angles + 1) / index.size
+        assert maps[band]["ehd_hist"][-1] == 1.0 > unmasked[-1]
+
+
+def test_histogram_without_mask_counts_every_position():
+    index = torch.tensor([[[0, 1], [1, 2]], [[2, 2], [2, 2]]])
+    np.testing.assert_allclose(ehd_histogram(index, 2).numpy(), [[0.25, 0.5, 0.25], [0, 0, 1]])
+    valid = torch.tensor([[True, False], [False, True]])
+    np.testing.assert_allclose(ehd_histogram(index, 2, valid).numpy(), [[0.5, 0, 0.5], [0, 0, 1]])
+
+
+def test_compact_histogram_is_emitted_as_features():
+    band_images, mask = _band_images()
+    maps = compute_texture_maps(band_images, compact=True, mask=mask)
+    features = compute_texture_features({"plant": {"mask": mask, "texture_maps": maps}})[0]
+    for band in band_images:
+        hist = [features[f"{band}_ehd_hist_{i}"] for i in range(len(maps[band]["ehd_hist"]))]
+        assert hist == [float(v) for v in maps[band]["ehd_hist"]]
+    full = compute_texture_maps(band_images, compact=False, mask=mask)
+    features = compute_texture_features({"plant": {"mask": mask, "texture_maps": full}})[0]
+    assert not any("_ehd_hist_" in k for k in features)
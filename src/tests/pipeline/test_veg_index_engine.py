@@ -0,0 +1,49 @@
+# src/tests/pipeline/test_veg_index_engine.py
+"""compute_index_values must reproduce the VEG_INDEX_FORMULAS lambdas."""
+import numpy as np
+import pytest
+
+from src.features import VEG_INDEX_CHANNELS, VEG_INDEX_FORMULAS
+from src.veg_index_engine import compute_index_values
+
+BANDS = ("green", "red", "red_edge", "nir")
+
+
+@pytest.fixture(scope="module")
+def bands():
+    rng = np.random.default_rng(1234)
+    out = {b: rng.integers(0, 4096, 5000).astype(np.float64) for b in BANDS}
+    # exact zeros exercise the guarded divisions
+    for i, b in enumerate(BANDS):
+        out[b][i::97] = 0
+    return out
+
+
+@pytest.fixture(scope="module")
+def legacy(bands):
+    with np.errstate(all="ignore"):
+        return {idx: np.asarray(func(*[bands[b] for b in VEG_INDEX_CHANNELS[idx]]), dtype=np.float64)
+                for idx, func in VEG_INDEX_FORMULAS.items()}
+
+
+def test_engine_covers_every_index(bands):
+    names, values = compute_index_values(bands)
+    assert set(names) == set(VEG_INDEX_FORMULAS)
+    assert values.shape == (len(names), 5000)
+
+
+def test_float64_matches_legacy_formulas(bands, legacy):
+    names, values = compute_index_values(bands, dtype=np.float64)
+    for i, idx in enumerate(names):
+        ref = np.broadcast_to(legacy[idx], values[i].shape)
+        np.testing.assert_array_equal(np.isfinite(values[i]), np.isfinite(ref), err_msg=idx)
+        fin = np.isfinite(ref)
+        np.testing.assert_allclose(values[i][fin], ref[fin], rtol=1e-12, atol=0, err_msg=idx)
+
+
+def test_subset_matches_full_run(bands):
+    names, full = compute_index_values(bands)
+    subset = names[::5]
+    got_names, got = compute_index_values(bands, names=subset)
+    assert list(got_names) == list(subset)
+    np.testing.assert_array_equal(got, full[::5])
@@ -0,0 +1,182 @@
+# src/veg_index_engine.py
+"""
+Single-pass vegetation index engine.
+
+Evaluates any subset of the indices in `src.features.VEG_INDEX_FORMULAS` on
+1-D arrays of plant pixels (not full frames). Band sums, differences,
+squares and ratios that several formulas share are computed once per call,
+and each index is written into a row of one preallocated output matrix.
+The expressions mirror the lambdas in VEG_INDEX_FORMULAS term for term
+(same operation order, same epsilons, same zero-guarded divisions) so that
+float64 results match them.
+
+    names, values = compute_index_values({"nir": nir[m], "red": red[m], ...})
+    # values.shape == (len(names), m.sum())
+"""
+import numpy as np
+
+EPS = 1e-10
+BANDS = ("green", "red", "red_edge", "nir")
+
+
+def _safe_div(num, den, where, out):
+    """np.divide(num, den, out=zeros, where=where), written into `out`."""
+    out[...] = 0
+    np.divide(num, den, out=out, where=where)
+    return out
+
+
+def _assign(out, value):
+    out[...] = value
+    return out
+
+
+# Shared subexpressions: name -> f(T). Evaluated lazily, at most once per call.
+TERMS = {
+    # sums / differences
+    "nir+red": lambda T: T["nir"] + T["red"],
+    "nir-red": lambda T: T["nir"] - T["red"],
+    "nir+green": lambda T: T["nir"] + T["green"],
+    "nir-green": lambda T: T["nir"] - T["green"],
+    "nir+red_edge": lambda T: T["nir"] + T["red_edge"],
+    "nir-red_edge": lambda T: T["nir"] - T["red_edge"],
+    "green+red": lambda T: T["green"] + T["red"],
+    "green-red": lambda T: T["green"] - T["red"],
+    "red-green": lambda T: T["red"] - T["green"],
+    "red_edge-red": lambda T: T["red_edge"] - T["red"],
+    "red_edge-green": lambda T: T["red_edge"] - T["green"],
+    # powers
+    "green^2": lambda T: T["green"] ** 2.0,
+    "red^2": lambda T: T["red"] ** 2.0,
+    "nir^2": lambda T: T["nir"] ** 2,
+    "2nir+1": lambda T: 2 * T["nir"] + 1,
+    "(2nir+1)^2": lambda T: T["2nir+1"] ** 2,
+    # ratios
+    "nir/(red+eps)": lambda T: T["nir"] / (T["red"] + EPS),
+    "nir/(green+eps)": lambda T: T["nir"] / (T["green"] + EPS),
+    "nir/(red_edge+eps)": lambda T: T["nir"] / (T["red_edge"] + EPS),
+    "red_edge/red (safe)": lambda T: _safe_div(T["red_edge"], T["red"] + 1e-10, T["red"] != 0,
+                                               np.empty_like(T["red_edge"])),
+    "(nir-red)/(nir+red+eps)": lambda T: T["nir-red"] / (T["nir+red"] + EPS),
+    "(nir-red)/(nir+red+0.16+eps)": lambda T: T["nir-red"] / (T["nir+red"] + 0.16 + EPS),
+    # shared by MCARI2 / MTVI2
+    "mcari2_den": lambda T: np.sqrt(T["(2nir+1)^2"] - (6 * T["nir"] - 5 * np.sqrt(T["red"] + EPS))),
+    # shared by MCARI1 / MCARI2
+    "2.5(nir-red)-1.3(nir-green)": lambda T: 2.5 * T["nir-red"] - 1.3 * T["nir-green"],
+    # shared by MTVI1 / MTVI2
+    "1.2(nir-green)-2.5(red-green)": lambda T: 1.2 * T["nir-green"] - 2.5 * T["red-green"],
+    # GEMI eta
+    "gemi_eta": lambda T: (2 * (T["nir^2"] - T["red"] ** 2) + 1.5 * T["nir"] + 0.5 * T["red"]) / (T["nir+red"] + 0.5 + EPS),
+}
+
+
+def _gsavi(T, out):
+    _safe_div(T["nir-green"], T["nir+green"] + 0.5 + 1e-10, (T["nir+green"] + 0.5) != 0, out)
+    out *= 1.5
+    return out
+
+
+def _tcari(T, out):
+    out[...] = 3 * (T["red_edge-red"] - 0.2 * T["red_edge-green"] * T["red_edge/red (safe)"])
+    return out
+
+
+# Index definitions: name -> f(T, out); each writes its result into `out`.
+INDEX_DEFS = {
+    "ARI": lambda T, out: np.subtract(1.0 / (T["green"] + EPS), 1.0 / (T["red_edge"] + EPS), out=out),
+    "MCARI": lambda T, out: np.multiply(T["red_edge-red"] - 0.2 * T["red_edge-green"], T["red_edge/red (safe)"], out=out),
+    "GRNDVI": lambda T, out: _safe_div(T["nir"] - T["green+red"], T["nir"] + T["green+red"] + 1e-10,
+                                       (T["nir+green"] + T["red"]) != 0, out),
+    "CVI": lambda T, out: _safe_div(T["nir"] * T["red"], T["green^2"] + 1e-10, T["green^2"] != 0, out),
+    "ARI2": lambda T, out: np.subtract(
+        T["nir"] * _safe_div(1, T["green"] + 1e-10, T["green"] != 0, np.empty_like(out)),
+        T["nir"] * _safe_div(1, T["red_edge"] + 1e-10, T["red_edge"] != 0, np.empty_like(out)),
+        out=out),
+    "CIRE": lambda T, out: np.subtract(T["nir/(red_edge+eps)"], 1.0, out=out),
+    "DSWI4": lambda T, out: np.divide(T["green"], T["red"] + EPS, out=out),
+    "DVI": lambda T, out: _assign(out, T["nir-red"]),
+    "ExR": lambda T, out: np.subtract(1.3 * T["red"], T["green"], out=out),
+    "GEMI": lambda T, out: np.subtract(T["gemi_eta"] * (1 - 0.25 * T["gemi_eta"]),
+                                       (T["red"] - 0.125) / (1 - T["red"] + EPS), out=out),
+    "GNDVI": lambda T, out: np.divide(T["nir-green"], T["nir+green"] + EPS, out=out),
+    "GOSAVI": lambda T, out: np.divide(T["nir-green"], T["nir+green"] + 0.16 + EPS, out=out),
+    "GRVI": lambda T, out: _assign(out, T["nir/(green+eps)"]),
+    "IPVI": lambda T, out: np.divide(T["nir"], T["nir+red"] + EPS, out=out),
+    "MCARI1": lambda T, out: np.multiply(1.2, T["2.5(nir-red)-1.3(nir-green)"], out=out),
+    "MCARI2": lambda T, out: np.divide(1.5 * T["2.5(nir-red)-1.3(nir-green)"], T["mcari2_den"], out=out),
+    "MGRVI": lambda T, out: np.divide(T["green^2"] - T["red^2"], T["green^2"] + T["red^2"] + EPS, out=out),
+    "MSAVI": lambda T, out: np.multiply(0.5, T["2nir+1"] - np.sqrt(T["(2nir+1)^2"] - 8 * T["nir-red"]), out=out),
+    "MSR": lambda T, out: np.divide(T["nir/(red+eps)"] - 1, np.sqrt(T["nir/(red+eps)"] + 1), out=out),
+    "MTVI1": lambda T, out: np.multiply(1.2, T["1.2(nir-green)-2.5(red-green)"], out=out),
+    "MTVI2": lambda T, out: np.divide(1.5 * T["1.2(nir-green)-2.5(red-green)"], T["mcari2_den"], out=out),
+    "NDVI": lambda T, out: _assign(out, T["(nir-red)/(nir+red+eps)"]),
+    "NDRE": lambda T, out: np.divide(T["nir-red_edge"], T["nir+red_edge"] + EPS, out=out),
+    "NDWI": lambda T, out: np.divide(T["green"] - T["nir"], T["green"] + T["nir"] + EPS, out=out),
+    "NLI": lambda T, out: np.divide(T["nir^2"] - T["red"], T["nir^2"] + T["red"] + EPS, out=out),
+    "OSAVI": lambda T, out: _safe_div(T["nir-red"], T["nir+red"] + 0.16 + 1e-10, (T["nir+red"] + 0.16) != 0, out),
+    "RDVI": lambda T, out: np.divide(T["nir-red"], np.sqrt(T["nir+red"] + EPS), out=out),
+    "PVI": lambda T, out: np.divide(T["nir"] - 0.5 * T["red"] - 0.3, np.sqrt(1 + 0.5 ** 2) + EPS, out=out),
+    "SR": lambda T, out: _assign(out, T["nir/(red+eps)"]),
+    "TCARIOSAVI": lambda T, out: np.divide(
+        3 * T["red_edge-red"] - 0.2 * T["red_edge-green"] * (T["red_edge"] / (T["red"] + EPS)),
+        1 + 0.16 * T["(nir-red)/(nir+red+0.16+eps)"], out=out),
+    "TNDVI": lambda T, out: np.sqrt(np.clip(T["(nir-red)/(nir+red+eps)"] + 0.5, 0, None), out=out),
+    "TSAVI": lambda T, out: np.divide(0.33 * (T["nir"] - 0.33 * T["red"] - 0.5),
+                                      0.5 * T["nir"] + T["red"] - 0.5 * 0.33 + 1.5 * (1 + 0.33 ** 2) + EPS, out=out),
+    "GSAVI": _gsavi,
+    "RI": lambda T, out: np.divide(T["red-green"], T["red"] + T["green"] + EPS, out=out),
+    "TCARI": _tcari,
+    "LCI": lambda T, out: np.divide(T["nir-red_edge"], T["nir+red_edge"] + EPS, out=out),
+    "CIgreen": lambda T, out: np.subtract(T["nir/(green+eps)"], 1, out=out),
+    "NGRDI": lambda T, out: np.divide(T["green-red"], T["green+red"] + EPS, out=out),
+    "WDVI": lambda T, out: np.subtract(T["nir"], 0.5 * T["red"], out=out),
+    "EVI2": lambda T, out: np.divide(2.5 * T["nir-red"], T["nir+red"] + 1 + EPS, out=out),
+    "AVI": lambda T, out: np.cbrt(T["nir"] * (1.0 - T["red"]) * (T["nir-red"] + EPS), out=out),
+    "SIPI2": lambda T, out: np.divide(T["nir-green"], T["nir-red"] + 1e-10, out=out),
+    "RRI1": lambda T, out: _assign(out, T["nir/(red_edge+eps)"]),
+    "CCCI": lambda T, out: np.divide(T["nir-red_edge"] * T["nir+red"],
+                                     T["nir+red_edge"] * T["nir-red"] + EPS, out=out),
+}
+
+
+class _Terms:
+    """Lazy, memoised view over band arrays and TERMS."""
+
+    def __init__(self, bands):
+        self._cache = dict(bands)
+
+    def __getitem__(self, name):
+        try:
+            return self._cache[name]
+        except KeyError:
+            val = TERMS[name](self)
+            self._cache[name] = val
+            return val
+
+
+def compute_index_values(bands, names=None, dtype=np.float64, out=None):
+    """
+    Evaluate vegetation indices on flat pixel arrays in one pass.
+
+    Args:
+        bands: dict band -> 1-D array of plant pixels (any numeric dtype)
+        names: indices to compute (default: every index in INDEX_DEFS)
+        dtype: float64 (matches VEG_INDEX_FORMULAS) or float32
+        out:   optional preallocated (len(names), n_pixels) array of `dtype`
+
+    Returns:
+        (names, out) with out[i] holding index names[i] for every pixel.
+    """
+    dtype = np.dtype(dtype)
+    names = list(INDEX_DEFS) if names is None else list(names)
+    n = len(next(iter(bands.values()))) if bands else 0
+    if out is None:
+        out = np.empty((len(names), n), dtype=dtype)
+    elif out.shape != (len(names), n) or out.dtype != dtype:
+        raise ValueError(f"out must have shape {(len(names), n)} and dtype {dtype}")
+
+    T = _Terms({b: np.asarray(v).reshape(-1).astype(dtype, copy=False) for b, v in bands.items()})
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        for i, name in enumerate(names):
+            INDEX_DEFS[name](T, out[i])
+    return names, out